@@ -0,0 +1,266 @@
+"""
+固定的全局动作空间
+
+把这副48张牌的游戏中所有可能的点数层面出牌动作（一手牌最多16张）和跳过排成一张固定的表，
+动作下标与手牌无关，批量引擎和神经网络都可以直接使用。
+每个动作预先算好各点数张数、规范键等属性，存放在NumPy数组中，方便向量化判断是否合法。
+
+表中的动作与MoveGenerator生成的整数动作编码一致，只保留按牌型识别规则成立的动作
+（生成器在个别特殊手牌下会给出识别为其他牌型的飞机带翅膀或三张，这些动作不在表中）
+"""
+
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from cards import CardPattern, CardType, create_deck, rank_counts
+from move_generator import RANK_BITS, TYPE_SHIFT, counts_code, encode_move, move_key, rank_multisets
+
+MAX_HAND_SIZE = 16
+# 跳过的动作编码和下标（编码为0，按编码排序后总在第一位）
+PASS_CODE = 0
+PASS_ACTION = 0
+
+# 完整牌堆中各点数的牌数（A只有3张，2只有1张）
+DECK_COUNTS = rank_counts(create_deck())
+
+_ACE = 11
+# 炸弹规范键的分组（牌型和长度部分）
+_BOMB_GROUP = CardType.BOMB.value * 32
+_ONES = int('1' * 13, 16)
+_FOURS = int('4' * 13, 16)
+
+
+def _code(counts: List[int]) -> int:
+    code = 0
+    for i, count in enumerate(counts):
+        code |= count << (RANK_BITS * i)
+    return code
+
+
+def _enumerate_moves() -> List[Tuple[int, int, int]]:
+    """
+    枚举所有动作，返回按编码排序的(动作编码, 带牌张数, 飞机主体之后的点数下标)
+
+    三带一和单出三张只有手中没有其他牌时才能出，记录带牌张数；飞机带翅膀的主体
+    必须延伸到手中最后一个连续的三同张，记录主体之后一个点数的下标；不需要时为-1
+    """
+    moves = [(PASS_CODE, -1, -1)]
+
+    def add(card_type, main_index, counts, kickers=-1, after=-1):
+        moves.append((encode_move(card_type, main_index + 3, _code(counts)), kickers, after))
+
+    for i, total in enumerate(DECK_COUNTS):
+        add(CardType.SINGLE, i, [1 if j == i else 0 for j in range(13)])
+        if total >= 2:
+            add(CardType.PAIR, i, [2 if j == i else 0 for j in range(13)])
+        # 炸弹：四张相同或三张A
+        if total == 4 or i == _ACE:
+            add(CardType.BOMB, i, [total if j == i else 0 for j in range(13)])
+
+    # 顺子、连对、飞机：连续点数，不含2
+    for card_type, width, min_length in ((CardType.STRAIGHT, 1, 5), (CardType.DOUBLE_STRAIGHT, 2, 2),
+                                         (CardType.AIRPLANE, 3, 2)):
+        for start in range(_ACE + 1):
+            for end in range(start + min_length - 1, _ACE + 1):
+                if width * (end - start + 1) > MAX_HAND_SIZE or any(
+                        DECK_COUNTS[j] < width for j in range(start, end + 1)):
+                    continue
+                add(card_type, start, [width if start <= j <= end else 0 for j in range(13)])
+
+    # 三带二，以及手中只剩一张或没有其他牌时的三带一、单出三张（三张A单出是炸弹）
+    for triple in range(13):
+        if DECK_COUNTS[triple] < 3:
+            continue
+        body = [3 if j == triple else 0 for j in range(13)]
+        others = [(j, DECK_COUNTS[j]) for j in range(13) if j != triple]
+        for first, second in rank_multisets(others, 2):
+            counts = list(body)
+            counts[first] += 1
+            counts[second] += 1
+            add(CardType.THREE_WITH_TWO, triple, counts)
+        for j, _ in others:
+            counts = list(body)
+            counts[j] = 1
+            add(CardType.THREE_WITH_TWO, triple, counts, kickers=1)
+        if triple != _ACE:
+            add(CardType.THREE_WITH_TWO, triple, body, kickers=0)
+
+    # 飞机带翅膀：带牌数是三同张数量的两倍。带牌组成新的三同张或四张时，
+    # 按牌型识别规则不再是飞机带翅膀，不加入
+    for start in range(_ACE + 1):
+        for end in range(start + 1, _ACE + 1):
+            length = end - start + 1
+            if 5 * length > MAX_HAND_SIZE:
+                break
+            body = [3 if start <= j <= end else 0 for j in range(13)]
+            others = [(j, DECK_COUNTS[j] - body[j]) for j in range(13) if DECK_COUNTS[j] > body[j]]
+            body_code = encode_move(CardType.AIRPLANE_WITH_WINGS, start + 3, _code(body))
+            for combo in rank_multisets(others, 2 * length):
+                code = body_code
+                for j in combo:
+                    code += 1 << (RANK_BITS * j)
+                counts = code & ((1 << TYPE_SHIFT) - 1)
+                if counts & _FOURS or bin(counts & (counts >> 1) & _ONES).count('1') != length:
+                    continue
+                moves.append((code, -1, end + 1))
+
+    moves.sort()
+    return moves
+
+
+class ActionSpace:
+    """
+    动作表和各动作的属性
+
+    Attributes:
+        codes: 各动作的整数编码（升序，下标0是跳过）
+        counts: 各动作中各点数的牌数，形状(动作数, 13)
+        keys: 各动作的规范键，跳过为-1
+        card_counts: 各动作的出牌张数
+        kickers: 三带一、单出三张的带牌张数（要求手中没有其他牌），其他动作为-1
+        after: 飞机带翅膀主体之后的点数下标（要求手中该点数不足三张），其他动作为-1
+    """
+
+    def __init__(self):
+        moves = _enumerate_moves()
+        self.size = len(moves)
+        self.codes = np.array([code for code, _, _ in moves], dtype=np.int64)
+        shifts = np.arange(13, dtype=np.int64) * RANK_BITS
+        self.counts = ((self.codes[:, None] >> shifts) & 0xF).astype(np.int8)
+        self.keys = np.array([move_key(code) if code != PASS_CODE else -1 for code, _, _ in moves],
+                             dtype=np.int32)
+        self.card_counts = self.counts.sum(axis=1, dtype=np.int8)
+        self.kickers = np.array([kickers for _, kickers, _ in moves], dtype=np.int8)
+        self.after = np.array([after for _, _, after in moves], dtype=np.int8)
+
+        # 合法动作掩码按位打包计算，每64个动作占一个uint64
+        self.words = (self.size + 63) // 64
+        # _fits[r, h]：点数r在手中有h张时不受限制的动作（该点数的张数不超过h；
+        # h不少于3时飞机带翅膀的主体不能在r之前结束）
+        self._fits = np.empty((13, 5, self.words), dtype=np.uint64)
+        for rank in range(13):
+            for held in range(5):
+                allowed = self.counts[:, rank] <= held
+                if held >= 3:
+                    allowed &= self.after != rank
+                self._fits[rank, held] = self._pack(allowed)
+        # _sole[t, k]：三张点数为t、带k张牌的三带一或单出三张（要求手中没有其他牌）
+        triples = (self.keys & 0xF) - 3
+        self._sole = np.empty((13, 2, self.words), dtype=np.uint64)
+        for triple in range(13):
+            for kickers in range(2):
+                self._sole[triple, kickers] = self._pack((self.kickers == kickers) & (triples == triple))
+        self._no_sole = self._pack(self.kickers < 0)
+        self._pass_word = self._pack(np.arange(self.size) == PASS_ACTION)[0]
+        self._beats: Dict[int, np.ndarray] = {}
+
+    def index(self, codes) -> np.ndarray:
+        """
+        动作编码对应的动作下标，不在表中的编码为-1
+
+        Args:
+            codes: 整数编码或编码数组（跳过为0）
+        """
+        codes = np.asarray(codes, dtype=np.int64)
+        positions = np.minimum(np.searchsorted(self.codes, codes), self.size - 1)
+        return np.where(self.codes[positions] == codes, positions, -1)
+
+    def pattern_index(self, pattern: Optional[CardPattern]) -> int:
+        """牌型对应的动作下标（None表示跳过），不在表中时为-1"""
+        if pattern is None:
+            return PASS_ACTION
+        code = encode_move(pattern.type, pattern.main_point, counts_code(rank_counts(pattern.cards)))
+        return int(self.index(code))
+
+    def _pack(self, mask: np.ndarray) -> np.ndarray:
+        """把长度为动作数的布尔数组按位打包"""
+        bits = np.packbits(mask, bitorder='little')
+        bits = np.concatenate([bits, np.zeros(self.words * 8 - len(bits), dtype=np.uint8)])
+        return bits.view('<u8').astype(np.uint64)
+
+    def _beats_words(self, last_key: int) -> np.ndarray:
+        """能管住规范键为last_key的牌型的动作（按位打包），管牌时跳过总是允许"""
+        words = self._beats.get(last_key)
+        if words is None:
+            groups = self.keys >> 4
+            last_group = last_key >> 4
+            beats = (groups == last_group) & (self.keys > last_key)
+            if last_group != _BOMB_GROUP:
+                beats |= groups == _BOMB_GROUP
+            beats[PASS_ACTION] = True
+            words = self._beats[last_key] = self._pack(beats)
+        return words
+
+    def legal_masks(self, counts: np.ndarray, last_key: np.ndarray, pass_count: np.ndarray) -> np.ndarray:
+        """
+        批量计算合法动作掩码（与MoveGenerator为手牌生成、且能管住上一手牌的动作一致）
+
+        跳过只在需要管牌（有上一手牌且没有跳过过）或没有其他合法动作时合法，首出时必须出牌
+
+        Args:
+            counts: 当前玩家手牌中各点数的牌数，形状(B, 13)
+            last_key: 上一手牌的规范键，没有上一手牌时为-1，形状(B,)
+            pass_count: 连续跳过次数，形状(B,)
+
+        Returns:
+            np.ndarray: 布尔数组，形状(B, 动作数)
+        """
+        counts = np.minimum(np.asarray(counts, dtype=np.int64), 4)
+        last_key = np.asarray(last_key, dtype=np.int64)
+        pass_count = np.asarray(pass_count)
+        batch = len(counts)
+
+        words = self._fits[0, counts[:, 0]]
+        for rank in range(1, 13):
+            words &= self._fits[rank, counts[:, rank]]
+        # 三带一、单出三张只有手中没有其他牌时才能出：先全部去掉，再加回其他牌恰好是0或1张的
+        fitting = words.copy()
+        words &= self._no_sole
+        others = counts.sum(axis=1)[:, None] - counts
+        rows, triples = np.nonzero(others <= 1)
+        if len(rows):
+            # 同一手牌可能有多个这样的三张，按行合并（np.nonzero的结果按行排序）
+            sole_rows, starts = np.unique(rows, return_index=True)
+            sole = self._sole[triples, others[rows, triples]] & fitting[rows]
+            words[sole_rows] |= np.bitwise_or.reduceat(sole, starts, axis=0)
+        # 管牌：只保留能管住上一手牌的动作
+        covering = (last_key >= 0) & (pass_count == 0)
+        cover = np.flatnonzero(covering)
+        if len(cover):
+            keys, inverse = np.unique(last_key[cover], return_inverse=True)
+            beats = np.stack([self._beats_words(int(key)) for key in keys])
+            words[cover] &= beats[inverse]
+        # 跳过：管牌时总是可以跳过，首出时只有无牌可出才能跳过
+        words[:, 0] &= ~self._pass_word
+        passing = covering | ~words.any(axis=1)
+        words[passing, 0] |= self._pass_word
+
+        bits = np.unpackbits(words.astype('<u8', copy=False).view(np.uint8).reshape(batch, -1), axis=1,
+                             bitorder='little')
+        # 解包得到的是0/1字节，直接按布尔类型查看
+        return bits[:, :self.size].view(bool)
+
+    def legal_mask(self, counts: List[int], last_key: int = -1, pass_count: int = 0) -> np.ndarray:
+        """单个状态的合法动作掩码，参数含义同legal_masks"""
+        return self.legal_masks(np.asarray([counts]), np.asarray([last_key]), np.asarray([pass_count]))[0]
+
+    def __len__(self) -> int:
+        return self.size
+
+
+@lru_cache(maxsize=None)
+def get_action_space() -> ActionSpace:
+    """全局动作空间（第一次使用时构建，之后共享）"""
+    return ActionSpace()
+
+
+def legal_action_mask(counts: List[int], last_key: int = -1, pass_count: int = 0) -> np.ndarray:
+    """单个状态在全局动作空间上的合法动作掩码"""
+    return get_action_space().legal_mask(counts, last_key, pass_count)
+
+
+def legal_action_masks(counts: np.ndarray, last_key: np.ndarray, pass_count: np.ndarray) -> np.ndarray:
+    """一批状态在全局动作空间上的合法动作掩码，形状(B, 动作数)"""
+    return get_action_space().legal_masks(counts, last_key, pass_count)
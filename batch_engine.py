@@ -0,0 +1,231 @@
+"""
+批量游戏引擎
+
+用NumPy数组同时保存N局游戏的状态，发牌、判断出牌是否合法、出牌、跳过和判断结束都对所有对局向量化执行，
+用于训练和评估时一次为批量推理的神经网络提供大量状态。
+
+出牌动作使用action_space中固定的全局动作下标（下标0是跳过），规则与GameEngine一致：
+合法的出牌就是MoveGenerator会为当前手牌生成、且能管住上一手牌的动作，只有管牌时可以跳过
+（首出时必须出牌），连续跳过两次后清空上一手牌。出牌时每个点数使用手中序号最小的牌（与MoveGenerator.expand一致）
+"""
+
+from typing import Optional, Sequence
+
+import numpy as np
+
+from action_space import PASS_ACTION, get_action_space
+from cards import CARDS, Card, CardPattern, CardType, Hand, Suit, DECK_SIZE
+from game import GameEngine
+from move_generator import move_layout
+
+# 炸弹规范键的分组（牌型和长度部分）
+_BOMB_GROUP = CardType.BOMB.value * 32
+# 每张牌的点数下标，以及每个点数的牌所占的位
+_CARD_RANKS = np.array([card.point - 3 for card in CARDS[:DECK_SIZE]], dtype=np.int64)
+_RANK_MASKS = np.array([sum(1 << ordinal for ordinal in range(DECK_SIZE) if _CARD_RANKS[ordinal] == rank)
+                        for rank in range(13)], dtype=np.int64)
+# 有黑桃3的玩家先出牌，否则是有红桃3的玩家
+_SPADE_3 = 1 << Card(Suit.SPADE, '3').ordinal
+_HEART_3 = 1 << Card(Suit.HEART, '3').ordinal
+
+
+def _remove_cards(hands: np.ndarray, counts: np.ndarray) -> np.ndarray:
+    """
+    从每手牌中按点数去掉指定张数的牌，每个点数去掉序号最小的牌
+
+    Args:
+        hands: 手牌位掩码，形状(m,)
+        counts: 各点数要去掉的张数，形状(m, 13)
+
+    Returns:
+        np.ndarray: 去掉的牌的位掩码，形状(m,)
+    """
+    bits = hands[:, None] & _RANK_MASKS
+    remaining = counts.astype(np.int64)
+    removed = np.zeros_like(bits)
+    for _ in range(4):
+        take = remaining > 0
+        low = np.where(take, bits & -bits, 0)
+        bits ^= low
+        removed |= low
+        remaining -= take
+    return np.bitwise_or.reduce(removed, axis=1)
+
+
+class BatchGameEngine:
+    """
+    同时进行N局游戏的引擎
+
+    Attributes:
+        hands: 双方手牌的位掩码，形状(N, 2)
+        counts: 双方手牌中各点数的牌数，形状(N, 2, 13)
+        current_player: 当前玩家
+        last_key: 上一手牌的规范键，没有上一手牌时为-1
+        last_action: 上一手牌的动作下标，没有时为-1
+        last_cards: 上一手牌的位掩码
+        pass_count: 连续跳过次数
+        first_player: 首出牌玩家
+        done: 对局是否结束
+        winner: 赢家，未结束时为-1
+    """
+
+    def __init__(self, num_games: int, seed: Optional[int] = None):
+        self.num_games = num_games
+        self.rng = np.random.default_rng(seed)
+        self.action_space = get_action_space()
+        self.hands = np.zeros((num_games, 2), dtype=np.int64)
+        self.counts = np.zeros((num_games, 2, 13), dtype=np.int8)
+        self.current_player = np.zeros(num_games, dtype=np.int8)
+        self.last_key = np.full(num_games, -1, dtype=np.int32)
+        self.last_action = np.full(num_games, -1, dtype=np.int32)
+        self.last_cards = np.zeros(num_games, dtype=np.int64)
+        self.pass_count = np.zeros(num_games, dtype=np.int8)
+        self.first_player = np.zeros(num_games, dtype=np.int8)
+        self.done = np.zeros(num_games, dtype=bool)
+        self.winner = np.full(num_games, -1, dtype=np.int8)
+
+    def deal(self, games: Optional[Sequence[int]] = None):
+        """
+        洗牌并发牌，每人16张，重置这些对局的其他状态
+
+        Args:
+            games: 要重新发牌的对局下标，默认所有对局
+        """
+        games = np.arange(self.num_games) if games is None else np.asarray(games, dtype=np.int64)
+        order = np.argsort(self.rng.random((len(games), DECK_SIZE)), axis=1)
+        ones = np.int64(1)
+        for player, dealt in enumerate((order[:, :16], order[:, 16:32])):
+            self.hands[games, player] = np.bitwise_or.reduce(ones << dealt, axis=1)
+            ranks = _CARD_RANKS[dealt]
+            self.counts[games, player] = (ranks[:, :, None] == np.arange(13)).sum(axis=1)
+
+        hands = self.hands[games]
+        first = np.zeros(len(games), dtype=np.int8)
+        has_heart_3 = (hands & _HEART_3) != 0
+        first[~has_heart_3[:, 0] & has_heart_3[:, 1]] = 1
+        has_spade_3 = (hands & _SPADE_3) != 0
+        first[has_spade_3[:, 0]] = 0
+        first[has_spade_3[:, 1]] = 1
+        self.first_player[games] = first
+        self.current_player[games] = first
+        self.last_key[games] = -1
+        self.last_action[games] = -1
+        self.last_cards[games] = 0
+        self.pass_count[games] = 0
+        self.done[games] = False
+        self.winner[games] = -1
+
+    def is_cover_play(self) -> np.ndarray:
+        """各对局当前玩家是否需要管住上一手牌"""
+        return (self.last_key >= 0) & (self.pass_count == 0)
+
+    def legal_action_masks(self) -> np.ndarray:
+        """各局当前玩家在全局动作空间上的合法动作掩码，形状(N, 动作数)；已结束的对局全为False"""
+        rows = np.arange(self.num_games)
+        masks = self.action_space.legal_masks(self.counts[rows, self.current_player], self.last_key,
+                                              self.pass_count)
+        masks[self.done] = False
+        return masks
+
+    def legal(self, actions: np.ndarray) -> np.ndarray:
+        """
+        判断每局中当前玩家的动作是否合法（已结束的对局都不合法）
+
+        Args:
+            actions: 每局一个动作下标，形状(N,)
+
+        Returns:
+            np.ndarray: 布尔数组，形状(N,)
+        """
+        space = self.action_space
+        actions = np.asarray(actions, dtype=np.int64)
+        in_range = (actions >= 0) & (actions < space.size)
+        actions = np.where(in_range, actions, PASS_ACTION)
+        rows = np.arange(self.num_games)
+        hand = self.counts[rows, self.current_player]
+
+        # 手中有足够的牌
+        fits = (space.counts[actions] <= hand).all(axis=1)
+        # 三带一、单出三张要求手中没有其他牌
+        keys = space.keys[actions]
+        kickers = space.kickers[actions]
+        triple = np.clip((keys & 0xF) - 3, 0, 12)
+        others = hand.sum(axis=1, dtype=np.int64) - hand[rows, triple]
+        sole = (kickers < 0) | (others == kickers)
+        # 飞机带翅膀的主体要延伸到最后一个连续的三同张
+        after = space.after[actions]
+        extends = (after < 0) | (hand[rows, np.clip(after, 0, 12)] < 3)
+        # 管牌：同类同规模主点数更大，或者用炸弹管非炸弹
+        groups = keys >> 4
+        last_groups = self.last_key >> 4
+        beats = ((groups == last_groups) & (keys > self.last_key)) | (
+            (groups == _BOMB_GROUP) & (last_groups != _BOMB_GROUP))
+        cover_play = self.is_cover_play()
+        plays = fits & sole & extends & (~cover_play | beats)
+
+        # 首出时手中总有单张可出，所以跳过只在管牌时合法（与legal_action_masks一致）
+        passing = (actions == PASS_ACTION) & cover_play
+        return in_range & ~self.done & (passing | (plays & (actions != PASS_ACTION)))
+
+    def step(self, actions: np.ndarray) -> np.ndarray:
+        """
+        每局由当前玩家执行一个动作，不合法的动作不改变该局状态
+
+        Args:
+            actions: 每局一个动作下标（PASS_ACTION表示跳过），形状(N,)
+
+        Returns:
+            np.ndarray: 各局的动作是否合法并已执行
+        """
+        space = self.action_space
+        actions = np.asarray(actions, dtype=np.int64)
+        legal = self.legal(actions)
+        passing = legal & (actions == PASS_ACTION)
+
+        games = np.nonzero(legal & ~passing)[0]
+        if len(games):
+            players = self.current_player[games].astype(np.int64)
+            played = actions[games]
+            counts = space.counts[played]
+            removed = _remove_cards(self.hands[games, players], counts)
+            self.hands[games, players] &= ~removed
+            self.counts[games, players] -= counts
+            self.last_key[games] = space.keys[played]
+            self.last_action[games] = played
+            self.last_cards[games] = removed
+            self.pass_count[games] = 0
+            finished = self.counts[games, players].sum(axis=1) == 0
+            self.done[games[finished]] = True
+            self.winner[games[finished]] = players[finished]
+            self.current_player[games] = 1 - players
+
+        games = np.nonzero(passing)[0]
+        if len(games):
+            self.pass_count[games] += 1
+            self.current_player[games] = 1 - self.current_player[games]
+            # 连续跳过两次，清空上一手牌记录
+            cleared = games[self.pass_count[games] >= 2]
+            self.last_key[cleared] = -1
+            self.last_action[cleared] = -1
+            self.last_cards[cleared] = 0
+            self.pass_count[cleared] = 0
+        return legal
+
+    def to_engine(self, game: int) -> GameEngine:
+        """把一局转换为GameEngine，用于调试和与单局引擎对照（不包含出牌记录）"""
+        engine = GameEngine()
+        state = engine.state
+        state.players = [Hand(int(self.hands[game, player])).to_cards() for player in range(2)]
+        state.player_cards_left = [len(hand) for hand in state.players]
+        state.current_player = int(self.current_player[game])
+        state.first_player = int(self.first_player[game])
+        state.pass_count = int(self.pass_count[game])
+        if self.last_action[game] >= 0:
+            card_type, main_point, key, _ = move_layout(int(self.action_space.codes[self.last_action[game]]))
+            state.last_pattern = CardPattern.from_sorted(card_type, Hand(int(self.last_cards[game])).to_cards(),
+                                                         main_point, key)
+        state.game_over = bool(self.done[game])
+        state.winner = int(self.winner[game])
+        state.rehash()
+        engine._update_remaining_cards()
+        return engine
@@ -0,0 +1,90 @@
+"""
+记牌：每个玩家视角下未出现的牌
+
+对玩家p来说，未出现的牌是完整牌堆减去自己的手牌和双方已出的牌（即对手手牌和没发出的牌）。
+发牌时计算一次，之后每次出牌只需从对手视角中去掉这手牌，
+以位掩码和各点数牌数两种形式提供，查询都是O(1)的
+"""
+
+from typing import Iterable, List
+
+from cards import CARDS, Card, Hand, create_deck
+
+# 完整牌堆的位掩码
+FULL_DECK_MASK = Hand.from_cards(create_deck()).mask
+
+
+class UnseenCards:
+    """按观察者（玩家）增量维护未出现的牌"""
+
+    def __init__(self):
+        self._masks = [0, 0]
+        # 各点数未出现的牌数，下标0..12对应点数3..2
+        self._counts = [[0] * 13, [0] * 13]
+
+    def reset(self, hands: List[Iterable[Card]], played_mask: int = 0):
+        """
+        由双方当前手牌和已出的牌重新计算
+
+        Args:
+            hands: 两个玩家的手牌
+            played_mask: 双方已出的所有牌的位掩码
+        """
+        for observer in range(2):
+            mask = FULL_DECK_MASK & ~Hand.from_cards(hands[observer]).mask & ~played_mask
+            self._masks[observer] = mask
+            self._counts[observer] = Hand(mask).rank_counts()
+
+    def set(self, observer: int, cards: Iterable[Card]):
+        """直接指定某个玩家视角下未出现的牌"""
+        mask = Hand.from_cards(cards).mask
+        self._masks[observer] = mask
+        self._counts[observer] = Hand(mask).rank_counts()
+
+    def play(self, player_id: int, cards: Iterable[Card]) -> int:
+        """
+        玩家出牌后，这些牌对对手来说不再是未出现的牌
+
+        Returns:
+            int: 实际从对手视角中去掉的牌的位掩码，撤销时传给unplay
+        """
+        observer = 1 - player_id
+        mask = self._masks[observer]
+        counts = self._counts[observer]
+        removed = 0
+        for card in cards:
+            bit = 1 << card.ordinal
+            if mask & bit:
+                mask ^= bit
+                removed |= bit
+                counts[card.point - 3] -= 1
+        self._masks[observer] = mask
+        return removed
+
+    def unplay(self, player_id: int, removed: int):
+        """撤销play，removed为play的返回值"""
+        observer = 1 - player_id
+        self._masks[observer] |= removed
+        counts = self._counts[observer]
+        while removed:
+            low = removed & -removed
+            counts[CARDS[low.bit_length() - 1].point - 3] += 1
+            removed ^= low
+
+    def mask(self, observer: int) -> int:
+        """玩家视角下未出现的牌的位掩码"""
+        return self._masks[observer]
+
+    def counts(self, observer: int) -> List[int]:
+        """玩家视角下各点数未出现的牌数（内部维护的列表，调用方不要修改）"""
+        return self._counts[observer]
+
+    def cards(self, observer: int) -> List[Card]:
+        """玩家视角下未出现的牌，按点数排序"""
+        return Hand(self._masks[observer]).to_cards()
+
+    def copy(self) -> 'UnseenCards':
+        tracker = UnseenCards()
+        tracker._masks = list(self._masks)
+        tracker._counts = [list(counts) for counts in self._counts]
+        return tracker
@@ -3,9 +3,11 @@
 """
 
 import random
-from typing import List, Dict, Tuple, Optional
+from typing import List, Dict, Tuple, Optional, Iterable, Iterator, Union
 from enum import Enum
 
+import numpy as np
+
 
 class Suit(Enum):
     """花色枚举"""
@@ -16,17 +18,32 @@ class Suit(Enum):
 
 
 class Card:
-    """牌类"""
+    """
+    牌类
+    
+    每种牌只有一个实例：Card(suit, rank)返回牌表中已有的对象，
+    因此相等判断就是默认的同一对象比较（不定义__eq__，in、index、remove都不调用Python函数），
+    哈希和排序只涉及整数运算
+    """
+    __slots__ = ('suit', 'rank', 'point', 'ordinal')
+
     # 牌点数映射，3最小，2最大
     POINTS = {
         '3': 3, '4': 4, '5': 5, '6': 6, '7': 7, '8': 8, '9': 9, '10': 10,
         'J': 11, 'Q': 12, 'K': 13, 'A': 14, '2': 15
     }
 
-    def __init__(self, suit: Suit, rank: str):
-        self.suit = suit
-        self.rank = rank
-        self.point = self.POINTS[rank]
+    def __new__(cls, suit: Suit, rank: str):
+        return _CARD_TABLE[(suit, rank)]
+
+    @classmethod
+    def from_ordinal(cls, ordinal: int) -> 'Card':
+        """根据序号获取牌"""
+        return CARDS[ordinal]
+
+    def __reduce__(self):
+        # 拷贝和序列化时也返回牌表中的实例
+        return Card, (self.suit, self.rank)
 
     def __str__(self):
         return f"{self.suit.value}{self.rank}"
@@ -34,19 +51,12 @@ class Card:
     def __repr__(self):
         return self.__str__()
 
-    def __eq__(self, other):
-        return self.point == other.point and self.suit == other.suit
-
     def __lt__(self, other):
-        # 特殊处理：2比3大
-        if self.point == 15 and other.point == 3:
-            return False
-        if self.point == 3 and other.point == 15:
-            return True
+        # 2的点数是15，本身就比3大
         return self.point < other.point
     
     def __hash__(self):
-        return hash((self.suit, self.rank, self.point))
+        return self.ordinal
 
 
 class CardType(Enum):
@@ -69,6 +79,18 @@ class CardPattern:
         self.cards = sorted(cards)
         self.main_point = main_point  # 主牌点数，用于比较大小
         self.card_count = len(cards)
+        self.key = _pattern_key(self)  # 比较用的规范键，构造时计算一次
+
+    @classmethod
+    def from_sorted(cls, card_type: CardType, cards: List[Card], main_point: int, key: int) -> 'CardPattern':
+        """由已按点数排好序的牌和已知的规范键直接创建牌型，跳过排序和键的计算"""
+        pattern = cls.__new__(cls)
+        pattern.type = card_type
+        pattern.cards = cards
+        pattern.main_point = main_point
+        pattern.card_count = len(cards)
+        pattern.key = key
+        return pattern
 
     def __str__(self):
         return f"{self.type.name}({[str(card) for card in self.cards]})"
@@ -83,22 +105,260 @@ class CardPattern:
         return hash((self.type, self.main_point,self.card_count))
 
 
+RANKS = ['3', '4', '5', '6', '7', '8', '9', '10', 'J', 'Q', 'K', 'A', '2']
+
+
+def _is_removed_card(suit: Suit, rank: str) -> bool:
+    """是否是被去掉的牌（黑桃A和红桃2、方片2、梅花2）"""
+    if rank == 'A' and suit == Suit.SPADE:
+        return True
+    if rank == '2' and suit != Suit.SPADE:
+        return True
+    return False
+
+
+# 牌的序号：48张牌按发牌前的顺序编号为0..47（点数越大序号越大），
+# 被去掉的4张牌（黑桃A、红桃2、方片2、梅花2）编号为48..51，便于测试中构造的牌也能无损转换
+ORDINAL_KEYS: List[Tuple[Suit, str]] = (
+    [(suit, rank) for rank in RANKS for suit in Suit if not _is_removed_card(suit, rank)]
+    + [(suit, rank) for rank in RANKS for suit in Suit if _is_removed_card(suit, rank)]
+)
+CARD_ORDINALS: Dict[Tuple[Suit, str], int] = {key: i for i, key in enumerate(ORDINAL_KEYS)}
+DECK_SIZE = 48
+FULL_DECK_MASK = (1 << DECK_SIZE) - 1
+
+
+def _build_card_table() -> List[Card]:
+    """创建全部52种牌的唯一实例，按序号排列"""
+    cards = []
+    for ordinal, (suit, rank) in enumerate(ORDINAL_KEYS):
+        card = object.__new__(Card)
+        card.suit = suit
+        card.rank = rank
+        card.point = Card.POINTS[rank]
+        card.ordinal = ordinal
+        cards.append(card)
+    return cards
+
+
+CARDS: List[Card] = _build_card_table()
+_CARD_TABLE: Dict[Tuple[Suit, str], Card] = {(card.suit, card.rank): card for card in CARDS}
+
+
 def create_deck() -> List[Card]:
     """创建一副跑得快的牌（48张）"""
     # 去掉大小王、三个2（保留黑桃2）和黑桃A
-    ranks = ['3', '4', '5', '6', '7', '8', '9', '10', 'J', 'Q', 'K', 'A', '2']
-    deck = []
+    return CARDS[:DECK_SIZE]
+
+
+try:
+    _popcount = int.bit_count
+except AttributeError:  # Python < 3.10
+    def _popcount(value: int) -> int:
+        return bin(value).count('1')
+
+
+def card_ordinal(card: Card) -> int:
+    """获取牌的序号"""
+    return card.ordinal
+
+
+class Hand:
+    """
+    位掩码手牌：用一个整数表示一手牌，第i位为1表示持有序号为i的牌
     
-    for rank in ranks:
-        for suit in Suit:
-            # 跳过黑桃A和三个2（红桃2、方片2、梅花2）
-            if rank == 'A' and suit == Suit.SPADE:
+    增删查和计数都是O(1)的整数运算，可以和List[Card]无损互相转换
+    """
+    __slots__ = ('mask',)
+
+    def __init__(self, mask: int = 0):
+        self.mask = mask
+
+    @classmethod
+    def from_cards(cls, cards: Iterable[Card]) -> 'Hand':
+        """由牌列表创建手牌"""
+        mask = 0
+        for card in cards:
+            mask |= 1 << card.ordinal
+        return cls(mask)
+
+    def to_cards(self) -> List[Card]:
+        """转换为按点数排序的牌列表"""
+        cards = [CARDS[ordinal] for ordinal in _iter_bits(self.mask)]
+        if self.mask >> DECK_SIZE:
+            # 被去掉的牌序号在最后，需要重新按点数排序
+            cards.sort()
+        return cards
+
+    def add(self, card: Card):
+        """添加一张牌"""
+        self.mask |= 1 << card.ordinal
+
+    def remove(self, card: Card):
+        """移除一张牌，牌不在手中时抛出KeyError"""
+        bit = 1 << card.ordinal
+        if not self.mask & bit:
+            raise KeyError(card)
+        self.mask ^= bit
+
+    def discard(self, card: Card):
+        """移除一张牌（如果存在）"""
+        self.mask &= ~(1 << card.ordinal)
+
+    def copy(self) -> 'Hand':
+        return Hand(self.mask)
+
+    def issubset(self, other: 'Hand') -> bool:
+        """是否是另一手牌的子集"""
+        return self.mask & ~other.mask == 0
+
+    def rank_counts(self) -> List[int]:
+        """各点数的牌数，下标0..12对应点数3..2"""
+        counts = [0] * len(RANKS)
+        for ordinal in _iter_bits(self.mask):
+            counts[CARDS[ordinal].point - 3] += 1
+        return counts
+
+    def __contains__(self, card: Card) -> bool:
+        return (self.mask >> card.ordinal) & 1 == 1
+
+    def __len__(self) -> int:
+        return _popcount(self.mask)
+
+    def __bool__(self) -> bool:
+        return self.mask != 0
+
+    def __iter__(self) -> Iterator[Card]:
+        return iter(self.to_cards())
+
+    def __eq__(self, other):
+        return isinstance(other, Hand) and self.mask == other.mask
+
+    def __hash__(self):
+        # 按位掩码哈希，可以作为字典键（如置换表）；作为键使用后不要再add/remove
+        return hash(self.mask)
+
+    def __or__(self, other: 'Hand') -> 'Hand':
+        return Hand(self.mask | other.mask)
+
+    def __and__(self, other: 'Hand') -> 'Hand':
+        return Hand(self.mask & other.mask)
+
+    def __sub__(self, other: 'Hand') -> 'Hand':
+        return Hand(self.mask & ~other.mask)
+
+    def __str__(self):
+        return str(self.to_cards())
+
+    def __repr__(self):
+        return f"Hand({self.to_cards()})"
+
+
+def _iter_bits(mask: int) -> Iterator[int]:
+    """按从低到高的顺序遍历掩码中为1的位"""
+    while mask:
+        low = mask & -mask
+        yield low.bit_length() - 1
+        mask ^= low
+
+
+def rank_counts(cards: Iterable[Card]) -> List[int]:
+    """统计各点数的牌数，返回13个元素的计数向量（下标0..12对应点数3..2）"""
+    counts = [0] * len(RANKS)
+    for card in cards:
+        counts[card.point - 3] += 1
+    return counts
+
+
+# 计数签名（各点数牌数从大到小排列）到候选牌型规则的查找表，按需构建后缓存
+# 每条规则为 (牌型, 额外检查, 主牌取法)，按原有识别顺序排列
+_SIGNATURE_RULES: Dict[Tuple[int, ...], Tuple[Tuple[CardType, str, int], ...]] = {}
+
+
+def _build_signature_rules(signature: Tuple[int, ...]) -> Tuple[Tuple[CardType, str, int], ...]:
+    """
+    根据计数签名列出可能的牌型
+    
+    额外检查: 'none' 无需检查, 'ace' 必须是A, 'run' 所有点数连续且不含2、不以A开头,
+    'triple_run' 三同张的点数连续
+    主牌取法: 0 取最小点数, 3 取三同张点数, 4 取四同张点数
+    """
+    card_count = sum(signature)
+    rules = []
+    # 单张
+    if card_count == 1:
+        rules.append((CardType.SINGLE, 'none', 0))
+    # 对子
+    if signature == (2,):
+        rules.append((CardType.PAIR, 'none', 0))
+    # 炸弹（4张相同或3张A）
+    if signature == (4,):
+        rules.append((CardType.BOMB, 'none', 0))
+    if signature == (3,):
+        rules.append((CardType.BOMB, 'ace', 0))
+    # 三带二
+    if 3 <= card_count <= 5 and 3 in signature:
+        rules.append((CardType.THREE_WITH_TWO, 'none', 3))
+    # 顺子（5张及以上连续单牌）
+    if card_count >= 5 and all(count == 1 for count in signature):
+        rules.append((CardType.STRAIGHT, 'run', 0))
+    # 连对（2个及以上连续对子）
+    if card_count >= 4 and card_count % 2 == 0 and all(count == 2 for count in signature):
+        rules.append((CardType.DOUBLE_STRAIGHT, 'run', 0))
+    # 四带三
+    if card_count >= 4 and 4 in signature:
+        rules.append((CardType.FOUR_WITH_THREE, 'none', 4))
+    # 飞机（2个及以上连续三同张）
+    if card_count >= 6 and card_count % 3 == 0 and all(count == 3 for count in signature):
+        rules.append((CardType.AIRPLANE, 'run', 0))
+    # 飞机带翅膀（带牌数 = 三同张数量 * 2）
+    triple_count = signature.count(3)
+    if card_count >= 7 and triple_count >= 2:
+        wings_count = sum(count for count in signature if count < 3)
+        if wings_count == triple_count * 2:
+            rules.append((CardType.AIRPLANE_WITH_WINGS, 'triple_run', 3))
+    return tuple(rules)
+
+
+def classify_rank_counts(counts: List[int]) -> Optional[Tuple[CardType, int]]:
+    """
+    根据点数计数向量识别牌型
+    
+    Args:
+        counts: 13个元素的计数向量（下标0..12对应点数3..2）
+        
+    Returns:
+        (牌型, 主牌点数)，不是有效牌型时返回None
+    """
+    present = [index for index, count in enumerate(counts) if count]
+    if not present:
+        return None
+
+    signature = tuple(sorted((counts[index] for index in present), reverse=True))
+    rules = _SIGNATURE_RULES.get(signature)
+    if rules is None:
+        rules = _SIGNATURE_RULES[signature] = _build_signature_rules(signature)
+
+    for card_type, check, main in rules:
+        if check == 'ace':
+            if present[0] != 11:  # A的下标是11
                 continue
-            if rank == '2' and suit != Suit.SPADE:
+        elif check == 'run':
+            # 不能包含2（下标12），A不能作为最小的牌，点数必须连续
+            if present[-1] == 12 or present[0] == 11 or present[-1] - present[0] != len(present) - 1:
+                continue
+        elif check == 'triple_run':
+            triples = [index for index in present if counts[index] == 3]
+            if triples[-1] - triples[0] != len(triples) - 1:
                 continue
-            deck.append(Card(suit, rank))
-    
-    return deck
+
+        if main == 0:
+            main_index = present[0]
+        else:
+            main_index = next(index for index in present if counts[index] == main)
+        return card_type, main_index + 3
+
+    return None
 
 
 def detect_card_type(cards: List[Card]) -> Optional[CardPattern]:
@@ -107,188 +367,63 @@ def detect_card_type(cards: List[Card]) -> Optional[CardPattern]:
         return None
 
     cards = sorted(cards)
-    card_count = len(cards)
+    result = classify_rank_counts(rank_counts(cards))
+    if result is None:
+        return None
+    return CardPattern(result[0], cards, result[1])
 
-    # 单张
-    if card_count == 1:
-        return CardPattern(CardType.SINGLE, cards, cards[0].point)
 
-    # 对子
-    if card_count == 2 and cards[0].point == cards[1].point:
-        return CardPattern(CardType.PAIR, cards, cards[0].point)
-        # 炸弹（4张相同或3张A）
-    if card_count == 4:
-        if all(card.point == cards[0].point for card in cards):
-            return CardPattern(CardType.BOMB, cards, cards[0].point)
-
-    if card_count == 3:
-        if all(card.point == 14 for card in cards):  # 3张A
-            return CardPattern(CardType.BOMB, cards, 14)  # A的点数是14
-            
-    # 三带二 (必须正好是5张牌)
-    if 3<=card_count <= 5:
-        points = [card.point for card in cards]
-        point_counts = {}
-        for point in points:
-            point_counts[point] = point_counts.get(point, 0) + 1
-
-        # 检查是否有三张相同点数的牌
-        if 3 in point_counts.values():
-            # 找到三张相同的点数作为主点数
-            main_point = [point for point, count in point_counts.items() if count == 3][0]
-            return CardPattern(CardType.THREE_WITH_TWO, cards, main_point)
+# 规范键的编码：key = ((牌型值 * 32 + 规模) << 4) | 主牌点数
+# 规模：炸弹和三带二为0（只比主牌），飞机带翅膀为连续三同张数量，其他牌型为牌数
+# 规范键右移4位相同的牌型才能互相比较，此时键越大牌越大
+_BOMB_GROUP = CardType.BOMB.value * 32
 
-    # 顺子（5张及以上连续单牌）
-    if card_count >= 5:
-        points = [card.point for card in cards]
-        points.sort()
-        # 检查是否连续
-        is_straight = True
-        # 额外检查：顺子中不能包含2（因为2是最大的牌）
-        if 15 in points:  # 2的点数是15
-            is_straight = False
-
-        # 额外检查：A不能作为顺子的最小牌（即不能作为1使用）
-        if points[0] == 14:  # A是第一张牌（最小的）
-            is_straight = False
-        for i in range(1, len(points)):
-            # 普通连续性检查
-            if points[i] - points[i - 1] != 1:
-                is_straight = False
-                break
-
-        if is_straight and len(set(points)) == len(points):  # 确保没有重复点数
-            return CardPattern(CardType.STRAIGHT, cards, points[0])  # 主牌改回最小的牌
 
-    # 连对（2个及以上连续对子）
-    if card_count >= 4 and card_count % 2 == 0:
-        points = [card.point for card in cards]
-        point_counts = {}
-        for point in points:
-            point_counts[point] = point_counts.get(point, 0) + 1
-
-        # 检查是否都是对子
-        if all(count == 2 for count in point_counts.values()):
-            unique_points = sorted(point_counts.keys())
-            # 额外检查：连对中不能包含2（因为2是最大的牌）
-            is_consecutive = True
-            if 15 in unique_points:  # 2的点数是15
-                is_consecutive =  False
-            # 额外检查：A不能作为连对的最小牌
-            if unique_points[0] == 14:  # A是最小的
-                is_consecutive = False
-            for i in range(1, len(unique_points)):
-                if unique_points[i] - unique_points[i - 1] != 1:
-                    is_consecutive = False
-                    break
-            if is_consecutive:
-                return CardPattern(CardType.DOUBLE_STRAIGHT, cards, unique_points[0])
-                
-    # 四带三
-    if card_count >= 4:
-        points = [card.point for card in cards]
-        point_counts = {}
-        for point in points:
-            point_counts[point] = point_counts.get(point, 0) + 1
-
-        values_list = list(point_counts.values())
-        has_four = 4 in values_list
-        if has_four:
-            four_point = [point for point, count in point_counts.items() if count == 4][0]
-            return CardPattern(CardType.FOUR_WITH_THREE, cards, four_point)
-            
-    # 飞机（2个及以上连续三同张）
-    if card_count >= 6 and card_count % 3 == 0:
-        points = [card.point for card in cards]
-        point_counts = {}
-        for point in points:
-            point_counts[point] = point_counts.get(point, 0) + 1
-
-        # 检查是否都是三同张
-        if all(count == 3 for count in point_counts.values()):
-            unique_points = sorted(point_counts.keys())
-            is_consecutive = True
-            # 额外检查：飞机中不能包含2（因为2是最大的牌）
-            if 15 in unique_points:  # 2的点数是15
-                is_consecutive = False
-
-            # 额外检查：A不能作为飞机的最小牌
-            if unique_points[0] == 14:  # A是最小的
-                is_consecutive = False
-            # 检查点数是否连续
-            for i in range(1, len(unique_points)):
-                if unique_points[i] - unique_points[i - 1] != 1:
-                    is_consecutive = False
-                    break
-
-            if is_consecutive:
-                return CardPattern(CardType.AIRPLANE, cards, unique_points[0])
-
-    # 飞机带翅膀
-    if card_count >= 7:
-        points = [card.point for card in cards]
-        point_counts = {}
-        for point in points:
-            point_counts[point] = point_counts.get(point, 0) + 1
-
-        # 统计三同张的数量
-        triple_points = [point for point, count in point_counts.items() if count == 3]
-        if len(triple_points) >= 2:
-            # 检查三同张是否连续
-            triple_points.sort()
-            is_consecutive = True
-            for i in range(1, len(triple_points)):
-                if triple_points[i] - triple_points[i - 1] != 1:
-                    is_consecutive = False
-                    break
-
-            if is_consecutive:
-                # 需要带的牌数 = 三同张数量 * 2
-                wings_needed = len(triple_points) * 2
-                wings_count = sum(count for point, count in point_counts.items() if count < 3)
-
-                # 检查带牌数量是否正确
-                if wings_count == wings_needed:
-                    return CardPattern(CardType.AIRPLANE_WITH_WINGS, cards, triple_points[0])
-                else:
-                    pass
-
-    return None
+def _pattern_key(pattern: 'CardPattern') -> int:
+    """计算牌型的规范键（牌型、长度/三同张数、主牌点数）"""
+    if pattern.type == CardType.BOMB or pattern.type == CardType.THREE_WITH_TWO:
+        size = 0
+    elif pattern.type == CardType.AIRPLANE_WITH_WINGS:
+        size = _count_airplane_triples(pattern)
+    else:
+        size = pattern.card_count
+    return ((pattern.type.value * 32 + size) << 4) | pattern.main_point
 
 
 def compare_patterns(pattern1: CardPattern, pattern2: CardPattern) -> bool:
     """比较两个牌型，pattern1是否能管住pattern2"""
-    # 炸弹可以管任何非炸弹牌型
-    if pattern1.type == CardType.BOMB and pattern2.type != CardType.BOMB:
-        return True
-    
-    # 炸弹之间的比较
-    if pattern1.type == CardType.BOMB and pattern2.type == CardType.BOMB:
-        return pattern1.main_point > pattern2.main_point
-    
-    # 非炸弹牌型必须类型相同才能比较
-    if pattern1.type != pattern2.type:
-        return False
-
-    # 三带二只能和三带二比较
-    if pattern1.type == CardType.THREE_WITH_TWO:
-        # 三带二只需要比较三同张的点数
-        return pattern1.main_point > pattern2.main_point
-
-    # 飞机带翅膀只能和飞机带翅膀比较
-    if pattern1.type == CardType.AIRPLANE_WITH_WINGS:
-        # 计算两个牌型的飞机部分三同张数量
-        triple_count1 = _count_airplane_triples(pattern1)
-        triple_count2 = _count_airplane_triples(pattern2)
-        # 相同数量的连续三同张，比较主点数
-        return triple_count1 == triple_count2 and pattern1.main_point > pattern2.main_point
-
-    # 其他牌型比较需要牌数一致
-    if pattern1.card_count != pattern2.card_count:
-        return False
+    key1 = pattern1.key
+    key2 = pattern2.key
+    # 同类同规模（包括炸弹之间）比较主点数
+    if key1 >> 4 == key2 >> 4:
+        return key1 > key2
+    # 炸弹可以管任何非炸弹牌型，其他牌型之间不能比较
+    return key1 >> 4 == _BOMB_GROUP and key2 >> 4 != _BOMB_GROUP
+
+
+def pattern_keys(patterns: List[CardPattern]) -> np.ndarray:
+    """把一组牌型的规范键转换为整数数组"""
+    return np.fromiter((pattern.key for pattern in patterns), dtype=np.int64, count=len(patterns))
+
+
+def beats_mask(patterns: Union[List[CardPattern], np.ndarray], target: CardPattern) -> np.ndarray:
+    """
+    批量判断哪些牌型能管住target
     
-    # 普通比较
-    return pattern1.main_point > pattern2.main_point
+    Args:
+        patterns: 牌型列表，或pattern_keys得到的规范键数组（可预先计算后重复使用）
+        target: 被比较的牌型
+        
+    Returns:
+        np.ndarray: 布尔数组，第i个元素表示第i个牌型能否管住target
+    """
+    keys = patterns if isinstance(patterns, np.ndarray) else pattern_keys(patterns)
+    groups = keys >> 4
+    target_group = target.key >> 4
+    mask = (groups == target_group) & (keys > target.key)
+    if target_group != _BOMB_GROUP:
+        mask |= groups == _BOMB_GROUP
+    return mask
 
 # 正确计算飞机带翅膀牌型中连续三同张的数量
 def _count_airplane_triples(pattern: CardPattern):
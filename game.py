@@ -3,8 +3,15 @@
 """
 
 import random
-from typing import List, Optional
-from cards import Card, Suit, CardType, CardPattern, create_deck, detect_card_type, compare_patterns
+from typing import Callable, Collection, Iterator, List, Optional, Tuple
+from cards import (Card, Suit, CardType, CardPattern, Hand, create_deck, detect_card_type, compare_patterns,
+                   rank_counts)
+from move_generator import MoveGenerator, rank_multisets, encode_move, counts_code, move_layout
+from hand_decomposer import HandDecomposer, MinPlaysSolver
+from pattern_cache import valid_patterns_cache
+from zobrist import cards_hash, context_hash
+from move_log import MoveLog
+from card_tracker import UnseenCards
 from collections import defaultdict
 
 class GameState:
@@ -22,17 +29,118 @@ class GameState:
         self.scores: List[int] = [0, 0]  # 玩家得分
         self.is_first_round: bool = True  # 是否是第一轮
         self.player_cards_left: List[int] = [16, 16]  # 玩家剩余牌数
+        # 双方手牌、当前玩家、上一手牌和连续跳过次数的Zobrist哈希，出牌和跳过时增量更新
+        # （直接修改这些字段后需要调用rehash重新计算）
+        self.zobrist: int = self.compute_zobrist()
+
+    def compute_zobrist(self) -> int:
+        """由当前字段完整计算Zobrist哈希"""
+        return (cards_hash(0, self.players[0]) ^ cards_hash(1, self.players[1])
+                ^ context_hash(self.current_player, self.last_pattern, self.pass_count))
+
+    def rehash(self):
+        """重新计算Zobrist哈希"""
+        self.zobrist = self.compute_zobrist()
+
+    def snapshot(self) -> Tuple:
+        """
+        创建状态快照
+
+        快照是不可变的元组（手牌和牌堆保存为元组），可以多次恢复，也可以在多个引擎之间共享
+        """
+        return (tuple(self.deck), tuple(tuple(hand) for hand in self.players), self.current_player,
+                self.last_pattern, self.last_player, self.pass_count, self.game_over, self.winner,
+                self.first_player, tuple(self.scores), self.is_first_round, tuple(self.player_cards_left),
+                self.zobrist)
+
+    def restore(self, snapshot: Tuple):
+        """从快照恢复状态，之后对状态的修改不会影响快照"""
+        (deck, players, self.current_player, self.last_pattern, self.last_player, self.pass_count,
+         self.game_over, self.winner, self.first_player, scores, self.is_first_round, cards_left,
+         self.zobrist) = snapshot
+        self.deck = list(deck)
+        self.players = [list(hand) for hand in players]
+        self.scores = list(scores)
+        self.player_cards_left = list(cards_left)
+
+    @classmethod
+    def from_snapshot(cls, snapshot: Tuple) -> 'GameState':
+        """由快照创建新的状态"""
+        state = cls.__new__(cls)
+        state.restore(snapshot)
+        return state
+
+    def clone(self) -> 'GameState':
+        """复制状态（只复制列表本身，牌和牌型对象是共享的）"""
+        return GameState.from_snapshot(self.snapshot())
 
 
 class GameEngine:
     """游戏引擎"""
+
+    # 所有实例共享的有效牌型缓存（LRU，有大小上限）
+    pattern_cache = valid_patterns_cache
     
     def __init__(self):
         self.state = GameState()
         self.base_score = 10  # 底分
-        self.game_history = []  # 游戏历史记录，用于强化学习
-        self.remaining_cards = []  # 未出现的牌（完整的牌堆减去已知的牌）
+        self.game_history = MoveLog()  # 游戏历史记录（紧凑的出牌记录），用于推断对手手牌和强化学习
+        self.unseen = UnseenCards()  # 每个玩家视角下未出现的牌，出牌时增量更新
+        self.lazy_suits = False  # 生成牌型时是否延迟到真正出牌时才确定使用哪些花色的牌
     
+    def clone(self) -> 'GameEngine':
+        """
+        复制引擎用于搜索和模拟
+
+        状态通过快照复制，对副本出牌、跳过不会影响原来的对局；
+        设置和共享缓存沿用原引擎的
+        """
+        engine = self.__class__.__new__(self.__class__)
+        engine.__dict__.update(self.__dict__)
+        engine.state = self.state.clone()
+        engine.game_history = self.game_history.copy()
+        engine.unseen = self.unseen.copy()
+        return engine
+
+    def snapshot(self) -> Tuple:
+        """
+        创建引擎快照：状态快照、出牌记录长度和未出现的牌
+
+        出牌记录只会在末尾追加，快照只保存长度，恢复时把之后的记录移除
+        """
+        return self.state.snapshot(), len(self.game_history), self.unseen.copy()
+
+    def restore(self, snapshot: Tuple):
+        """
+        从引擎快照恢复，同一个快照可以多次恢复
+
+        只能恢复到本引擎（或其clone）在快照之后继续出牌的局面，出牌记录不能比快照时短
+        """
+        state, history_length, unseen = snapshot
+        self.state.restore(state)
+        history = self.game_history
+        while len(history) > history_length:
+            history.discard()
+        self.unseen = unseen.copy()
+
+    @property
+    def game_history(self) -> MoveLog:
+        return self._game_history
+
+    @game_history.setter
+    def game_history(self, moves):
+        # 兼容直接赋值为{'player', 'cards', 'pattern'}字典的列表
+        self._game_history = moves if isinstance(moves, MoveLog) else MoveLog(moves)
+
+    @property
+    def remaining_cards(self) -> List[Card]:
+        """当前玩家视角下未出现的牌（完整的牌堆减去己方手牌和已出的牌）"""
+        return self.unseen.cards(self.state.current_player)
+
+    @remaining_cards.setter
+    def remaining_cards(self, cards: List[Card]):
+        self.unseen.set(self.state.current_player, cards)
+
     def deal_cards(self):
         """发牌"""
         # 创建并洗牌
@@ -51,6 +159,7 @@ class GameEngine:
         # 确定首出牌玩家（有黑桃3的玩家先出牌，否则是红桃3）
         self.state.first_player = self._determine_first_player()
         self.state.current_player = self.state.first_player
+        self.state.rehash()
         
         # 初始化未出现的牌（完整的牌堆减去双方手牌）
         self._update_remaining_cards()
@@ -75,16 +184,13 @@ class GameEngine:
     
     def play_cards(self, player_id: int, cards: List[Card]) -> bool:
         """玩家出牌"""
-        # 清除缓存，因为手牌状态改变了
-        if hasattr(self, '_valid_patterns_cache'):
-            self._valid_patterns_cache.clear()
-            
         if player_id != self.state.current_player:
             return False
         
-        # 检查玩家是否有这些牌
+        # 检查玩家是否有这些牌（用位掩码判断，重复的牌也视为无效）
         player_hand = self.state.players[player_id]
-        if not all(card in player_hand for card in cards):
+        played = Hand.from_cards(cards)
+        if len(played) != len(cards) or not played.issubset(Hand.from_cards(player_hand)):
             return False
         
         # 创建牌型对象
@@ -105,6 +211,7 @@ class GameEngine:
                 return False
         
         # 更新游戏状态
+        context = context_hash(player_id, self.state.last_pattern, self.state.pass_count)
         self.state.last_pattern = pattern
         self.state.pass_count = 0
         self.state.player_cards_left[player_id] = len(player_hand)
@@ -118,17 +225,18 @@ class GameEngine:
         # 切换到下一个玩家
         # print(f"{player_id} - {self.state.players[self.state.current_player]} - 出牌：{pattern.cards}")
         self.state.current_player = 1 - player_id
+        self.state.zobrist ^= (cards_hash(player_id, cards) ^ context
+                               ^ context_hash(self.state.current_player, pattern, 0))
+        self.game_history.record_play(player_id, pattern)
+        self.unseen.play(player_id, cards)
         return True
 
     def pass_turn(self, player_id: int) -> bool:
         """玩家跳过"""
-        # 清除缓存，因为游戏状态改变了
-        if hasattr(self, '_valid_patterns_cache'):
-            self._valid_patterns_cache.clear()
-            
         if player_id != self.state.current_player:
             return False
         
+        context = context_hash(player_id, self.state.last_pattern, self.state.pass_count)
         self.state.pass_count += 1
         self.state.current_player = 1 - player_id
         
@@ -137,8 +245,90 @@ class GameEngine:
             self.state.last_pattern = None
             self.state.pass_count = 0
         
+        self.state.zobrist ^= context ^ context_hash(self.state.current_player, self.state.last_pattern,
+                                                     self.state.pass_count)
+        self.game_history.record_pass(player_id)
         return True
     
+    def apply(self, pattern: Optional[CardPattern], validate: bool = True) -> Optional[tuple]:
+        """
+        当前玩家直接在本引擎上出牌或跳过，返回用于undo的撤销记录
+
+        与play_cards/pass_turn的规则和状态更新一致，配合undo可以在同一个引擎上做搜索，不需要复制引擎
+
+        Args:
+            pattern: 要出的牌型，None表示跳过
+            validate: 是否检查牌在手中、牌型有效且符合出牌规则。
+                      牌型来自当前局面的走法生成（get_valid_patterns、iter_valid_patterns等）时可以传False跳过检查
+
+        Returns:
+            Optional[tuple]: 撤销记录，不符合规则时返回None且不修改状态
+        """
+        state = self.state
+        player_id = state.current_player
+        token = (player_id, pattern, state.last_pattern, state.pass_count, state.game_over, state.winner,
+                 state.zobrist)
+        context = context_hash(player_id, state.last_pattern, state.pass_count)
+
+        if pattern is None:
+            state.pass_count += 1
+            state.current_player = 1 - player_id
+            # 如果连续跳过两次，清空上一手牌记录
+            if state.pass_count >= 2:
+                state.last_pattern = None
+                state.pass_count = 0
+            state.zobrist ^= context ^ context_hash(state.current_player, state.last_pattern, state.pass_count)
+            self.game_history.record_pass(player_id)
+            return token
+
+        player_hand = state.players[player_id]
+        cards = pattern.cards
+        played = Hand.from_cards(cards)
+        if validate:
+            if len(played) != len(cards) or not played.issubset(Hand.from_cards(player_hand)):
+                return None
+            if not self._create_card_pattern(cards) or not self._is_valid_play(pattern):
+                return None
+
+        # 按序号扫描一遍手牌，记录出的牌原来的位置（升序），撤销时按升序插回，恢复原来的手牌顺序
+        played = played.mask
+        positions = [index for index, card in enumerate(player_hand) if played >> card.ordinal & 1]
+        removed = [player_hand[index] for index in positions]
+        for index in reversed(positions):
+            del player_hand[index]
+
+        state.last_pattern = pattern
+        state.pass_count = 0
+        state.player_cards_left[player_id] = len(player_hand)
+        if not player_hand:
+            state.game_over = True
+            state.winner = player_id
+            state.scores[player_id] += 1
+        state.current_player = 1 - player_id
+        state.zobrist ^= cards_hash(player_id, cards) ^ context ^ context_hash(state.current_player, pattern, 0)
+        self.game_history.record_play(player_id, pattern, played)
+        return token + (positions, removed, self.unseen.play(player_id, cards))
+
+    def undo(self, token: tuple):
+        """撤销apply执行的一步，必须按与apply相反的顺序撤销"""
+        state = self.state
+        self.game_history.discard()
+        player_id, pattern, last_pattern, pass_count, game_over, winner, zobrist = token[:7]
+        if pattern is not None:
+            player_hand = state.players[player_id]
+            for index, card in zip(token[7], token[8]):
+                player_hand.insert(index, card)
+            state.player_cards_left[player_id] = len(player_hand)
+            self.unseen.unplay(player_id, token[9])
+            if state.game_over and not game_over:
+                state.scores[player_id] -= 1
+        state.current_player = player_id
+        state.last_pattern = last_pattern
+        state.pass_count = pass_count
+        state.game_over = game_over
+        state.winner = winner
+        state.zobrist = zobrist
+
     def _is_valid_play(self, pattern: CardPattern) -> bool:
         """检查是否符合出牌规则"""
         # 如果是首出或者上家跳过，任何有效牌型都可以出
@@ -150,189 +340,188 @@ class GameEngine:
         return result
     
     def _update_remaining_cards(self):
-        """更新未出现的牌列表"""
-        # 创建完整的牌堆
-        full_deck = create_deck()
-        
-        # 从完整牌堆中移除已知的牌：
-        # 1. 己方手牌
-        # 2. 对手已出的牌（通过game_history获取）
-        known_cards = set()
-        
-        # 添加己方手牌
-        for card in self.state.players[self.state.current_player]:
-            known_cards.add(card)
-        
-        # 添加对手已出的牌
-        opponent_id = 1 - self.state.current_player
-        for move in self.game_history:
-            if move['player'] == opponent_id:
-                for card in move['cards']:
-                    known_cards.add(card)
-        
-        # 计算剩余未出现的牌（对手手上的牌+还在牌堆中的牌）
-        self.remaining_cards = [card for card in full_deck if card not in known_cards]
+        """由双方当前手牌和出牌记录重新计算每个玩家视角下未出现的牌（之后出牌时增量更新）"""
+        history = self.game_history
+        self.unseen.reset(self.state.players, history.played_mask(0) | history.played_mask(1))
     
     def get_valid_patterns(self, player_id: int) -> List[CardPattern]:
         """获取玩家可以出的所有有效牌型"""
-        # 检查缓存
-        cache_key = (player_id, tuple(sorted(self.state.players[player_id])), self.state.last_pattern, self.state.pass_count)
-        if hasattr(self, '_valid_patterns_cache') and cache_key in self._valid_patterns_cache:
-            return self._valid_patterns_cache[cache_key]
+        player_hand = self.state.players[player_id]
+        cover_play = self.is_cover_play()
+
+        # 检查全局缓存：以手牌位掩码和需要管住的牌型规范键作为键
+        # （手牌中有重复的牌时位掩码无法表示，不使用缓存）
+        hand = Hand.from_cards(player_hand)
+        cacheable = len(hand) == len(player_hand)
+        if cacheable:
+            cache_key = (hand.mask, self.state.last_pattern.key if cover_play else -1, self.lazy_suits)
+            cached = self.pattern_cache.get(cache_key)
+            if cached is not None:
+                return list(cached)
             
         valid_patterns = []
-        player_hand = self.state.players[player_id]
-        
-        # 生成所有可能的牌型组合
-        self.generate_all_patterns(player_hand, valid_patterns)
         
-        # 如果不是首出且上家没有跳过，只保留能管住上一手牌的牌型
-        if self.is_cover_play():
-            valid_patterns = [p for p in valid_patterns if compare_patterns(p, self.state.last_pattern)]
-        
-        # 缓存结果
-        if not hasattr(self, '_valid_patterns_cache'):
-            self._valid_patterns_cache = {}
-        self._valid_patterns_cache[cache_key] = valid_patterns
+        # 如果不是首出且上家没有跳过，只生成能管住上一手牌的牌型，否则生成所有可能的牌型组合
+        if cover_play:
+            self.generate_cover_patterns(player_hand, self.state.last_pattern, valid_patterns)
+        else:
+            self.generate_all_patterns(player_hand, valid_patterns)
         
+        # 缓存结果，返回副本以免调用方修改缓存中的列表
+        if cacheable:
+            self.pattern_cache.put(cache_key, valid_patterns)
+            return list(valid_patterns)
         return valid_patterns
 
-    def get_valid_pattern_groups(self, player_id: int) -> List[List[CardPattern]]:
+    def iter_valid_patterns(self, player_id: int, card_types: Collection[CardType] = None) -> Iterator[CardPattern]:
+        """
+        按优先级顺序逐个生成玩家可以出的有效牌型
+
+        与get_valid_patterns的结果和顺序一致，但不会一次生成所有牌型，调用方找到需要的牌型后即可停止
+
+        Args:
+            player_id: 玩家ID
+            card_types: 只生成这些牌型，默认生成所有牌型
+
+        Returns:
+            Iterator[CardPattern]: 有效牌型
+        """
+        generator = MoveGenerator(self.state.players[player_id])
+        last_pattern = self.state.last_pattern if self.is_cover_play() else None
+        for move in generator.iter_moves(last_pattern, card_types):
+            yield generator.to_pattern(move, self.lazy_suits)
+
+    def random_valid_pattern(self, player_id: int, rng: random.Random = None) -> Optional[CardPattern]:
+        """
+        随机选择一个有效牌型（与random.choice(get_valid_patterns(player_id))的分布相同）
+
+        只在整数动作上随机选择，只有选中的动作才会转换为牌型，适合蒙特卡洛模拟
+
+        Returns:
+            Optional[CardPattern]: 随机选中的牌型，没有可出的牌型时返回None
+        """
+        generator = MoveGenerator(self.state.players[player_id])
+        if self.is_cover_play():
+            moves = generator.cover_moves(self.state.last_pattern)
+        else:
+            moves = generator.moves()
+        if not moves:
+            return None
+        return generator.to_pattern((rng or random).choice(moves), self.lazy_suits)
+
+    def get_valid_pattern_groups(self, player_id: int, score_fn: Callable[[List[CardPattern]], float] = None,
+                                 top_k: int = None,
+                                 pattern_bound: Callable[[CardPattern], float] = None) -> List[List[CardPattern]]:
         """
         获取玩家可以出的所有有效牌型组合分组
         
         Args:
             player_id: 玩家ID
+            score_fn: 分组的评分函数。给出时用最佳优先搜索只返回得分最高的top_k个分组（按得分从高到低），
+                      搜索中用各牌型得分上界之和剪枝
+            top_k: 返回的分组数量，默认为100
+            pattern_bound: 单个牌型对分组得分贡献的上界，分组得分不能超过其中各牌型上界之和，
+                           默认为score_fn([pattern])（适用于得分可以按牌型相加的评分函数）
             
         Returns:
             List[List[CardPattern]]: 所有有效的牌型组合分组
         """
+        if top_k is None:
+            top_k = 100
         # 获取玩家手牌
         player_hand = self.state.players[player_id]
-        
-        # 生成所有可能的牌型组合
-        all_patterns = []
-        self.generate_all_patterns(player_hand, all_patterns)
-        
-        # 将牌型组合分组
-        pattern_groups = self.group_patterns_into_hands(player_hand, all_patterns)
+        generator = MoveGenerator(player_hand)
+        decomposer = HandDecomposer(generator.counts, generator.moves())
         
         # 如果不是首出且上家没有跳过，只保留包含能管住上一手牌的牌型的分组
+        accept = None
         if self.is_cover_play():
-            last_pattern = self.state.last_pattern
-            # 预先计算能管住上一手牌的牌型集合，避免重复计算
-            valid_patterns = {pattern for pattern in all_patterns if compare_patterns(pattern, last_pattern)}
-            
-            if valid_patterns:
-                valid_groups = []
-                for group in pattern_groups:
-                    # 检查组中是否有能管住上一手牌的牌型
-                    if any(pattern in valid_patterns for pattern in group):
-                        valid_groups.append(group)
-                pattern_groups = valid_groups
-            else:
-                # 如果没有能管住上一手牌的牌型，返回空列表
-                pattern_groups = []
-            
-        # 按分组的size排序，短的在前
-        pattern_groups.sort(key=len)
+            cover_moves = set(generator.cover_moves(self.state.last_pattern))
+
+            def accept(moves):
+                return any(move in cover_moves for move in moves)
+
+        if score_fn is not None:
+            if pattern_bound is None:
+                def pattern_bound(pattern):
+                    return score_fn([pattern])
+
+            results = decomposer.best_first(
+                top_k,
+                lambda move: pattern_bound(generator.to_pattern(move)),
+                lambda moves: score_fn(self._moves_to_group(player_hand, moves)),
+                accept)
+            return [self._moves_to_group(player_hand, moves) for _, moves in results]
+
+        # 在点数层面求出手牌的所有不同拆分
+        decompositions = decomposer.decompositions()
+        if accept is not None:
+            decompositions = [d for d in decompositions if accept(d)]
             
-        # 限制返回的分组数量，避免过多分组导致性能问题
-        return pattern_groups[:100]  # 限制最多返回100个分组
+        # 拆分已按手数排序，短的在前；限制返回的分组数量，只把需要的拆分转换为牌型
+        return [self._moves_to_group(player_hand, d) for d in decompositions[:top_k]]
+
+    def get_min_plays_group(self, player_id: int) -> List[CardPattern]:
+        """
+        获取出完手牌所需手数最少的牌型分组
+
+        Args:
+            player_id: 玩家ID
+
+        Returns:
+            List[CardPattern]: 手数最少的分组，长度即最少出牌手数
+        """
+        player_hand = self.state.players[player_id]
+        generator = MoveGenerator(player_hand)
+        moves = MinPlaysSolver(generator.counts, generator.moves()).solve()
+        return self._moves_to_group(player_hand, moves)
 
     def group_patterns_into_hands(self, hand: List[Card], patterns: List[CardPattern]) -> List[List[CardPattern]]:
         """
         将牌型组合分组，每组构成一个完整手牌
         
+        在点数层面用记忆化搜索求出所有不同的分组（不区分花色，每个牌型在一个分组中最多使用一次），
+        再为每个分组分配手中互不重复的具体牌
+        
         Args:
             hand: 玩家手牌
             patterns: 所有可能的牌型
             
         Returns:
-            List[List[CardPattern]]: 分组后的牌型组合
+            List[List[CardPattern]]: 分组后的牌型组合，按手数从少到多排列
         """
         if not patterns:
             return []
             
-        # 创建一个字典来跟踪每张牌在哪些牌型中出现
-        card_to_patterns = defaultdict(list)
-        for i, pattern in enumerate(patterns):
-            for card in pattern.cards:
-                card_to_patterns[card].append(i)
-        
-        # 使用回溯算法将牌型分组
-        groups = []
-        used_patterns = [False] * len(patterns)  # 使用列表代替集合，提高访问速度
-        hand_size = len(hand)
-        
-        def backtrack(current_group, used_cards_count, used_cards):
-            # 如果所有牌都已使用，添加当前分组
-            if used_cards_count == hand_size:
-                groups.append(current_group[:])
-                return len(groups) >= 100  # 限制最多100个分组
-            
-            # 如果已经找到足够多的分组，提前结束
-            if len(groups) >= 100:
-                return True
-                
-            # 找到第一个未使用的牌
-            next_card = None
-            for card in hand:
-                if card not in used_cards:
-                    next_card = card
-                    break
-            
-            if next_card is None:
-                return False
-                
-            # 尝试包含该牌的每个牌型
-            for pattern_idx in card_to_patterns[next_card]:
-                if used_patterns[pattern_idx]:
-                    continue
-                    
-                pattern = patterns[pattern_idx]
-                pattern_cards = pattern.cards
-                pattern_card_count = len(pattern_cards)
-                
-                # 检查该牌型的所有牌是否都未使用
-                can_use = True
-                for card in pattern_cards:
-                    if card in used_cards:
-                        can_use = False
-                        break
-                
-                if can_use:
-                    # 添加该牌型到当前分组
-                    current_group.append(pattern)
-                    used_patterns[pattern_idx] = True
-                    new_used_cards = used_cards.union(set(pattern_cards))
-                    
-                    # 递归处理
-                    if backtrack(current_group, used_cards_count + pattern_card_count, new_used_cards):
-                        return True
-                        
-                    # 回溯
-                    current_group.pop()
-                    used_patterns[pattern_idx] = False
-            
-            return False
-        
-        # 开始回溯，限制最多生成100个分组
-        backtrack([], 0, set())
-        
-        return groups
+        moves = [encode_move(pattern.type, pattern.main_point, counts_code(rank_counts(pattern.cards)))
+                 for pattern in patterns]
+        decompositions = HandDecomposer(rank_counts(hand), moves).decompositions()
+        return [self._moves_to_group(hand, d) for d in decompositions]
+
+    def _moves_to_group(self, hand: List[Card], moves) -> List[CardPattern]:
+        """把一个拆分转换为牌型分组，各牌型使用手中互不重复的牌"""
+        cards_by_rank = [[] for _ in range(13)]
+        for card in sorted(hand, key=lambda c: c.ordinal):
+            cards_by_rank[card.point - 3].append(card)
+        group = []
+        for move in moves:
+            card_type, main_point, key, ranks = move_layout(move)
+            cards = []
+            for i, count in ranks:
+                cards.extend(cards_by_rank[i][:count])
+                del cards_by_rank[i][:count]
+            group.append(CardPattern.from_sorted(card_type, cards, main_point, key))
+        return group
 
     def is_cover_play(self):
         return self.state.last_pattern is not None and self.state.pass_count == 0
 
     def reset(self):
         """重置游戏状态"""
-        # 清除缓存
-        if hasattr(self, '_valid_patterns_cache'):
-            self._valid_patterns_cache.clear()
-            
         self.state = GameState()
         self.deck = create_deck()
+        self.game_history = MoveLog()
+        self.unseen = UnseenCards()
     
     def get_player_cards_count(self):
         """获取玩家剩余手牌数"""
@@ -340,43 +529,23 @@ class GameEngine:
 
     def generate_all_patterns(self, hand: List[Card], patterns: List[CardPattern]):
         """生成所有可能的牌型组合"""
-        # 优化：根据手牌数量决定生成哪些牌型
-        hand_size = len(hand)
-
         # 按照优先级顺序生成牌型：炸弹 > 飞机带翅膀 > 飞机 > 顺子 > 连对 > 三带二 > 对子 > 单张
-        
-        # 生成炸弹（优先级最高）
-        self._generate_bomb_patterns(hand, patterns)
-        
-        # 生成四带三
-        # if hand_size >= 4:
-        #     self._generate_four_with_three_patterns(hand, patterns)
-        
-        # 生成飞机带翅膀
-        if hand_size >= 7:
-            self._generate_airplane_with_wings_patterns(hand, patterns)
-        
-        # 生成飞机
-        if hand_size >= 6:
-            self._generate_airplane_patterns(hand, patterns)
+        # 手牌只按点数分组一次，先在点数层面生成整数编码的动作，再转换为牌型
+        # （生成顺序和结果与下面各个_generate_*方法依次调用一致，四带三同样不生成）
+        generator = MoveGenerator(hand)
+        patterns.extend(generator.to_pattern(move, self.lazy_suits) for move in generator.moves())
 
-        # 生成顺子
-        if hand_size >= 5:
-            self._generate_straight_patterns(hand, patterns)
-        
-        # 生成连对
-        if hand_size >= 4:
-            self._generate_double_straight_patterns(hand, patterns)
+    def iter_patterns(self, hand: List[Card], card_types: Collection[CardType] = None) -> Iterator[CardPattern]:
+        """按优先级顺序逐个生成牌型（generate_all_patterns的惰性版本），调用方可以随时停止"""
+        generator = MoveGenerator(hand)
+        for move in generator.iter_moves(card_types=card_types):
+            yield generator.to_pattern(move, self.lazy_suits)
 
-        # 生成三带二
-        if hand_size >= 3:
-            self._generate_three_with_two_patterns(hand, patterns)
-        
-        # 生成对子
-        self._generate_pair_patterns(hand, patterns)
-        
-        # 生成单张（优先级最低）
-        self._generate_single_patterns(hand, patterns)
+    def generate_cover_patterns(self, hand: List[Card], last_pattern: CardPattern, patterns: List[CardPattern]):
+        """只生成能管住上一手牌的牌型（比上一手牌大的炸弹，以及同牌型、同长度且主牌点数更大的牌型）"""
+        # 结果及顺序与先调用generate_all_patterns再用compare_patterns过滤一致
+        generator = MoveGenerator(hand)
+        patterns.extend(generator.to_pattern(move, self.lazy_suits) for move in generator.cover_moves(last_pattern))
         
     def _generate_single_patterns(self, hand: List[Card], patterns: List[CardPattern]):
         """生成单张牌型"""
@@ -417,31 +586,33 @@ class GameEngine:
         # 生成三带二组合
         for triple_point in triple_points:
             triple_cards = point_cards[triple_point][:3]
-            # 收集所有其他牌作为带牌候选
-            other_cards = []
-            for point, cards in point_cards.items():
-                if point != triple_point:
-                    other_cards.extend(cards)
-            
-            # 生成所有可能的两牌组合（优化：限制生成数量）
-            if len(other_cards) >= 2:
-                from itertools import combinations
-                # 优化：限制组合数量，避免过多组合导致性能问题
-                combo_count = 0
-                for combo in combinations(other_cards, 2):
-                    pattern = CardPattern(CardType.THREE_WITH_TWO, triple_cards + list(combo), triple_point)
+            # 其他点数的牌都可以作为带牌，带牌只按点数组合，不区分花色
+            others = sorted((point, len(cards)) for point, cards in point_cards.items() if point != triple_point)
+            other_count = sum(count for _, count in others)
+
+            if other_count >= 2:
+                for combo in rank_multisets(others, 2):
+                    pattern = CardPattern(CardType.THREE_WITH_TWO,
+                                          triple_cards + self._take_kickers(point_cards, combo), triple_point)
                     patterns.append(pattern)
-                    combo_count += 1
-                    # 限制每个三同张最多生成20种带牌组合（增加数量以确保能找到合适的组合）
 
             # 特殊规则：如果只有一张其他牌但这是最后一手牌，也可以打出（三带一）
-            elif len(other_cards) == 1:
-                pattern = CardPattern(CardType.THREE_WITH_TWO, triple_cards + other_cards, triple_point)
+            elif other_count == 1:
+                pattern = CardPattern(CardType.THREE_WITH_TWO, triple_cards + point_cards[others[0][0]], triple_point)
                 patterns.append(pattern)
             # 如果没有其他牌，也可以作为三张单独打出（虽然不是标准三带二，但在某些规则下允许）
-            elif len(other_cards) == 0:
+            else:
                 pattern = CardPattern(CardType.THREE_WITH_TWO, triple_cards, triple_point)
                 patterns.append(pattern)
+
+    def _take_kickers(self, pools, combo) -> List[Card]:
+        """按点数组合从各点数的候选牌中取出带牌（同一点数依次取前几张）"""
+        kickers = []
+        taken = defaultdict(int)
+        for point in combo:
+            kickers.append(pools[point][taken[point]])
+            taken[point] += 1
+        return kickers
     
     def _generate_straight_patterns(self, hand: List[Card], patterns: List[CardPattern]):
         """生成顺子牌型"""
@@ -599,7 +770,7 @@ class GameEngine:
             # 如果序列长度至少为2，则生成飞机带翅膀
             if len(sequence) >= 2:
                 # 收集所有其他牌作为带牌候选
-                other_cards = []
+                wing_pools = {}
                 airplane_points = sequence
                 airplane_cards = []
                 for point in airplane_points:
@@ -608,23 +779,18 @@ class GameEngine:
                 for point, cards in point_cards.items():
                     # 不包括飞机主体的点数
                     if point not in airplane_points:
-                        other_cards.extend(cards)
+                        wing_pools[point] = cards
                     # 对于飞机主体点数，如果有多于3张牌，则多余的部分可以作为带牌
                     elif len(cards) > 3:
-                        other_cards.extend(cards[3:])
+                        wing_pools[point] = cards[3:]
 
-                # 生成带翅膀的飞机（带牌数等于飞机主体数）
+                # 生成带翅膀的飞机（带牌数等于飞机主体数），带牌只按点数组合，不区分花色
                 wing_count = len(airplane_points)
-                if len(other_cards) >= wing_count*2:
-                    from itertools import combinations
-                    # 限制组合数量，避免过多组合导致性能问题
-                    combo_count = 0
-                    for combo in combinations(other_cards, wing_count*2):
-                        all_cards = airplane_cards + list(combo)
-                        pattern = CardPattern(CardType.AIRPLANE_WITH_WINGS, all_cards, airplane_points[0])
-                        patterns.append(pattern)
-                        combo_count += 1
-                        # 限制每个飞机最多生成20种带牌组合
+                others = sorted((point, len(cards)) for point, cards in wing_pools.items())
+                for combo in rank_multisets(others, wing_count*2):
+                    all_cards = airplane_cards + self._take_kickers(wing_pools, combo)
+                    pattern = CardPattern(CardType.AIRPLANE_WITH_WINGS, all_cards, airplane_points[0])
+                    patterns.append(pattern)
 
 
     def _generate_four_with_three_patterns(self, hand: List[Card], patterns: List[CardPattern]):
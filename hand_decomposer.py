@@ -0,0 +1,370 @@
+"""
+手牌拆分
+
+在点数计数向量上把手牌拆分为若干手牌型（每手牌是一个整数编码的出牌动作），
+相同的剩余手牌只求解一次（记忆化），可以得到所有不同的拆分，或按得分取前K个拆分
+"""
+
+import heapq
+from typing import Callable, Dict, Iterable, Iterator, List, Tuple
+
+from cards import _popcount
+from move_generator import COUNTS_MASK, RANK_BITS, counts_code, generate_moves
+
+# 每个点数占4位，最高位作为借位检查位（每个点数的牌数不超过7张）
+_GUARD = int('8' * 13, 16)
+
+Decomposition = Tuple[int, ...]
+
+# 没有动作上限（比任何动作编码都大）
+_NO_BOUND = 1 << 64
+
+
+def _fits(state: int, code: int) -> bool:
+    """code的每个点数的牌数都不超过state"""
+    return ((state | _GUARD) - code) & _GUARD == _GUARD
+
+
+def _lowest_rank(code: int) -> int:
+    """计数编码中最小的点数下标"""
+    return ((code & -code).bit_length() - 1) // RANK_BITS
+
+
+def _move_order(move: int) -> Tuple[int, int]:
+    """拆分中各手牌的排列顺序：按最小的点数，再按动作编码"""
+    code = move & COUNTS_MASK
+    return code & -code, move
+
+
+class HandDecomposer:
+    """
+    手牌拆分器
+
+    只使用给定的出牌动作（默认为这手牌能组成的所有动作），同一个动作在一个拆分中最多使用一次。
+    每次取剩余手牌中最小的点数，只尝试包含该点数的动作；包含同一最小点数的多个动作按编码从大到小选取，
+    因此每个拆分只会被生成一次。剩余手牌的拆分结果会被缓存
+    """
+
+    def __init__(self, counts: List[int], moves: Iterable[int] = None):
+        """
+        Args:
+            counts: 手牌的点数计数向量
+            moves: 可以使用的出牌动作，默认为generate_moves(counts)
+        """
+        self.code = counts_code(counts)
+        if moves is None:
+            moves = generate_moves(counts)
+        # 按动作中最小的点数分组
+        self._moves_by_rank: List[List[Tuple[int, int]]] = [[] for _ in range(len(counts))]
+        for move in dict.fromkeys(moves):
+            code = move & COUNTS_MASK
+            if code and _fits(self.code, code):
+                self._moves_by_rank[_lowest_rank(code)].append((move, code))
+        self._memo: Dict[Tuple[int, int], List[Decomposition]] = {}
+        self._top_memo: Dict[Tuple[int, int], Tuple[int, List[Tuple[float, Decomposition]]]] = {}
+        self._score = None
+
+    def _branches(self, state: int, bound: int) -> Iterator[Tuple[int, int, int]]:
+        """
+        剩余手牌state可以先选的动作
+
+        Returns:
+            Iterator[Tuple[int, int, int]]: (动作, 选完后的剩余手牌, 剩余手牌的动作上限)
+        """
+        rank = _lowest_rank(state)
+        for move, code in self._moves_by_rank[rank]:
+            if move >= bound or not _fits(state, code):
+                continue
+            rest = state - code
+            # 剩余手牌中还有这个点数时，后面包含该点数的动作必须更小
+            yield move, rest, move if rest and _lowest_rank(rest) == rank else _NO_BOUND
+
+    def decompositions(self) -> List[Decomposition]:
+        """
+        所有不同的拆分
+
+        Returns:
+            List[Tuple[int, ...]]: 每个拆分是一组出牌动作，按手数从少到多排列
+        """
+        return sorted(self._solve(self.code, _NO_BOUND), key=len)
+
+    def _solve(self, state: int, bound: int) -> List[Decomposition]:
+        if state == 0:
+            return [()]
+        memo_key = (state, bound)
+        result = self._memo.get(memo_key)
+        if result is not None:
+            return result
+
+        result = []
+        for move, rest, rest_bound in self._branches(state, bound):
+            result.extend((move,) + tail for tail in self._solve(rest, rest_bound))
+        self._memo[memo_key] = result
+        return result
+
+    def top_k(self, k: int, score: Callable[[int], float]) -> List[Tuple[float, Decomposition]]:
+        """
+        得分最高的k个拆分
+
+        Args:
+            k: 返回的拆分数量
+            score: 单手牌（出牌动作）的得分，拆分的得分为各手牌得分之和
+
+        Returns:
+            List[Tuple[float, Tuple[int, ...]]]: (得分, 拆分)，按得分从高到低排列
+        """
+        if k <= 0:
+            return []
+        if score is not self._score:
+            self._score = score
+            self._top_memo = {}
+        return self._solve_top(self.code, _NO_BOUND, k)
+
+    def _solve_top(self, state: int, bound: int, k: int) -> List[Tuple[float, Decomposition]]:
+        if state == 0:
+            return [(0.0, ())]
+        memo_key = (state, bound)
+        cached = self._top_memo.get(memo_key)
+        if cached is not None and cached[0] >= k:
+            return cached[1][:k]
+
+        # 每个分支只需要剩余手牌得分最高的k个拆分
+        candidates = []
+        for move, rest, rest_bound in self._branches(state, bound):
+            move_score = self._score(move)
+            candidates.extend((move_score + tail_score, (move,) + tail)
+                              for tail_score, tail in self._solve_top(rest, rest_bound, k))
+        result = sorted(candidates, key=lambda item: (-item[0], len(item[1]), [_move_order(m) for m in item[1]]))[:k]
+        self._top_memo[memo_key] = (k, result)
+        return result
+
+    def best_first(self, k: int, move_bound: Callable[[int], float],
+                   decomposition_score: Callable[[Decomposition], float] = None,
+                   accept: Callable[[Decomposition], bool] = None) -> List[Tuple[float, Decomposition]]:
+        """
+        用最佳优先搜索找出得分最高的k个拆分
+
+        部分拆分的优先级为已选手牌的得分上界之和加上剩余手牌能达到的最大上界之和（由top_k的记忆化求出），
+        这个估计不会低于任何完整拆分的真实得分，所以按优先级出队的完整拆分就是得分最高的，
+        优先级低于第k个结果的部分拆分不会被展开
+
+        Args:
+            k: 返回的拆分数量
+            move_bound: 单手牌得分的上界
+            decomposition_score: 完整拆分的真实得分，不能超过各手牌上界之和，默认为上界之和
+            accept: 只保留满足条件的拆分
+
+        Returns:
+            List[Tuple[float, Tuple[int, ...]]]: (得分, 拆分)，按得分从高到低排列
+        """
+        if k <= 0:
+            return []
+        bounds: Dict[int, float] = {}
+
+        def bound_of(move):
+            value = bounds.get(move)
+            if value is None:
+                value = bounds[move] = move_bound(move)
+            return value
+
+        def remaining(state, bound):
+            """剩余手牌能达到的最大上界之和，无法拆分时返回None"""
+            best = self._solve_top(state, bound, 1)
+            return best[0][0] if best else None
+
+        # 剩余手牌的估计使用top_k的记忆化，得分函数为上界
+        self._score = bound_of
+        self._top_memo = {}
+        results = []
+        estimate = remaining(self.code, _NO_BOUND)
+        if estimate is None:
+            return results
+        # 队列元素：(-优先级, 序号, 是否完整拆分, 剩余手牌, 动作上限, 已选动作, 已选动作的上界之和)
+        counter = 0
+        queue = [(-estimate, counter, False, self.code, _NO_BOUND, (), 0.0)]
+        while queue and len(results) < k:
+            priority, _, complete, state, bound, moves, gained = heapq.heappop(queue)
+            if complete:
+                results.append((-priority, moves))
+                continue
+            if state == 0:
+                if accept is not None and not accept(moves):
+                    continue
+                score = gained if decomposition_score is None else decomposition_score(moves)
+                counter += 1
+                heapq.heappush(queue, (-score, counter, True, 0, _NO_BOUND, moves, score))
+                continue
+            for move, rest, rest_bound in self._branches(state, bound):
+                rest_estimate = remaining(rest, rest_bound)
+                if rest_estimate is None:
+                    continue
+                move_gained = gained + bound_of(move)
+                counter += 1
+                heapq.heappush(queue, (-(move_gained + rest_estimate), counter, False, rest, rest_bound,
+                                       moves + (move,), move_gained))
+        return results
+
+
+def decompose(counts: List[int], moves: Iterable[int] = None) -> List[Decomposition]:
+    """手牌的所有不同拆分（见HandDecomposer.decompositions）"""
+    return HandDecomposer(counts, moves).decompositions()
+
+
+class MinPlaysSolver:
+    """
+    最少出牌手数求解器
+
+    分支限界搜索：每次只对剩余手牌中最小点数的动作分支，先尝试张数多的动作以尽快得到较好的上界，
+    用可采纳的下界（不会高估剩余手数）剪枝。已求出最优解的剩余手牌和已证明的下界都会被缓存，
+    所以同一个求解器可以在搜索的每个节点上反复调用
+    """
+
+    def __init__(self, counts: List[int], moves: Iterable[int] = None):
+        """
+        Args:
+            counts: 手牌的点数计数向量
+            moves: 可以使用的出牌动作，默认为generate_moves(counts)
+        """
+        self.code = counts_code(counts)
+        if moves is None:
+            moves = generate_moves(counts)
+        self._moves_by_rank: List[List[Tuple[int, int]]] = [[] for _ in range(len(counts))]
+        for move in dict.fromkeys(moves):
+            code = move & COUNTS_MASK
+            if code and _fits(self.code, code):
+                self._moves_by_rank[_lowest_rank(code)].append((move, code))
+        for rank_moves in self._moves_by_rank:
+            rank_moves.sort(key=lambda item: -_card_count(item[1]))
+        self._exact: Dict[int, Decomposition] = {}
+        self._lower: Dict[int, int] = {}
+
+    def solve(self, state: int = None) -> Decomposition:
+        """
+        出完手牌所需手数最少的拆分
+
+        Args:
+            state: 剩余手牌的计数编码，默认为整手牌
+
+        Returns:
+            Tuple[int, ...]: 出牌动作，长度即最少手数
+        """
+        if state is None:
+            state = self.code
+        # 每个点数都可以拆成单张，所以一定有不超过张数的解
+        return self._search(state, _card_count(state) + 1)
+
+    def min_plays(self, state: int = None) -> int:
+        """出完手牌最少需要几手"""
+        return len(self.solve(state))
+
+    def _search(self, state: int, budget: int):
+        """寻找少于budget手的最优拆分，不存在时返回None"""
+        if state == 0:
+            return ()
+        best = self._exact.get(state)
+        if best is not None:
+            return best if len(best) < budget else None
+        bound = max(self._lower.get(state, 0), lower_bound(state))
+        if bound >= budget:
+            return None
+
+        best = None
+        for move, code in self._moves_by_rank[_lowest_rank(state)]:
+            if not _fits(state, code):
+                continue
+            rest = self._search(state - code, budget - 1)
+            if rest is not None:
+                best = (move,) + rest
+                budget = len(best)
+                if budget <= bound:
+                    break
+
+        if best is None:
+            # 少于budget手无解，记录下界
+            self._lower[state] = budget
+        else:
+            self._exact[state] = best
+        return best
+
+
+# 每个点数4位中的各个位
+_ONES = int('1' * 13, 16)
+_NOT_TWO = _ONES & ~(0xF << (RANK_BITS * 12))  # 除2以外的点数
+
+
+def _card_count(code: int) -> int:
+    """计数编码中的总张数"""
+    return (_popcount(code & _ONES) + 2 * _popcount(code & (_ONES << 1))
+            + 4 * _popcount(code & (_ONES << 2)) + 8 * _popcount(code & (_ONES << 3)))
+
+
+def _at_least(code: int, count: int) -> int:
+    """牌数不少于count的点数（每个点数用所在4位的最低位表示）"""
+    if count == 1:
+        return (code | code >> 1 | code >> 2 | code >> 3) & _ONES
+    if count == 2:
+        return (code >> 1 | code >> 2 | code >> 3) & _ONES
+    if count == 3:
+        return (code >> 2 | code >> 3 | (code >> 1 & code)) & _ONES
+    return (code >> 2 | code >> 3) & _ONES
+
+
+def _runs(ranks: int, min_length: int) -> Tuple[int, int]:
+    """
+    ranks中的连续点数
+
+    Returns:
+        Tuple[int, int]: (最长连续点数的长度, 属于长度不少于min_length的连续序列的点数)
+    """
+    starts = ranks
+    longest = 0
+    covered = 0
+    length = 1
+    while starts:
+        longest = length
+        if length >= min_length:
+            # starts为长度至少为length的序列的起点，把序列中的点数都标记出来
+            run = starts
+            for _ in range(length - 1):
+                run |= run << RANK_BITS
+            covered |= run
+        starts &= ranks >> (RANK_BITS * length)
+        length += 1
+    return (longest if longest >= min_length else 0), covered
+
+
+def lower_bound(state: int) -> int:
+    """
+    剩余手牌最少还需要几手的下界（可采纳，不会高估）
+
+    取以下两个下界中较大的一个：
+    1. 总张数除以一手牌最多能出的张数
+    2. 孤立点数（不超过两张、且不能组成顺子和连对的点数）只能单独出或者作为带牌，
+       每个三同张最多带走两个孤立点数，其余的孤立点数各需要一手；其他点数至少还需要一手
+    """
+    if state == 0:
+        return 0
+    present = _at_least(state, 1)
+    pairs = _at_least(state, 2)
+    triples = _at_least(state, 3)
+
+    # 顺子不能包含2，连对和飞机沿用同样的点数范围
+    straight, in_straight = _runs(present & _NOT_TWO, 5)
+    double, in_double = _runs(pairs & _NOT_TWO, 2)
+    airplane, _ = _runs(triples & _NOT_TWO, 2)
+
+    triple_count = _popcount(triples)
+    max_play = 2 if pairs else 1
+    if triples:
+        max_play = 5
+    max_play = max(max_play, straight, 2 * double, 5 * airplane)
+    by_size = -(-_card_count(state) // max_play)
+
+    isolated = present & ~triples & ~in_straight & ~in_double
+    by_rank = max(0, _popcount(isolated) - 2 * triple_count) + (1 if present != isolated else 0)
+    return max(by_size, by_rank)
+
+
+def min_plays(counts: List[int], moves: Iterable[int] = None) -> Decomposition:
+    """出完手牌所需手数最少的拆分（见MinPlaysSolver.solve）"""
+    return MinPlaysSolver(counts, moves).solve()
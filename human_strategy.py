@@ -1,7 +1,8 @@
 import math
+from itertools import compress
 from typing import Tuple, List
 
-from cards import Card, CardType, CardPattern, compare_patterns
+from cards import Card, CardType, CardPattern, compare_patterns, beats_mask
 from game import GameEngine
 from strategy import AIStrategy
 
@@ -52,21 +53,13 @@ class HumanStrategy(AIStrategy):
 
         remaining_cards = self.refine_remaining_cards(engine)
         opponent_possible_patterns = self.generate_all_patterns_from_cards(remaining_cards,  engine)
-        all_groups = engine.get_valid_pattern_groups(self.player_id)
-
-        # 找到分数最大的分组
-        best_group = None
-        max_score = float('-inf')
-        
-        for group in all_groups:
-            score = self.calculate_group_score(group, opponent_possible_patterns, engine)
-            if score > max_score:
-                max_score = score
-                best_group = group
+        # 找到分数最大的分组（在搜索中用单个牌型的得分上界剪枝）
+        best_groups = self.best_pattern_groups(engine, self.player_id, opponent_possible_patterns, engine)
         
         # 如果没有找到有效的分组，返回pass
-        if best_group is None:
+        if not best_groups:
             return ("pass", [])
+        best_group = best_groups[0]
         
         # 从最佳分组中选择一个牌型
         chosen_pattern = self.choose_pattern(best_group, opponent_possible_patterns, engine)
@@ -85,20 +78,38 @@ class HumanStrategy(AIStrategy):
 
         temp_engine.state.players = [remaining_hand, []]  # 我们只关心玩家0的手牌
         
-        # 获取所有可能的出牌分组
-        pattern_groups = temp_engine.get_valid_pattern_groups(0)
+        # 获取得分最高的出牌分组
+        pattern_groups = self.best_pattern_groups(temp_engine, 0, opponent_possible_patterns, engine)
         
         if not pattern_groups:
             return 0
             
-        # 对每个分组计算得分，返回最高得分
-        max_score = 0
-        for group in pattern_groups:  # 限制检查前5个分组以提高性能
-            group_score = self.calculate_group_score(group, opponent_possible_patterns, engine)
-            if group_score > max_score:
-                max_score = group_score
-                
-        return max_score
+        # 返回最高得分
+        return max(0, self.calculate_group_score(pattern_groups[0], opponent_possible_patterns, engine))
+
+    def best_pattern_groups(self, group_engine: GameEngine, player_id: int,
+                            opponent_possible_patterns: List[CardPattern], engine: GameEngine,
+                            top_k: int = 1) -> List[List[CardPattern]]:
+        """
+        按calculate_group_score找出group_engine中玩家得分最高的top_k个分组
+
+        Args:
+            group_engine: 用来拆分手牌的引擎
+            player_id: group_engine中的玩家ID
+            opponent_possible_patterns: 对手可能的牌型
+            engine: 计算得分时使用的引擎（当前对局）
+        """
+        return group_engine.get_valid_pattern_groups(
+            player_id,
+            score_fn=lambda group: self.calculate_group_score(group, opponent_possible_patterns, engine),
+            top_k=top_k,
+            pattern_bound=lambda pattern: self.pattern_score_bound(pattern, opponent_possible_patterns, engine))
+
+    def pattern_score_bound(self, pattern: CardPattern, opponent_possible_patterns: List[CardPattern],
+                            engine: GameEngine) -> float:
+        """单个牌型在calculate_group_score中得分的上界（分组中有其他牌型时炸弹的得分乘5）"""
+        score = self.calculate_group_score([pattern], opponent_possible_patterns, engine)
+        return score * 5 if pattern.type == CardType.BOMB else score
 
     def refine_remaining_cards(self, engine: GameEngine) -> List[Card]:
         """
@@ -180,8 +191,12 @@ class HumanStrategy(AIStrategy):
 
         filtered_cards = []
         # 如果出过三带二的牌型，那么被带的单牌的数量最多剩余1张。
-        opponent_moves = [move for move in engine.game_history if move['player'] == opponent_id]
-        for move in opponent_moves:
+        history = engine.game_history
+        for i in range(len(history)):
+            # 只把对手出过的牌转换为牌型
+            if history.players[i] != opponent_id or history.is_pass(i):
+                continue
+            move = history[i]
             if move['pattern'] is not None and move['pattern'].type == CardType.THREE_WITH_TWO:
                 carried_cards = [card for card in move['pattern'].cards if card.point != move['pattern'].main_point]
                 for c in carried_cards:
@@ -203,25 +218,21 @@ class HumanStrategy(AIStrategy):
         '''
         opponent_id = 1 - self.player_id
         skipped_moves = []
-        for i in range(len(engine.game_history) - 1):
-            move = engine.game_history[i]
-            next_move = engine.game_history[i + 1] if i + 1 < len(engine.game_history) else None
+        history = engine.game_history
+        players = history.players
+        for i in range(len(history) - 1):
             # 如果当前玩家出牌，下一个玩家跳过，说明下一个玩家无法管住当前玩家的牌
-            if move['player'] != opponent_id and next_move and next_move['player'] == opponent_id and not next_move[
-                'cards']:
-                skipped_moves.append(move['pattern'])
+            # 出牌记录中也有跳过，跳过之后对手再跳过不说明任何事
+            if history.is_pass(i):
+                continue
+            if players[i] != opponent_id and players[i + 1] == opponent_id and history.is_pass(i + 1):
+                skipped_moves.append(history[i]['pattern'])
         return skipped_moves
 
     def get_opponent_played_point_counts(self, engine: GameEngine):
-        opponent_id = 1 - self.player_id
-        opponent_moves = [move for move in engine.game_history if move['player'] == opponent_id]
-        opponent_played_cards = []
-        for move in opponent_moves:
-            opponent_played_cards.extend(move['cards'])
-        played_point_counts = {}
-        for card in opponent_played_cards:
-            played_point_counts[card.point] = played_point_counts.get(card.point, 0) + 1
-        return played_point_counts
+        # 出牌记录中增量维护了各玩家已出的各点数牌数，不需要扫描历史
+        counts = engine.game_history.played_rank_counts(1 - self.player_id)
+        return {i + 3: count for i, count in enumerate(counts) if count}
 
     def generate_all_patterns_from_cards(self, cards: List[Card], engine:GameEngine):
         """基于给定牌生成所有可能的牌型"""
@@ -324,7 +335,7 @@ class HumanStrategy(AIStrategy):
         for skip_pattern in skipped_move_patterns:
             if pattern==skip_pattern or compare_patterns(pattern,skip_pattern):
                 return 1
-        maybe_covered = [p for p in opponent_possible_patterns if compare_patterns(p, pattern)]
+        maybe_covered = list(compress(opponent_possible_patterns, beats_mask(opponent_possible_patterns, pattern)))
         not_covered_possibility = 1
         if len(maybe_covered) == 0:
             return 1
@@ -0,0 +1,441 @@
+"""
+基于点数计数的出牌生成器
+
+手牌先统计成13个元素的点数计数向量，所有牌型都在点数层面一次生成，
+每个出牌动作编码为一个整数，只有需要时才转换为CardPattern对象
+"""
+
+from typing import Collection, Dict, Iterable, Iterator, List, Tuple
+
+from cards import Card, CardType, CardPattern, RANKS
+
+# 出牌动作的整数编码：
+# 低52位为13个点数各出几张（每个点数占4位，下标0..12对应点数3..2），
+# 52..55位为牌型值，56..59位为主牌点数
+RANK_BITS = 4
+TYPE_SHIFT = 52
+MAIN_SHIFT = 56
+COUNTS_MASK = (1 << TYPE_SHIFT) - 1
+
+_CARD_TYPES = {card_type.value: card_type for card_type in CardType}
+_RANK_COUNT = len(RANKS)
+_ACE = 11  # A的点数下标
+_TWO = 12  # 2的点数下标
+
+
+def encode_move(card_type: CardType, main_point: int, counts_code: int) -> int:
+    """把牌型、主牌点数和点数计数编码为一个整数"""
+    return counts_code | (card_type.value << TYPE_SHIFT) | (main_point << MAIN_SHIFT)
+
+
+def move_type(move: int) -> CardType:
+    """动作的牌型"""
+    return _CARD_TYPES[(move >> TYPE_SHIFT) & 0xF]
+
+
+def move_main_point(move: int) -> int:
+    """动作的主牌点数"""
+    return (move >> MAIN_SHIFT) & 0xF
+
+
+def move_counts(move: int) -> List[int]:
+    """动作中各点数的牌数"""
+    return [(move >> (RANK_BITS * i)) & 0xF for i in range(_RANK_COUNT)]
+
+
+def move_card_count(move: int) -> int:
+    """动作的出牌张数"""
+    return sum(move_counts(move))
+
+
+def counts_code(counts: List[int]) -> int:
+    """把点数计数向量编码为整数"""
+    code = 0
+    for i, count in enumerate(counts):
+        code |= count << (RANK_BITS * i)
+    return code
+
+
+# 动作解码结果的缓存：动作 -> (牌型, 主牌点数, 规范键, ((点数下标, 张数), ...))
+_MOVE_LAYOUTS: Dict[int, Tuple[CardType, int, int, Tuple[Tuple[int, int], ...]]] = {}
+
+
+def move_layout(move: int) -> Tuple[CardType, int, int, Tuple[Tuple[int, int], ...]]:
+    """解码动作，结果会被缓存"""
+    layout = _MOVE_LAYOUTS.get(move)
+    if layout is None:
+        card_type = move_type(move)
+        main_point = move_main_point(move)
+        counts = move_counts(move)
+        if card_type == CardType.BOMB or card_type == CardType.THREE_WITH_TWO:
+            size = 0
+        elif card_type == CardType.AIRPLANE_WITH_WINGS:
+            size = _max_triple_run(counts)
+        else:
+            size = sum(counts)
+        # 与CardPattern的规范键编码一致
+        key = ((card_type.value * 32 + size) << 4) | main_point
+        ranks = tuple((i, count) for i, count in enumerate(counts) if count)
+        layout = _MOVE_LAYOUTS[move] = (card_type, main_point, key, ranks)
+    return layout
+
+
+def move_key(move: int) -> int:
+    """动作对应牌型的规范键"""
+    return move_layout(move)[2]
+
+
+def _max_triple_run(counts: List[int]) -> int:
+    """最长的连续三同张数量（与飞机带翅膀的比较规则一致）"""
+    best = 0
+    current = 0
+    for count in counts:
+        current = current + 1 if count >= 3 else 0
+        best = max(best, current)
+    return best
+
+
+def _runs(ranks: List[int]) -> List[List[int]]:
+    """对每个起点，找出从该起点开始的最长连续点数序列"""
+    sequences = []
+    for start in range(len(ranks)):
+        sequence = [ranks[start]]
+        for i in range(start + 1, len(ranks)):
+            if ranks[i] == sequence[-1] + 1:
+                sequence.append(ranks[i])
+            else:
+                break
+        sequences.append(sequence)
+    return sequences
+
+
+def rank_multisets(available: List[Tuple[int, int]], size: int, start: int = 0) -> Iterator[Tuple[int, ...]]:
+    """
+    按字典序枚举从候选点数中取size张牌的所有点数组合
+
+    同点数不同花色的牌视为相同，每种点数组合只出现一次
+
+    Args:
+        available: (点数, 可用张数) 列表，按点数升序排列
+        size: 取牌张数
+        start: 从第几个候选点数开始取（递归使用）
+
+    Returns:
+        Iterator[Tuple[int, ...]]: 升序排列的点数组合
+    """
+    if size == 0:
+        yield ()
+        return
+    for j in range(start, len(available)):
+        rank, count = available[j]
+        if count == 0:
+            continue
+        # 组合中最小的点数为rank，剩下的牌从rank及更大的点数中取
+        available[j] = (rank, count - 1)
+        for rest in rank_multisets(available, size - 1, j):
+            yield (rank,) + rest
+        available[j] = (rank, count)
+
+
+def _bomb_moves(counts: List[int], present: List[int], min_point: int = 0) -> Iterator[int]:
+    """生成炸弹（四张同点数和三张A），只保留主牌点数大于min_point的"""
+    for i in present:
+        if counts[i] >= 4 and i + 3 > min_point:
+            yield encode_move(CardType.BOMB, i + 3, 4 << (RANK_BITS * i))
+    if counts[_ACE] >= 3 and 14 > min_point:
+        yield encode_move(CardType.BOMB, 14, 3 << (RANK_BITS * _ACE))
+
+
+def _airplane_with_wings_moves(counts: List[int], present: List[int], triples: List[int],
+                               min_point: int = 0, max_length: int = _RANK_COUNT) -> Iterator[int]:
+    """
+    生成飞机带翅膀（带牌数等于三同张数量的两倍）
+
+    只生成主牌点数大于min_point且飞机主体不超过max_length个三同张的
+    """
+    for sequence in _runs(triples):
+        if len(sequence) < 2 or len(sequence) > max_length or sequence[0] + 3 <= min_point:
+            continue
+        body = encode_move(CardType.AIRPLANE_WITH_WINGS, sequence[0] + 3, 0)
+        others = []
+        for i in present:
+            if i not in sequence:
+                others.append((i, counts[i]))
+            elif counts[i] > 3:
+                # 飞机主体点数多于3张的部分可以作为带牌
+                others.append((i, counts[i] - 3))
+        for i in sequence:
+            body += 3 << (RANK_BITS * i)
+        # 带牌按点数组合生成，花色不同但点数相同的带牌只生成一次
+        for combo in rank_multisets(others, len(sequence) * 2):
+            move = body
+            for i in combo:
+                move += 1 << (RANK_BITS * i)
+            yield move
+
+
+def _sequence_moves(card_type: CardType, ranks: List[int], width: int, min_length: int,
+                    min_point: int = 0, length: int = None) -> Iterator[int]:
+    """
+    生成由连续点数组成的牌型（飞机、顺子、连对）
+
+    Args:
+        card_type: 牌型
+        ranks: 可用的点数下标（升序）
+        width: 每个点数出几张
+        min_length: 最少连续几个点数
+        min_point: 只生成主牌点数大于该值的
+        length: 只生成连续点数个数等于该值的，默认生成所有长度
+    """
+    for sequence in _runs(ranks):
+        if sequence[0] + 3 <= min_point:
+            continue
+        code = 0
+        for current, i in enumerate(sequence, 1):
+            code += width << (RANK_BITS * i)
+            if current >= min_length and (length is None or current == length):
+                yield encode_move(card_type, sequence[0] + 3, code)
+
+
+def _three_with_two_moves(counts: List[int], present: List[int], triples: List[int],
+                          min_point: int = 0) -> Iterator[int]:
+    """生成三带二（只剩一张或没有其他牌时可以三带一或只出三张）"""
+    for triple in triples:
+        if triple + 3 <= min_point:
+            continue
+        body = encode_move(CardType.THREE_WITH_TWO, triple + 3, 3 << (RANK_BITS * triple))
+        others = [(i, counts[i]) for i in present if i != triple]
+        other_count = sum(count for _, count in others)
+        if other_count >= 2:
+            for first, second in rank_multisets(others, 2):
+                yield body + (1 << (RANK_BITS * first)) + (1 << (RANK_BITS * second))
+        elif other_count == 1:
+            yield body + (1 << (RANK_BITS * others[0][0]))
+        else:
+            yield body
+
+
+def _group_moves(card_type: CardType, counts: List[int], present: List[int], width: int,
+                 min_point: int = 0) -> Iterator[int]:
+    """生成同点数的牌型（对子、单张）"""
+    for i in present:
+        if counts[i] >= width and i + 3 > min_point:
+            yield encode_move(card_type, i + 3, width << (RANK_BITS * i))
+
+
+def iter_moves(counts: List[int], hand_size: int = None,
+               card_types: Collection[CardType] = None) -> Iterator[int]:
+    """
+    按优先级顺序逐个生成出牌动作
+
+    生成顺序与GameEngine原有的牌型生成顺序一致：
+    炸弹 > 飞机带翅膀 > 飞机 > 顺子 > 连对 > 三带二 > 对子 > 单张。
+    调用方可以随时停止迭代，未用到的牌型（包括带牌组合）不会被生成
+
+    Args:
+        counts: 手牌的点数计数向量
+        hand_size: 手牌数量，默认为计数之和
+        card_types: 只生成这些牌型，默认生成所有牌型
+
+    Returns:
+        Iterator[int]: 整数编码的出牌动作
+    """
+    if hand_size is None:
+        hand_size = sum(counts)
+    present = [i for i in range(_RANK_COUNT) if counts[i]]
+    triples = [i for i in present if counts[i] >= 3]
+
+    def wanted(card_type):
+        return card_types is None or card_type in card_types
+
+    if wanted(CardType.BOMB):
+        yield from _bomb_moves(counts, present)
+    if hand_size >= 7 and wanted(CardType.AIRPLANE_WITH_WINGS):
+        yield from _airplane_with_wings_moves(counts, present, triples)
+    if hand_size >= 6 and wanted(CardType.AIRPLANE):
+        yield from _sequence_moves(CardType.AIRPLANE, triples, 3, 2)
+    # 顺子不能包含2
+    if hand_size >= 5 and wanted(CardType.STRAIGHT):
+        yield from _sequence_moves(CardType.STRAIGHT, [i for i in present if i != _TWO], 1, 5)
+    if hand_size >= 4 and wanted(CardType.DOUBLE_STRAIGHT):
+        yield from _sequence_moves(CardType.DOUBLE_STRAIGHT, [i for i in present if counts[i] >= 2], 2, 2)
+    if hand_size >= 3 and wanted(CardType.THREE_WITH_TWO):
+        yield from _three_with_two_moves(counts, present, triples)
+    if wanted(CardType.PAIR):
+        yield from _group_moves(CardType.PAIR, counts, present, 2)
+    if wanted(CardType.SINGLE):
+        yield from _group_moves(CardType.SINGLE, counts, present, 1)
+
+
+def generate_moves(counts: List[int], hand_size: int = None) -> List[int]:
+    """
+    生成所有可能的出牌动作（顺序见iter_moves）
+
+    Args:
+        counts: 手牌的点数计数向量
+        hand_size: 手牌数量，默认为计数之和
+
+    Returns:
+        List[int]: 整数编码的出牌动作
+    """
+    return list(iter_moves(counts, hand_size))
+
+
+def iter_cover_moves(counts: List[int], target_key: int, hand_size: int = None,
+                     card_types: Collection[CardType] = None) -> Iterator[int]:
+    """
+    逐个生成能管住目标牌型的出牌动作
+
+    直接按目标牌型的规范键确定需要生成的牌型和长度：
+    比目标大的炸弹，以及同牌型、同长度且主牌点数更大的牌型。
+    结果及顺序与先调用generate_moves再用compare_patterns过滤一致
+
+    Args:
+        counts: 手牌的点数计数向量
+        target_key: 目标牌型的规范键（CardPattern.key）
+        hand_size: 手牌数量，默认为计数之和
+        card_types: 只生成这些牌型，默认生成所有牌型
+
+    Returns:
+        Iterator[int]: 整数编码的出牌动作
+    """
+    if hand_size is None:
+        hand_size = sum(counts)
+    present = [i for i in range(_RANK_COUNT) if counts[i]]
+    group = target_key >> 4
+    main_point = target_key & 0xF
+    target_type = _CARD_TYPES.get(group >> 5)
+    size = group & 31
+
+    if card_types is None or CardType.BOMB in card_types:
+        yield from _bomb_moves(counts, present, main_point if target_type == CardType.BOMB else 0)
+    if target_type == CardType.BOMB or (card_types is not None and target_type not in card_types):
+        return
+
+    triples = [i for i in present if counts[i] >= 3]
+    if target_type == CardType.AIRPLANE_WITH_WINGS:
+        if hand_size >= 7:
+            # 带牌也可能组成三同张，所以还要按规范键确认三同张数量相同
+            for move in _airplane_with_wings_moves(counts, present, triples, main_point, size):
+                if move_key(move) >> 4 == group:
+                    yield move
+    elif target_type == CardType.AIRPLANE:
+        if hand_size >= 6 and size % 3 == 0:
+            yield from _sequence_moves(CardType.AIRPLANE, triples, 3, 2, main_point, size // 3)
+    elif target_type == CardType.STRAIGHT:
+        if hand_size >= 5:
+            yield from _sequence_moves(CardType.STRAIGHT, [i for i in present if i != _TWO], 1, 5,
+                                       main_point, size)
+    elif target_type == CardType.DOUBLE_STRAIGHT:
+        if hand_size >= 4 and size % 2 == 0:
+            yield from _sequence_moves(CardType.DOUBLE_STRAIGHT, [i for i in present if counts[i] >= 2], 2, 2,
+                                       main_point, size // 2)
+    elif target_type == CardType.THREE_WITH_TWO:
+        if hand_size >= 3:
+            yield from _three_with_two_moves(counts, present, triples, main_point)
+    elif target_type == CardType.PAIR:
+        if size == 2:
+            yield from _group_moves(CardType.PAIR, counts, present, 2, main_point)
+    elif target_type == CardType.SINGLE:
+        if size == 1:
+            yield from _group_moves(CardType.SINGLE, counts, present, 1, main_point)
+
+
+def generate_cover_moves(counts: List[int], target_key: int, hand_size: int = None) -> List[int]:
+    """
+    只生成能管住目标牌型的出牌动作（见iter_cover_moves）
+
+    Args:
+        counts: 手牌的点数计数向量
+        target_key: 目标牌型的规范键（CardPattern.key）
+        hand_size: 手牌数量，默认为计数之和
+
+    Returns:
+        List[int]: 整数编码的出牌动作
+    """
+    return list(iter_cover_moves(counts, target_key, hand_size))
+
+
+class MoveGenerator:
+    """
+    出牌生成器
+
+    创建时把手牌按点数分组一次（同点数的牌按序号排列），
+    之后生成的整数动作可以按需转换为使用手中具体牌的CardPattern
+    """
+    __slots__ = ('cards_by_rank', 'counts', 'hand_size')
+
+    def __init__(self, hand: Iterable[Card]):
+        self.cards_by_rank: List[List[Card]] = [[] for _ in range(_RANK_COUNT)]
+        self.hand_size = 0
+        for card in sorted(hand, key=lambda c: c.ordinal):
+            self.cards_by_rank[card.point - 3].append(card)
+            self.hand_size += 1
+        self.counts = [len(cards) for cards in self.cards_by_rank]
+
+    def moves(self) -> List[int]:
+        """生成所有可能的出牌动作"""
+        return generate_moves(self.counts, self.hand_size)
+
+    def cover_moves(self, last_pattern: CardPattern) -> List[int]:
+        """只生成能管住上一手牌的出牌动作"""
+        return generate_cover_moves(self.counts, last_pattern.key, self.hand_size)
+
+    def iter_moves(self, last_pattern: CardPattern = None, card_types: Collection[CardType] = None) -> Iterator[int]:
+        """
+        按优先级顺序逐个生成出牌动作
+
+        Args:
+            last_pattern: 需要管住的上一手牌，为None时生成所有出牌动作
+            card_types: 只生成这些牌型，默认生成所有牌型
+        """
+        if last_pattern is None:
+            return iter_moves(self.counts, self.hand_size, card_types)
+        return iter_cover_moves(self.counts, last_pattern.key, self.hand_size, card_types)
+
+    def expand(self, move: int) -> List[Card]:
+        """确定动作使用的具体牌，每个点数取手中序号最小的几张牌"""
+        cards = []
+        for i, count in move_layout(move)[3]:
+            cards.extend(self.cards_by_rank[i][:count])
+        return cards
+
+    def to_pattern(self, move: int, lazy: bool = False) -> CardPattern:
+        """
+        把整数动作转换为CardPattern
+
+        Args:
+            move: 整数编码的出牌动作
+            lazy: 为True时返回LazyCardPattern，直到访问cards（即真正出牌）时才确定花色
+        """
+        if lazy:
+            return LazyCardPattern(self, move)
+        card_type, main_point, key, _ = move_layout(move)
+        return CardPattern.from_sorted(card_type, self.expand(move), main_point, key)
+
+    def patterns(self, lazy: bool = False) -> List[CardPattern]:
+        """生成所有可能的牌型"""
+        return [self.to_pattern(move, lazy) for move in self.moves()]
+
+
+class LazyCardPattern(CardPattern):
+    """
+    延迟确定花色的牌型
+
+    牌型、主牌点数、张数和规范键在创建时就已确定，可以直接用于比较；
+    具体使用哪几张牌只在第一次访问cards时才从生成器中取出
+    """
+
+    def __init__(self, generator: MoveGenerator, move: int):
+        self.type, self.main_point, self.key, _ = move_layout(move)
+        self.card_count = move_card_count(move)
+        self.move = move
+        self._generator = generator
+        self._cards = None
+
+    @property
+    def cards(self) -> List[Card]:
+        if self._cards is None:
+            self._cards = self._generator.expand(self.move)
+            self._generator = None
+        return self._cards
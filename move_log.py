@@ -0,0 +1,162 @@
+"""
+紧凑的出牌记录
+
+每一步只保存玩家、动作编码（与move_generator的整数动作编码一致，跳过为0）和所出牌的位掩码，
+存放在array中；同时增量维护每个玩家已出的各点数牌数和已出牌的位掩码，策略可以直接查询，
+不需要每次决策都重新扫描历史。
+
+为了兼容原来的用法，按下标或迭代访问时返回{'player', 'cards', 'pattern'}字典，
+也可以直接append这样的字典
+"""
+
+from array import array
+from typing import Dict, Iterable, Iterator, List, Optional
+
+from cards import CardPattern, Hand, rank_counts
+from move_generator import encode_move, counts_code, move_layout
+
+# 跳过的动作编码（任何出牌的编码都至少包含一张牌，不会为0）
+PASS = 0
+
+
+class MoveLog:
+    """按数组存储的出牌记录，支持下标访问、迭代、append和pop"""
+
+    def __init__(self, moves: Iterable[dict] = ()):
+        self.players = array('b')
+        self.actions = array('Q')
+        self.masks = array('Q')
+        # 每个玩家已出的各点数牌数（下标0..12对应点数3..2）和已出牌的位掩码
+        self._rank_counts = [[0] * 13, [0] * 13]
+        self._played_masks = [0, 0]
+        # 通过append直接加入的字典原样保存，访问时原样返回
+        self._entries: Dict[int, dict] = {}
+        for move in moves:
+            self.append(move)
+
+    def record_play(self, player_id: int, pattern: CardPattern, mask: Optional[int] = None):
+        """记录一次出牌，mask为所出牌的位掩码（调用方已经算过时传入）"""
+        cards = pattern.cards
+        counts = rank_counts(cards)
+        self._push(player_id, encode_move(pattern.type, pattern.main_point, counts_code(counts)),
+                   Hand.from_cards(cards).mask if mask is None else mask, counts)
+
+    def record_pass(self, player_id: int):
+        """记录一次跳过"""
+        self._push(player_id, PASS, 0, None)
+
+    def append(self, move: dict):
+        """追加一条{'player', 'cards', 'pattern'}格式的记录"""
+        cards = move.get('cards') or []
+        pattern = move.get('pattern')
+        if pattern is not None and cards:
+            action = encode_move(pattern.type, pattern.main_point, counts_code(rank_counts(cards)))
+        else:
+            action = PASS
+        self._entries[len(self.players)] = move
+        self._push(move['player'], action, Hand.from_cards(cards).mask, rank_counts(cards) if cards else None)
+
+    def _push(self, player_id: int, action: int, mask: int, counts: Optional[List[int]]):
+        self.players.append(player_id)
+        self.actions.append(action)
+        self.masks.append(mask)
+        if counts is not None:
+            played = self._rank_counts[player_id]
+            for i, count in enumerate(counts):
+                played[i] += count
+            self._played_masks[player_id] |= mask
+
+    def pop(self) -> dict:
+        """移除并返回最后一条记录，已出牌的统计同时回退"""
+        move = self[len(self.players) - 1]
+        self.discard()
+        return move
+
+    def discard(self):
+        """
+        移除最后一条记录，已出牌的统计同时回退
+
+        与pop相同但不构造返回的字典，已出的各点数牌数由动作编码回退（GameEngine.undo使用）
+        """
+        index = len(self.players) - 1
+        player_id = self.players.pop()
+        action = self.actions.pop()
+        mask = self.masks.pop()
+        played = self._rank_counts[player_id]
+        entry = self._entries.pop(index, None)
+        if entry is not None:
+            cards = entry.get('cards')
+            if not cards:
+                return
+            for card in cards:
+                played[card.point - 3] -= 1
+        elif action != PASS:
+            for rank, count in move_layout(action)[3]:
+                played[rank] -= count
+        else:
+            return
+        if self._entries:
+            # 手动加入的记录中可能有重复的牌，位掩码按剩余记录重新计算
+            self._played_masks[player_id] = 0
+            for i in range(index):
+                if self.players[i] == player_id:
+                    self._played_masks[player_id] |= self.masks[i]
+        else:
+            self._played_masks[player_id] &= ~mask
+
+    def played_rank_counts(self, player_id: int) -> List[int]:
+        """玩家已出的各点数牌数，下标0..12对应点数3..2"""
+        return list(self._rank_counts[player_id])
+
+    def played_count(self, player_id: int, point: int) -> int:
+        """玩家已出的某个点数的牌数"""
+        return self._rank_counts[player_id][point - 3]
+
+    def played_mask(self, player_id: int) -> int:
+        """玩家已出的所有牌的位掩码"""
+        return self._played_masks[player_id]
+
+    def is_pass(self, index: int) -> bool:
+        """第index步是否是跳过"""
+        return self.masks[index] == 0
+
+    def copy(self) -> 'MoveLog':
+        log = MoveLog.__new__(MoveLog)
+        log.players = array('b', self.players)
+        log.actions = array('Q', self.actions)
+        log.masks = array('Q', self.masks)
+        log._rank_counts = [list(counts) for counts in self._rank_counts]
+        log._played_masks = list(self._played_masks)
+        log._entries = dict(self._entries)
+        return log
+
+    def clear(self):
+        self.__init__()
+
+    def _move(self, index: int) -> dict:
+        entry = self._entries.get(index)
+        if entry is not None:
+            return entry
+        action = self.actions[index]
+        if action == PASS:
+            return {'player': self.players[index], 'cards': [], 'pattern': None}
+        cards = Hand(self.masks[index]).to_cards()
+        card_type, main_point, key, _ = move_layout(action)
+        return {'player': self.players[index], 'cards': cards,
+                'pattern': CardPattern.from_sorted(card_type, cards, main_point, key)}
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self._move(i) for i in range(*index.indices(len(self.players)))]
+        if index < 0:
+            index += len(self.players)
+        if not 0 <= index < len(self.players):
+            raise IndexError('move log index out of range')
+        return self._move(index)
+
+    def __len__(self) -> int:
+        return len(self.players)
+
+    def __iter__(self) -> Iterator[dict]:
+        for i in range(len(self.players)):
+            yield self._move(i)
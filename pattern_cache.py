@@ -0,0 +1,56 @@
+"""
+有效牌型的全局缓存
+
+同样的手牌在不同对局、模拟和策略中会反复出现，
+所有GameEngine实例共享一个有大小上限的LRU缓存，
+以手牌位掩码和需要管住的牌型规范键作为键
+"""
+
+from collections import OrderedDict
+from typing import Dict, Hashable, List, Optional
+
+from cards import CardPattern
+
+
+class PatternCache:
+    """有大小上限的LRU缓存，记录命中和未命中次数"""
+
+    def __init__(self, maxsize: int = 8192):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries: 'OrderedDict[Hashable, List[CardPattern]]' = OrderedDict()
+
+    def get(self, key: Hashable) -> Optional[List[CardPattern]]:
+        """查找缓存，命中时把该项移到最近使用的位置"""
+        patterns = self._entries.get(key)
+        if patterns is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return patterns
+
+    def put(self, key: Hashable, patterns: List[CardPattern]):
+        """加入缓存，超过大小上限时淘汰最久未使用的项"""
+        self._entries[key] = patterns
+        self._entries.move_to_end(key)
+        if len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        """清空缓存和计数"""
+        self._entries.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def stats(self) -> Dict[str, int]:
+        """缓存统计信息"""
+        return {'hits': self.hits, 'misses': self.misses, 'size': len(self._entries), 'maxsize': self.maxsize}
+
+    def __len__(self):
+        return len(self._entries)
+
+
+# 进程内所有GameEngine共享的有效牌型缓存
+valid_patterns_cache = PatternCache()
@@ -0,0 +1,430 @@
+"""
+经验回放缓冲区
+
+预先分配的环形缓冲区，按字段分别存放在连续的NumPy数组中（状态、下一状态为float32），
+插入是O(1)的数组赋值，采样是向量化的下标抽取，容量达到数百万条也没有Python对象的开销。
+
+下一状态的合法动作掩码有数万位，不直接保存，而是保存计算掩码的输入（当前玩家各点数牌数、
+上一手牌的规范键、连续跳过次数，共18字节），采样时用action_space.legal_action_masks批量还原
+
+PrioritizedReplayBuffer按TD误差确定的优先级采样（基于数组实现的求和树，采样和更新优先级都是O(log N)，
+对一批下标向量化执行），并给出重要性采样权重。跑得快的胜负奖励稀疏，均匀采样大部分是信息很少的经验
+
+MemmapReplayBuffer把各字段分片保存在磁盘上的numpy.memmap文件中，可以容纳数千万条经验，
+训练进程被终止后用同一目录重新打开即可继续使用已收集的经验
+"""
+
+import json
+import os
+from typing import Dict, List, Optional, Tuple, Union
+
+import numpy as np
+
+from action_space import legal_action_masks
+
+# 下一状态合法动作掩码的输入：(各点数牌数, 上一手牌的规范键, 连续跳过次数)
+LegalInputs = Tuple[np.ndarray, np.ndarray, np.ndarray]
+
+
+class ReplayBuffer:
+    """
+    结构化数组形式的经验回放缓冲区，写满后覆盖最早的经验
+
+    Args:
+        capacity: 最多保存的经验条数
+        state_size: 状态向量长度
+        seed: 采样用的随机种子
+    """
+
+    def __init__(self, capacity: int, state_size: int, seed: Optional[int] = None):
+        self.capacity = capacity
+        self.state_size = state_size
+        for name, dtype, shape in self._fields():
+            setattr(self, name, self._allocate(name, dtype, shape))
+        self.position = 0
+        self.size = 0
+        self.rng = np.random.default_rng(seed)
+
+    def _fields(self) -> List[Tuple[str, type, Tuple[int, ...]]]:
+        """各字段的(名称, 类型, 每条经验的形状)"""
+        return [
+            ('states', np.float32, (self.state_size,)),
+            ('actions', np.int32, ()),
+            ('rewards', np.float32, ()),
+            ('next_states', np.float32, (self.state_size,)),
+            ('dones', np.bool_, ()),
+            # 下一状态合法动作掩码的输入，has_legal为False的经验目标Q值在所有动作中取最大
+            ('next_counts', np.int8, (13,)),
+            ('next_last_keys', np.int32, ()),
+            ('next_pass_counts', np.int8, ()),
+            ('has_legal', np.bool_, ()),
+        ]
+
+    def _allocate(self, name: str, dtype: type, shape: Tuple[int, ...]):
+        """分配一个字段的存储，形状(capacity,) + shape"""
+        return np.zeros((self.capacity,) + shape, dtype=dtype)
+
+    def add(self, state, action: int, reward: float, next_state, done: bool,
+            next_legal: Optional[Tuple] = None) -> int:
+        """
+        添加一条经验，返回写入的位置
+
+        Args:
+            next_legal: 下一状态合法动作掩码的输入(各点数牌数, 上一手牌的规范键, 连续跳过次数)，
+                见RLEnvironment.legal_action_inputs
+        """
+        index = self.position
+        self.states[index] = state
+        self.actions[index] = action
+        self.rewards[index] = reward
+        self.next_states[index] = next_state
+        self.dones[index] = done
+        if next_legal is not None:
+            self.next_counts[index], self.next_last_keys[index], self.next_pass_counts[index] = next_legal
+        self.has_legal[index] = next_legal is not None
+        self._advance(1)
+        return index
+
+    def add_batch(self, states: np.ndarray, actions: np.ndarray, rewards: np.ndarray, next_states: np.ndarray,
+                  dones: np.ndarray, next_legal: Optional[LegalInputs] = None) -> np.ndarray:
+        """
+        一次添加多条经验（如向量化环境的一步），返回写入的位置
+
+        Args:
+            next_legal: 各条经验的掩码输入数组(形状(B, 13), (B,), (B,))，见VecRLEnvironment.legal_action_inputs
+        """
+        count = len(actions)
+        indices = (self.position + np.arange(count)) % self.capacity
+        self.states[indices] = states
+        self.actions[indices] = actions
+        self.rewards[indices] = rewards
+        self.next_states[indices] = next_states
+        self.dones[indices] = dones
+        if next_legal is not None:
+            self.next_counts[indices], self.next_last_keys[indices], self.next_pass_counts[indices] = next_legal
+        self.has_legal[indices] = next_legal is not None
+        self._advance(count)
+        return indices
+
+    def _advance(self, count: int):
+        self.position = (self.position + count) % self.capacity
+        self.size = min(self.size + count, self.capacity)
+
+    def sample_indices(self, batch_size: int) -> np.ndarray:
+        """均匀随机抽取batch_size个经验的位置（有放回）"""
+        return self.rng.integers(0, self.size, size=batch_size)
+
+    def importance_weights(self, indices: np.ndarray) -> np.ndarray:
+        """这些经验在损失中的重要性采样权重，均匀采样时都为1"""
+        return np.ones(len(indices), dtype=np.float32)
+
+    def update_priorities(self, indices: np.ndarray, errors: np.ndarray):
+        """用训练得到的TD误差更新优先级，均匀采样时不需要"""
+
+    def next_masks(self, indices: np.ndarray) -> np.ndarray:
+        """还原这些经验下一状态的合法动作掩码，形状(B, 动作数)；没有记录掩码输入的经验全为True"""
+        masks = legal_action_masks(self.next_counts[indices], self.next_last_keys[indices],
+                                   self.next_pass_counts[indices])
+        masks[~self.has_legal[indices]] = True
+        return masks
+
+    def gather(self, indices: np.ndarray) -> Tuple[np.ndarray, ...]:
+        """取出这些位置的经验：(states, actions, rewards, next_states, dones, next_masks)"""
+        return (self.states[indices], self.actions[indices], self.rewards[indices], self.next_states[indices],
+                self.dones[indices], self.next_masks(indices))
+
+    def sample(self, batch_size: int) -> Tuple[np.ndarray, ...]:
+        """随机采样一批经验，返回值同gather"""
+        return self.gather(self.sample_indices(batch_size))
+
+    def clear(self):
+        self.position = 0
+        self.size = 0
+
+    def flush(self):
+        """把缓冲区写入持久存储（内存中的缓冲区不需要）"""
+
+    def __len__(self) -> int:
+        return self.size
+
+
+class SumTree:
+    """
+    数组形式的求和树：叶子保存各位置的优先级，内部节点保存子树的优先级之和
+
+    tree[1]是根，节点i的子节点是2i和2i+1，叶子在[leaves, 2*leaves)
+    """
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.leaves = 1 << max(capacity - 1, 0).bit_length()
+        self.depth = self.leaves.bit_length() - 1
+        self.tree = np.zeros(2 * self.leaves, dtype=np.float64)
+
+    @property
+    def total(self) -> float:
+        return float(self.tree[1])
+
+    def get(self, indices: np.ndarray) -> np.ndarray:
+        """这些位置的优先级"""
+        return self.tree[self.leaves + np.asarray(indices)]
+
+    def update(self, indices: np.ndarray, priorities: np.ndarray):
+        """设置这些位置的优先级，逐层向上重新求和（每层一次向量化运算）"""
+        nodes = self.leaves + np.asarray(indices, dtype=np.int64)
+        self.tree[nodes] = priorities
+        nodes = np.unique(nodes >> 1)
+        for _ in range(self.depth):
+            self.tree[nodes] = self.tree[2 * nodes] + self.tree[2 * nodes + 1]
+            nodes = np.unique(nodes >> 1)
+
+    def find(self, values: np.ndarray) -> np.ndarray:
+        """
+        对每个取值找到前缀和区间包含它的位置（取值在[0, total)内）
+
+        从根开始逐层下降：小于左子树之和时进入左子树，否则减去左子树之和进入右子树。
+        浮点误差可能使取值超出右边，右子树之和为0时停在左子树
+        """
+        values = np.array(values, dtype=np.float64)
+        nodes = np.ones(len(values), dtype=np.int64)
+        for _ in range(self.depth):
+            left = self.tree[2 * nodes]
+            right = (values >= left) & (self.tree[2 * nodes + 1] > 0)
+            values -= np.where(right, left, 0)
+            nodes = 2 * nodes + right
+        return nodes - self.leaves
+
+
+class PrioritizedReplayBuffer(ReplayBuffer):
+    """
+    按优先级采样的经验回放缓冲区
+
+    经验i被抽中的概率为p_i^alpha / sum(p^alpha)，p_i = |TD误差| + epsilon；新经验使用目前最大的优先级，
+    保证至少被训练一次。重要性采样权重为(N * P(i))^-beta再除以这批中的最大值，beta每次采样后向1增加
+
+    Args:
+        alpha: 优先级的指数，0为均匀采样
+        beta: 重要性采样权重的初始指数
+        beta_increment: 每次采样后beta的增量
+        epsilon: 加在TD误差上的小常数，避免优先级为0
+    """
+
+    def __init__(self, capacity: int, state_size: int, alpha: float = 0.6, beta: float = 0.4,
+                 beta_increment: float = 1e-4, epsilon: float = 1e-3, seed: Optional[int] = None):
+        super().__init__(capacity, state_size, seed)
+        self.alpha = alpha
+        self.beta = beta
+        self.beta_increment = beta_increment
+        self.epsilon = epsilon
+        self.max_priority = 1.0
+        self.tree = SumTree(capacity)
+
+    def add(self, *args, **kwargs) -> int:
+        index = super().add(*args, **kwargs)
+        self.tree.update(np.array([index]), np.array([self.max_priority ** self.alpha]))
+        return index
+
+    def add_batch(self, *args, **kwargs) -> np.ndarray:
+        indices = super().add_batch(*args, **kwargs)
+        self.tree.update(indices, np.full(len(indices), self.max_priority ** self.alpha))
+        return indices
+
+    def sample_indices(self, batch_size: int) -> np.ndarray:
+        """把总优先级均分为batch_size段，每段内随机取一个值按前缀和找到对应的经验"""
+        segment = self.tree.total / batch_size
+        values = (np.arange(batch_size) + self.rng.random(batch_size)) * segment
+        indices = np.minimum(self.tree.find(values), self.size - 1)
+        self.beta = min(1.0, self.beta + self.beta_increment)
+        return indices
+
+    def importance_weights(self, indices: np.ndarray) -> np.ndarray:
+        probabilities = self.tree.get(indices) / self.tree.total
+        weights = (self.size * probabilities) ** -self.beta
+        return (weights / weights.max()).astype(np.float32)
+
+    def update_priorities(self, indices: np.ndarray, errors: np.ndarray):
+        priorities = np.abs(errors) + self.epsilon
+        self.max_priority = max(self.max_priority, float(priorities.max()))
+        self.tree.update(indices, priorities ** self.alpha)
+
+    def clear(self):
+        super().clear()
+        self.max_priority = 1.0
+        self.tree = SumTree(self.capacity)
+
+
+class ShardedMemmap:
+    """
+    按固定条数分片保存在.npy文件中的一个字段，支持按整数或下标数组读写
+
+    分片文件在第一次写入时创建，文件名为<name>.<分片序号>.npy（带有形状和类型的文件头，可以直接np.load查看）
+    """
+
+    def __init__(self, directory: str, name: str, dtype: type, shape: Tuple[int, ...], capacity: int,
+                 shard_size: int):
+        self.directory = directory
+        self.name = name
+        self.dtype = np.dtype(dtype)
+        self.shape = (capacity,) + shape
+        self.shard_size = shard_size
+        self._shards: Dict[int, np.memmap] = {}
+
+    def _path(self, shard: int) -> str:
+        return os.path.join(self.directory, f"{self.name}.{shard:05d}.npy")
+
+    def _shard(self, shard: int) -> np.memmap:
+        array = self._shards.get(shard)
+        if array is None:
+            path = self._path(shard)
+            rows = min(self.shard_size, self.shape[0] - shard * self.shard_size)
+            if os.path.exists(path):
+                array = np.lib.format.open_memmap(path, mode='r+')
+                if array.shape != (rows,) + self.shape[1:] or array.dtype != self.dtype:
+                    raise ValueError(f"分片{path}的形状或类型与缓冲区不一致")
+            else:
+                array = np.lib.format.open_memmap(path, mode='w+', dtype=self.dtype,
+                                                  shape=(rows,) + self.shape[1:])
+            self._shards[shard] = array
+        return array
+
+    def _split(self, indices: Union[int, np.ndarray]):
+        """把下标按分片分组，依次给出(分片, 结果中的位置, 分片内的下标)"""
+        indices = np.asarray(indices, dtype=np.int64)
+        shards, offsets = np.divmod(indices, self.shard_size)
+        for shard in np.unique(shards):
+            rows = shards == shard
+            yield int(shard), rows, offsets[rows]
+
+    def __getitem__(self, indices: Union[int, np.ndarray]) -> np.ndarray:
+        if np.ndim(indices) == 0:
+            shard, offset = divmod(int(indices), self.shard_size)
+            return np.array(self._shard(shard)[offset])
+        indices = np.asarray(indices)
+        result = np.empty(indices.shape + self.shape[1:], dtype=self.dtype)
+        for shard, rows, offsets in self._split(indices):
+            result[rows] = self._shard(shard)[offsets]
+        return result
+
+    def __setitem__(self, indices: Union[int, np.ndarray], values):
+        if np.ndim(indices) == 0:
+            shard, offset = divmod(int(indices), self.shard_size)
+            self._shard(shard)[offset] = values
+            return
+        indices = np.asarray(indices)
+        values = np.broadcast_to(np.asarray(values, dtype=self.dtype), indices.shape + self.shape[1:])
+        for shard, rows, offsets in self._split(indices):
+            self._shard(shard)[offsets] = values[rows]
+
+    def flush(self):
+        for array in self._shards.values():
+            array.flush()
+
+    def __len__(self) -> int:
+        return self.shape[0]
+
+
+class MemmapReplayBuffer(ReplayBuffer):
+    """
+    保存在磁盘上的经验回放缓冲区，可以在进程重启后继续使用
+
+    各字段按shard_size条分片保存为memmap文件，追加和随机批量读取与ReplayBuffer相同，只有用到的分片页
+    会被读入内存。写入位置、条数和之后最多写入的条数window保存在目录下的meta.json中：写入会超出window时，
+    先把数据写回磁盘，再原子地更新meta.json（大约每追加flush_every条经验一次）。
+
+    进程被终止后重新打开时，最后一次保存之后写入的经验丢失；这些写入可能覆盖了（或只写了一半）写入位置之后
+    的window条，环形写满后这些位置上是最早的经验，重新打开时一并丢弃，因此不会读到写了一半的经验
+
+    Args:
+        directory: 保存目录，已有缓冲区时继续使用（容量、状态长度、分片大小必须一致）
+        capacity: 最多保存的经验条数
+        state_size: 状态向量长度
+        shard_size: 每个分片的经验条数
+        flush_every: 大约每追加多少条经验保存一次
+        seed: 采样用的随机种子
+    """
+
+    META_FILE = 'meta.json'
+
+    def __init__(self, directory: str, capacity: int, state_size: int, shard_size: int = 1_000_000,
+                 flush_every: int = 10000, seed: Optional[int] = None):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.shard_size = min(shard_size, capacity)
+        self.flush_every = flush_every
+        self._unsaved = 0
+        self._window = 0
+        super().__init__(capacity, state_size, seed)
+
+        meta = self._read_meta()
+        if meta is not None:
+            expected = {'capacity': capacity, 'state_size': state_size, 'shard_size': self.shard_size}
+            actual = {key: meta.get(key) for key in expected}
+            if actual != expected:
+                raise ValueError(f"目录{directory}中的缓冲区参数{actual}与{expected}不一致")
+            self.position = meta['position']
+            # 丢弃保存之后的写入可能覆盖的最早的经验，有效的经验是写入位置之前的size条
+            size, window = meta['size'], meta.get('window', flush_every)
+            self.size = size - min(size, max(0, size + window - capacity))
+        self.flush()
+
+    def _allocate(self, name: str, dtype: type, shape: Tuple[int, ...]) -> ShardedMemmap:
+        return ShardedMemmap(self.directory, name, dtype, shape, self.capacity, self.shard_size)
+
+    def _meta_path(self) -> str:
+        return os.path.join(self.directory, self.META_FILE)
+
+    def _read_meta(self) -> Optional[dict]:
+        if not os.path.exists(self._meta_path()):
+            return None
+        with open(self._meta_path(), 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    def _write_meta(self):
+        meta = {'capacity': self.capacity, 'state_size': self.state_size, 'shard_size': self.shard_size,
+                'position': self.position, 'size': self.size, 'window': self._window}
+        temp_path = self._meta_path() + '.tmp'
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(meta, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, self._meta_path())
+
+    def _reserve(self, count: int):
+        """写入count条经验之前调用，写入会超出上次保存的window时先保存（window为flush_every条）"""
+        if self._unsaved + count > self._window:
+            self._save(max(self.flush_every, count))
+
+    def add(self, state, action: int, reward: float, next_state, done: bool,
+            next_legal: Optional[Tuple] = None) -> int:
+        self._reserve(1)
+        return super().add(state, action, reward, next_state, done, next_legal)
+
+    def add_batch(self, states: np.ndarray, actions: np.ndarray, rewards: np.ndarray, next_states: np.ndarray,
+                  dones: np.ndarray, next_legal: Optional[LegalInputs] = None) -> np.ndarray:
+        self._reserve(len(actions))
+        return super().add_batch(states, actions, rewards, next_states, dones, next_legal)
+
+    def _advance(self, count: int):
+        super()._advance(count)
+        self._unsaved += count
+
+    def sample_indices(self, batch_size: int) -> np.ndarray:
+        """均匀随机抽取写入位置之前size条经验中的位置（重新打开后最早的经验不一定从0开始）"""
+        start = self.position - self.size
+        return (start + self.rng.integers(0, self.size, size=batch_size)) % self.capacity
+
+    def _save(self, window: int):
+        """数据写回磁盘后再更新写入位置、条数和window"""
+        for name, _, _ in self._fields():
+            getattr(self, name).flush()
+        self._window = window
+        self._write_meta()
+        self._unsaved = 0
+
+    def flush(self):
+        """保存所有已写入的经验，之后再写入时先重新保存"""
+        self._save(0)
+
+    def clear(self):
+        super().clear()
+        self.flush()
@@ -4,9 +4,12 @@
 
 import numpy as np
 import random
-from typing import List, Tuple, Dict, Any
+from typing import List, Optional, Tuple, Dict, Any
 from game import GameEngine
-from cards import Card, CardPattern, CardType
+from cards import Card, CardPattern, CardType, rank_counts
+from action_space import PASS_ACTION, get_action_space, legal_action_mask
+from move_generator import MoveGenerator
+from state_encoder import ENCODINGS
 from strategy import AIStrategy
 import torch
 
@@ -14,10 +17,18 @@ import torch
 class RLEnvironment:
     """强化学习环境"""
     
-    def __init__(self):
+    def __init__(self, encoding: str = 'vector'):
+        """
+        Args:
+            encoding: 观测编码，'vector'为37维点数向量，'planes'为按点数平面的编码（见state_encoder）
+        """
+        if encoding not in ENCODINGS:
+            raise ValueError(f"未知的观测编码: {encoding}，可选: {', '.join(ENCODINGS)}")
+        self.encoding = encoding
+        self._encode = ENCODINGS[encoding][1]
         self.engine = GameEngine()
         self.state_size = self._get_state_size()
-        self.action_size = 0  # 动作空间大小会动态变化
+        self.action_size = len(get_action_space())  # 固定的全局动作空间大小（step_action使用，下标0是跳过）
         self.current_state = None
         self.done = False
         # 检查是否有可用的GPU
@@ -68,6 +79,7 @@ class RLEnvironment:
                 if self.engine.state.pass_count >= 2:
                     self.engine.state.last_pattern = None
                     self.engine.state.pass_count = 0
+                self.engine.state.rehash()
                 reward = -1.0
         else:
             reward = -0.1  # 给予小的负奖励
@@ -138,47 +150,13 @@ class RLEnvironment:
         # 2. 对手剩余牌数 (1个数字)
         # 3. 上一手牌型信息 (牌型类型、主点数、牌数)
         # 4. 是否首出 (1个数字)
-        # 5. 已出牌统计 (16个数字，表示各点数已出牌数)
-        return 16 + 1 + 3 + 1 + 16
+        # 5. 未出现牌统计 (13个数字，表示各点数未出现的牌数) 和3个保留位
+        # 平面编码的大小见state_encoder
+        return ENCODINGS[self.encoding][0]
     
     def _get_state(self) -> np.ndarray:
-        """获取当前状态"""
-        state = np.zeros(self.state_size)
-        
-        # 己方手牌 (简化表示，用点数表示牌)
-        player_hand = self.engine.state.players[self.engine.state.current_player]
-        for i, card in enumerate(player_hand[:16]):  # 最多16张牌
-            state[i] = card.point
-        
-        # 对手剩余牌数
-        opponent_id = 1 - self.engine.state.current_player
-        state[16] = len(self.engine.state.players[opponent_id])
-        
-        # 上一手牌型信息
-        if self.engine.state.last_pattern:
-            state[17] = self.engine.state.last_pattern.type.value  # 牌型类型
-            state[18] = self.engine.state.last_pattern.main_point   # 主点数
-            state[19] = self.engine.state.last_pattern.card_count  # 牌数
-        else:
-            state[17] = 0
-            state[18] = 0
-            state[19] = 0
-        
-        # 是否首出
-        state[20] = 1 if self.engine.state.last_pattern is None else 0
-        
-        # 未出现牌的统计信息 (各点数未出现牌数)
-        # 索引21-36对应点数3-A,2的未出现牌数(0-4)
-        point_counts = [0] * 16
-        for card in self.engine.remaining_cards:
-            point_index = card.point - 3  # 3对应索引0
-            if 0 <= point_index < 16:
-                point_counts[point_index] += 1
-        
-        for i in range(16):
-            state[21 + i] = point_counts[i]
-        
-        return state
+        """获取当前状态（各位含义见state_encoder）"""
+        return self._encode(self.engine)
     
     def _calculate_reward(self, pattern: CardPattern) -> float:
         """计算即时奖励"""
@@ -540,7 +518,7 @@ class RLEnvironment:
             
         # 基于未出现的牌计算概率
         # 这是一个简化的实现，实际可以使用组合数学进行更精确的计算
-        remaining_cards_count = len(self.engine.remaining_cards)
+        remaining_cards_count = sum(self.engine.unseen.counts(self.engine.state.current_player))
         if remaining_cards_count == 0:
             return 0.0
             
@@ -596,6 +574,31 @@ class RLEnvironment:
         #     print(f"  玩家{opponent_id}手牌: {self.engine.state.players[opponent_id]}")
         #     print(f"  上一手牌: {self.engine.state.last_pattern}")
         return list(range(len(valid_patterns)))
+
+    def legal_action_inputs(self) -> Tuple[List[int], int, int]:
+        """计算合法动作掩码的输入：(当前玩家各点数牌数, 上一手牌的规范键, 连续跳过次数)"""
+        state = self.engine.state
+        last_key = state.last_pattern.key if state.last_pattern is not None else -1
+        return rank_counts(state.players[state.current_player]), last_key, state.pass_count
+
+    def legal_action_mask(self) -> np.ndarray:
+        """当前玩家在固定的全局动作空间上的合法动作掩码（跳过只在管牌或无牌可出时合法）"""
+        return legal_action_mask(*self.legal_action_inputs())
+
+    def action_pattern(self, action: int) -> Optional[CardPattern]:
+        """把全局动作下标转换为当前玩家要出的牌型，跳过时返回None"""
+        if action == PASS_ACTION:
+            return None
+        generator = MoveGenerator(self.engine.state.players[self.engine.state.current_player])
+        return generator.to_pattern(int(get_action_space().codes[action]))
+
+    def step_action(self, action: int) -> Tuple[np.ndarray, float, bool, Dict]:
+        """按固定的全局动作下标执行动作，返回值与step相同；不合法的动作按跳过处理"""
+        current_player = self.engine.state.current_player
+        if action != PASS_ACTION and self.legal_action_mask()[action]:
+            return self._execute_play(self.action_pattern(action), current_player)
+        self.engine.pass_turn(current_player)
+        return self._finalize_step(-0.1)
     
     def render(self):
         """渲染环境（用于调试）"""
@@ -4,7 +4,7 @@
 
 import numpy as np
 import random
-from typing import List, Tuple, Dict, Any
+from typing import List, Optional, Tuple, Dict, Any
 from collections import deque
 import torch
 import torch.nn as nn
@@ -16,6 +16,10 @@ from cards import Card, CardPattern
 from human_strategy import HumanStrategy
 from strategy import AIStrategy
 from rl_environment import RLEnvironment, CardGroupScorer
+from action_space import PASS_ACTION, get_action_space
+from vec_env import VecRLEnvironment
+from replay_buffer import MemmapReplayBuffer, PrioritizedReplayBuffer, ReplayBuffer
+from state_encoder import ENCODINGS
 
 
 class DQN(nn.Module):
@@ -39,10 +43,21 @@ class DQN(nn.Module):
 class DQNAIStrategy(AIStrategy):
     """基于深度Q网络的AI策略"""
     
-    def __init__(self, player_id: int, state_size: int = 21, lr: float = 0.001):
+    def __init__(self, player_id: int, state_size: Optional[int] = None, lr: float = 0.001, encoding: str = 'vector',
+                 prioritized: bool = False, replay_capacity: int = 10000, replay_dir: Optional[str] = None):
         super().__init__(player_id)
+        # 观测编码（见RLEnvironment），state_size默认为该编码的观测大小，给出时必须与之一致
+        if encoding not in ENCODINGS:
+            raise ValueError(f"未知的观测编码: {encoding}，可选: {', '.join(ENCODINGS)}")
+        encoded_size = ENCODINGS[encoding][0]
+        if state_size is None:
+            state_size = encoded_size
+        elif state_size != encoded_size:
+            raise ValueError(f"state_size={state_size}与观测编码{encoding}的大小{encoded_size}不一致")
         self.state_size = state_size
-        self.action_size = 200  # 增加动作空间大小，实际会动态调整
+        self.encoding = encoding
+        # 输出对应固定的全局动作空间（点数层面的所有出牌动作和跳过），与手牌中牌型的排列顺序无关
+        self.action_size = len(get_action_space())
         
         # 检查是否有可用的GPU
         self.device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
@@ -53,8 +68,17 @@ class DQNAIStrategy(AIStrategy):
         self.target_network = DQN(state_size, self.action_size).to(self.device)
         self.optimizer = optim.Adam(self.q_network.parameters(), lr=lr)
         
-        # 经验回放
-        self.memory = deque(maxlen=10000)
+        # 经验回放（prioritized为True时按TD误差优先采样，损失乘以重要性采样权重；
+        # 给出replay_dir时保存在磁盘上，重新训练时继续使用已收集的经验）
+        self.prioritized = prioritized
+        if replay_dir is not None:
+            if prioritized:
+                raise ValueError("优先经验回放不支持保存在磁盘上")
+            self.memory = MemmapReplayBuffer(replay_dir, replay_capacity, state_size)
+        elif prioritized:
+            self.memory = PrioritizedReplayBuffer(replay_capacity, state_size)
+        else:
+            self.memory = ReplayBuffer(replay_capacity, state_size)
         self.batch_size = 32
         
         # 训练参数
@@ -77,34 +101,36 @@ class DQNAIStrategy(AIStrategy):
             return ("pass", [])
         
         # 获取当前状态
-        env = RLEnvironment()
+        env = RLEnvironment(self.encoding)
         env.engine = engine
         state = env._get_state()
-        state_tensor = torch.FloatTensor(state).unsqueeze(0).to(self.device)
         
         # epsilon-贪婪策略
         if np.random.random() <= self.epsilon:
             # 使用启发式方法选择动作而不是完全随机
             action_idx = self._heuristic_action_selection(valid_patterns, engine)
-        else:
-            # 使用Q网络选择最优动作
-            self.q_network.eval()
-            with torch.no_grad():
-                q_values = self.q_network(state_tensor)
-                # 只考虑有效动作
-                valid_q_values = q_values[0][:len(valid_patterns)]
-                if len(valid_q_values) > 0:
-                    action_idx = valid_q_values.argmax().item()
-                else:
-                    action_idx = 0
-            self.q_network.train()
-        
-        # 将动作索引转换为实际出牌
-        if action_idx >= len(valid_patterns):
+            return ("play", valid_patterns[action_idx].cards)
+
+        # 使用Q网络在合法动作中选择最优动作
+        pattern = env.action_pattern(self.greedy_action(state, env.legal_action_mask()))
+        if pattern is None:
             return ("pass", [])
-        
-        pattern = valid_patterns[action_idx]
         return ("play", pattern.cards)
+
+    def greedy_action(self, state: np.ndarray, mask: np.ndarray) -> int:
+        """在合法动作掩码允许的动作中选择Q值最大的全局动作下标"""
+        return int(self.greedy_actions(state[None], mask[None])[0])
+
+    def greedy_actions(self, states: np.ndarray, masks: np.ndarray) -> np.ndarray:
+        """批量选择：states形状(B, 状态大小)，masks形状(B, 动作数)，返回各状态的全局动作下标"""
+        state_tensor = torch.FloatTensor(np.asarray(states)).to(self.device)
+        self.q_network.eval()
+        with torch.no_grad():
+            q_values = self.q_network(state_tensor)
+            q_values[~torch.from_numpy(np.asarray(masks)).to(self.device)] = -float('inf')
+            actions = q_values.argmax(dim=1).cpu().numpy()
+        self.q_network.train()
+        return actions
     
     def _heuristic_action_selection(self, valid_patterns: List[CardPattern], engine: GameEngine) -> int:
         """使用启发式方法选择动作，而不是完全随机"""
@@ -136,30 +162,30 @@ class DQNAIStrategy(AIStrategy):
             action_idx = 0
         return action_idx
 
-    def remember(self, state, action, reward, next_state, done):
-        """将经验存储到回放内存中"""
-        self.memory.append((state, action, reward, next_state, done))
+    def remember(self, state, action, reward, next_state, done, next_legal=None):
+        """
+        将经验存储到回放内存中
+
+        next_legal是下一状态合法动作掩码的输入（RLEnvironment.legal_action_inputs），给出时目标Q值只在合法动作中取最大
+        """
+        self.memory.add(state, action, reward, next_state, done, next_legal)
     
     def replay(self):
         """经验回放训练"""
         if len(self.memory) < self.batch_size:
             return
         
-        # 从回放内存中随机采样一批经验
-        batch = random.sample(self.memory, self.batch_size)
-        
-        # 优化：将列表转换为numpy数组再转换为tensor，避免警告
-        states = np.array([e[0] for e in batch])
-        actions = np.array([e[1] for e in batch])
-        rewards = np.array([e[2] for e in batch])
-        next_states = np.array([e[3] for e in batch])
-        dones = np.array([e[4] for e in batch])
+        # 从回放内存中采样一批经验（各字段已是连续的NumPy数组）
+        indices = self.memory.sample_indices(self.batch_size)
+        states, actions, rewards, next_states, dones, next_masks = self.memory.gather(indices)
+        weights = torch.from_numpy(self.memory.importance_weights(indices)).to(self.device)
         
-        states = torch.FloatTensor(states).to(self.device)
-        actions = torch.LongTensor(actions).to(self.device)
-        rewards = torch.FloatTensor(rewards).to(self.device)
-        next_states = torch.FloatTensor(next_states).to(self.device)
-        dones = torch.BoolTensor(dones).to(self.device)
+        states = torch.from_numpy(states).to(self.device)
+        actions = torch.from_numpy(actions).long().to(self.device)
+        rewards = torch.from_numpy(rewards).to(self.device)
+        next_states = torch.from_numpy(next_states).to(self.device)
+        dones = torch.from_numpy(dones).to(self.device)
+        next_masks = torch.from_numpy(next_masks).to(self.device)
         
         # 计算当前Q值，确保动作索引不会越界
         q_values = self.q_network(states)
@@ -170,11 +196,14 @@ class DQNAIStrategy(AIStrategy):
         
         # 计算目标Q值
         with torch.no_grad():
-            next_q_values = self.target_network(next_states).max(1)[0]
+            # 下一状态只在合法动作中取最大Q值
+            next_q_values = self.target_network(next_states).masked_fill(~next_masks, -float('inf')).max(1)[0]
             target_q_values = rewards + (self.gamma * next_q_values * ~dones)
         
-        # 计算损失并更新网络
-        loss = F.mse_loss(current_q_values.squeeze(), target_q_values)
+        # 计算损失并更新网络（均匀采样时权重都为1，即均方误差）
+        td_errors = target_q_values - current_q_values.squeeze(1)
+        loss = (weights * td_errors.pow(2)).mean()
+        self.memory.update_priorities(indices, td_errors.detach().cpu().numpy())
         
         self.optimizer.zero_grad()
         loss.backward()
@@ -267,11 +296,11 @@ class MonteCarloAIStrategy(AIStrategy):
         """模拟执行某个动作的结果"""
         total_score = 0.0
         
-        # 进行多次模拟
+        # 进行多次模拟，每次都从当前局面的快照开始（包括出牌记录和未出现的牌），不会修改真实的对局
+        engine_copy = engine.clone()
+        snapshot = engine_copy.snapshot()
         for _ in range(self.simulations):
-            # 创建副本
-            engine_copy = GameEngine()
-            engine_copy.state = engine.state  # 简化处理，实际应深拷贝
+            engine_copy.restore(snapshot)
             
             # 执行动作
             success = engine_copy.play_cards(self.player_id, pattern.cards)
@@ -283,9 +312,8 @@ class MonteCarloAIStrategy(AIStrategy):
             while not engine_copy.state.game_over:
                 current_player = engine_copy.state.current_player
                 # 使用随机策略模拟对手
-                valid_patterns_op = engine_copy.get_valid_patterns(current_player)
-                if valid_patterns_op:
-                    chosen_pattern = random.choice(valid_patterns_op)
+                chosen_pattern = engine_copy.random_valid_pattern(current_player)
+                if chosen_pattern is not None:
                     engine_copy.play_cards(current_player, chosen_pattern.cards)
                 else:
                     engine_copy.pass_turn(current_player)
@@ -300,12 +328,19 @@ class MonteCarloAIStrategy(AIStrategy):
 
 
 # 训练函数
-def train_dqn_agent(episodes: int = 1000):
-    """训练DQN智能体"""
-    env = RLEnvironment()
+def train_dqn_agent(episodes: int = 1000, encoding: str = 'vector', prioritized: bool = False,
+                    replay_capacity: int = 10000, replay_dir: Optional[str] = None):
+    """
+    训练DQN智能体
+
+    encoding为观测编码（见RLEnvironment），prioritized为是否使用优先经验回放，
+    replay_dir为保存经验回放的目录（见MemmapReplayBuffer，中断后可以继续使用）
+    """
+    env = RLEnvironment(encoding)
     env.verbose = False  # 禁用详细输出以提高训练速度
     state_size = env.state_size
-    agent = DQNAIStrategy(player_id=0, state_size=state_size)
+    agent = DQNAIStrategy(player_id=0, state_size=state_size, encoding=encoding, prioritized=prioritized,
+                          replay_capacity=replay_capacity, replay_dir=replay_dir)
     human_strategy = HumanStrategy(player_id=1)  # 创建HumanStrategy实例用于1号玩家
     
     scores = deque(maxlen=100)
@@ -331,11 +366,11 @@ def train_dqn_agent(episodes: int = 1000):
             
             # 根据当前玩家选择不同的策略
             if current_player == 0:  # DQN AI玩家
-                # 获取有效动作
-                valid_actions = env.get_valid_actions()
-                if not valid_actions:
+                # 动作使用固定的全局动作空间下标，合法动作由掩码给出
+                mask = env.legal_action_mask()
+                if not mask[1:].any():
                     # 没有有效动作，只能跳过
-                    next_state, reward, done, info = env.step(0)
+                    next_state, reward, done, info = env.step_action(PASS_ACTION)
                     steps += 1
                     step_count += 1
                     total_reward += reward
@@ -344,32 +379,22 @@ def train_dqn_agent(episodes: int = 1000):
                 
                 # 使用epsilon-贪婪策略选择动作
                 if random.random() <= agent.epsilon:
-                    # 探索：使用启发式方法选择动作
-                    valid_patterns = env.engine.get_valid_patterns(env.engine.state.current_player)
-                    if valid_patterns:
-                        action = agent._heuristic_action_selection(valid_patterns, env.engine)
-                    else:
-                        action = 0
+                    # 探索：使用启发式方法在动作空间中的牌型里选择动作
+                    space = get_action_space()
+                    valid_patterns = [pattern for pattern in env.engine.get_valid_patterns(current_player)
+                                      if space.pattern_index(pattern) >= 0]
+                    action_idx = agent._heuristic_action_selection(valid_patterns, env.engine)
+                    action = space.pattern_index(valid_patterns[action_idx])
                 else:
-                    # 利用：使用Q网络选择最优动作
-                    state_tensor = torch.FloatTensor(state).unsqueeze(0).to(agent.device)
-                    agent.q_network.eval()
-                    with torch.no_grad():
-                        q_values = agent.q_network(state_tensor)
-                        # 确保只考虑有效的动作
-                        valid_q_values = q_values[0][:min(len(valid_actions), q_values.size(1))]
-                        if len(valid_q_values) > 0:
-                            action = valid_q_values.argmax().item()
-                        else:
-                            action = 0
-                    agent.q_network.train()
+                    # 利用：使用Q网络在合法动作中选择最优动作
+                    action = agent.greedy_action(state, mask)
                 
                 # 执行动作
-                next_state, reward, done, info = env.step(action)
+                next_state, reward, done, info = env.step_action(action)
                 total_reward += reward
                 
                 # 存储经验
-                agent.remember(state, action, reward, next_state, done)
+                agent.remember(state, action, reward, next_state, done, env.legal_action_inputs())
                 
                 # 训练网络
                 agent.replay()
@@ -479,6 +504,71 @@ def train_dqn_agent(episodes: int = 1000):
         #         print(f"提前收敛于第 {episode} 回合")
         #         break
     
+    agent.memory.flush()
+    print("训练完成!")
+    print(f"最终胜率: {wins/episodes:.2%}")
+    return agent
+
+
+def train_dqn_agent_vec(episodes: int = 1000, num_envs: int = 8, num_workers: int = None,
+                        encoding: str = 'vector', prioritized: bool = False, replay_capacity: int = 10000,
+                        replay_dir: Optional[str] = None):
+    """
+    用多进程向量化环境训练DQN智能体
+
+    num_envs局同时进行，对手（HumanStrategy）在工作进程中行动，Q网络每步为所有对局批量选择动作，
+    每步训练一次网络；每结束一局更新目标网络并降低探索率，与train_dqn_agent一致
+    """
+    envs = VecRLEnvironment(num_envs, num_workers, opponent=HumanStrategy, encoding=encoding)
+    agent = DQNAIStrategy(player_id=0, state_size=envs.state_size, encoding=encoding, prioritized=prioritized,
+                          replay_capacity=replay_capacity, replay_dir=replay_dir)
+
+    scores = deque(maxlen=100)
+    total_steps = deque(maxlen=100)
+    wins = 0
+    finished = 0
+    returns = np.zeros(num_envs)
+    steps = np.zeros(num_envs, dtype=np.int64)
+
+    try:
+        states = envs.reset()
+        masks = envs.legal_action_masks()
+        while finished < episodes:
+            actions = agent.greedy_actions(states, masks)
+            # 探索：在可以出的牌中随机选择（没有能出的牌时跳过）
+            for i in np.flatnonzero(np.random.random(num_envs) <= agent.epsilon):
+                plays = np.flatnonzero(masks[i, 1:]) + 1
+                actions[i] = np.random.choice(plays) if len(plays) else PASS_ACTION
+
+            next_states, rewards, dones, info = envs.step(actions)
+            next_masks = envs.legal_action_masks()
+            agent.memory.add_batch(states, actions, rewards, next_states, dones, envs.legal_action_inputs())
+            agent.replay()
+            returns += rewards
+            steps += 1
+
+            for i in np.flatnonzero(dones):
+                if finished >= episodes:
+                    break
+                if info['winner'][i] == 0:
+                    wins += 1
+                scores.append(returns[i])
+                total_steps.append(steps[i])
+                returns[i] = 0
+                steps[i] = 0
+                agent._update_target_network()
+                if agent.epsilon > agent.epsilon_min:
+                    agent.epsilon *= agent.epsilon_decay
+                if finished % 100 == 0:
+                    print(f"回合: {finished}, 平均得分: {np.mean(scores):.4f}, Epsilon: {agent.epsilon:.4f}, "
+                          f"胜率: {wins / max(finished, 1):.2%}, 平均步数: {np.mean(total_steps):.2f}")
+                finished += 1
+
+            states, masks = next_states, next_masks
+    finally:
+        envs.close()
+        agent.memory.flush()
+
     print("训练完成!")
     print(f"最终胜率: {wins/episodes:.2%}")
     return agent
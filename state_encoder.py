@@ -0,0 +1,222 @@
+"""
+强化学习观测编码
+
+把对局状态编码为RLEnvironment使用的37维观测向量：
+    0-15  当前玩家手牌的点数（从小到大，不足16张的位置为0）
+    16    对手剩余牌数
+    17-19 上一手牌的牌型、主点数、牌数（没有上一手牌时为0）
+    20    是否首出
+    21-33 当前玩家视角下各点数未出现的牌数（点数3..2）
+    34-36 保留，为0
+
+编码只依赖各点数牌数等小数组，用几个NumPy运算完成；批量编码写入预先分配的(M, 37)缓冲区，
+每次调用不再分配数组，用于环境每一步的观测和批量推理
+
+另有按点数平面的编码（RLEnvironment(encoding='planes')）：自己的手牌、未出现的牌、对手已出的牌、
+要管的上一手牌各用一个4×13平面表示（第k行为该点数的牌数是否超过k），加上PLANE_SCALARS个标量特征，
+展平为PLANE_STATE_SIZE维float32向量。平面编码与牌在手牌中的位置无关，点数结构直接对应网络输入
+"""
+
+from typing import Dict, Optional, Sequence
+
+import numpy as np
+
+from cards import CardType, rank_counts
+from game import GameEngine
+
+STATE_SIZE = 37
+MAX_HAND_SIZE = 16
+
+# 点数下标对应的点数，下标13（超出手牌张数的位置）对应0
+_RANK_POINTS = np.append(np.arange(3, 16), 0).astype(np.float32)
+_POINTS = _RANK_POINTS[:13]
+_SLOTS = np.arange(MAX_HAND_SIZE, dtype=np.int8)
+
+
+def encode_state(engine: GameEngine, out: Optional[np.ndarray] = None) -> np.ndarray:
+    """
+    编码单局当前玩家的观测
+
+    Args:
+        engine: 游戏引擎
+        out: 写入的长度为STATE_SIZE的数组，默认新建float64数组（元素是Python的float，与原有观测一致）
+
+    Returns:
+        np.ndarray: 观测向量
+    """
+    state = engine.state
+    current_player = state.current_player
+    if out is None:
+        out = np.zeros(STATE_SIZE)
+    else:
+        out.fill(0)
+
+    points = np.repeat(_POINTS, rank_counts(state.players[current_player]))[:MAX_HAND_SIZE]
+    out[:len(points)] = points
+    out[16] = len(state.players[1 - current_player])
+    last_pattern = state.last_pattern
+    if last_pattern is not None:
+        out[17] = last_pattern.type.value
+        out[18] = last_pattern.main_point
+        out[19] = last_pattern.card_count
+    else:
+        out[20] = 1
+    out[21:34] = engine.unseen.counts(current_player)
+    return out
+
+
+class BatchStateEncoder:
+    """
+    批量编码观测，所有中间数组在构造时按容量预先分配
+
+    Args:
+        capacity: 一次最多编码的状态数M
+    """
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        # 各状态的输入：手牌各点数牌数、未出现的各点数牌数、观测16-20位的标量
+        self.hand_counts = np.zeros((capacity, 13), dtype=np.int8)
+        self.unseen_counts = np.zeros((capacity, 13), dtype=np.float32)
+        self.scalars = np.zeros((capacity, 5), dtype=np.float32)
+        self._cumulative = np.zeros((capacity, 13), dtype=np.int8)
+        self._below = np.zeros((capacity, 13, MAX_HAND_SIZE), dtype=bool)
+        self._ranks = np.zeros((capacity, MAX_HAND_SIZE), dtype=np.int64)
+
+    def load(self, row: int, engine: GameEngine):
+        """把一局的当前玩家状态读入第row行输入"""
+        state = engine.state
+        current_player = state.current_player
+        self.hand_counts[row] = rank_counts(state.players[current_player])
+        self.unseen_counts[row] = engine.unseen.counts(current_player)
+        scalars = self.scalars[row]
+        scalars[0] = len(state.players[1 - current_player])
+        last_pattern = state.last_pattern
+        if last_pattern is not None:
+            scalars[1:] = (last_pattern.type.value, last_pattern.main_point, last_pattern.card_count, 0)
+        else:
+            scalars[1:] = (0, 0, 0, 1)
+
+    def encode(self, count: int, out: np.ndarray) -> np.ndarray:
+        """
+        把已读入的前count行输入编码到out[:count]
+
+        手牌第j个位置的点数下标等于累计牌数不超过j的点数个数，超过手牌张数的位置得到13，查表为0
+
+        Args:
+            count: 状态数
+            out: 形状(至少count, STATE_SIZE)的float32缓冲区
+
+        Returns:
+            np.ndarray: out[:count]
+        """
+        np.cumsum(self.hand_counts[:count], axis=1, out=self._cumulative[:count])
+        np.less_equal(self._cumulative[:count, :, None], _SLOTS, out=self._below[:count])
+        np.sum(self._below[:count], axis=1, out=self._ranks[:count])
+        np.take(_RANK_POINTS, self._ranks[:count], out=out[:count, :MAX_HAND_SIZE], mode='clip')
+        out[:count, 16:21] = self.scalars[:count]
+        out[:count, 21:34] = self.unseen_counts[:count]
+        out[:count, 34:] = 0
+        return out[:count]
+
+    def encode_engines(self, engines: Sequence[GameEngine], out: np.ndarray) -> np.ndarray:
+        """编码一批对局当前玩家的观测，写入out[:len(engines)]"""
+        for row, engine in enumerate(engines):
+            self.load(row, engine)
+        return self.encode(len(engines), out)
+
+
+# 点数平面：自己的手牌、未出现的牌、对手已出的牌、要管的上一手牌
+PLANES = 4
+PLANE_SHAPE = (PLANES, 4, 13)
+# 标量特征：自己和对手的剩余牌数/16、是否可以任意出牌、上一手牌的主点数、上一手牌的牌型（独热）
+PLANE_SCALARS = 4 + len(CardType)
+PLANE_STATE_SIZE = PLANES * 4 * 13 + PLANE_SCALARS
+
+_LEVELS = np.arange(4, dtype=np.int8)[:, None]
+
+
+def _fill_planes(counts: np.ndarray, scalars: np.ndarray, out: np.ndarray):
+    """由各平面的点数牌数(B, PLANES, 13)和标量(B, PLANE_SCALARS)写入out(B, PLANE_STATE_SIZE)"""
+    batch = len(counts)
+    planes = out[:, :PLANES * 52].reshape((batch,) + PLANE_SHAPE)
+    np.greater(counts[:, :, None, :], _LEVELS, out=planes, casting='unsafe')
+    out[:, PLANES * 52:] = scalars
+
+
+def _load_planes(engine: GameEngine, counts: np.ndarray, scalars: np.ndarray):
+    """把一局当前玩家的状态读入一行平面牌数counts(PLANES, 13)和标量scalars(PLANE_SCALARS,)"""
+    state = engine.state
+    current_player = state.current_player
+    opponent_id = 1 - current_player
+    hand = state.players[current_player]
+    counts[0] = rank_counts(hand)
+    counts[1] = engine.unseen.counts(current_player)
+    counts[2] = engine.game_history.played_rank_counts(opponent_id)
+    scalars.fill(0)
+    scalars[0] = len(hand) / 16
+    scalars[1] = len(state.players[opponent_id]) / 16
+    if engine.is_cover_play():
+        last_pattern = state.last_pattern
+        counts[3] = rank_counts(last_pattern.cards)
+        scalars[3] = (last_pattern.main_point - 3) / 12
+        scalars[3 + last_pattern.type.value] = 1
+    else:
+        counts[3] = 0
+        scalars[2] = 1
+
+
+def encode_planes(engine: GameEngine, out: Optional[np.ndarray] = None) -> np.ndarray:
+    """
+    按点数平面编码单局当前玩家的观测
+
+    Args:
+        engine: 游戏引擎
+        out: 写入的长度为PLANE_STATE_SIZE的float32数组，默认新建
+
+    Returns:
+        np.ndarray: 展平的观测向量，reshape前PLANES*52位可得到PLANE_SHAPE的平面
+    """
+    if out is None:
+        out = np.empty(PLANE_STATE_SIZE, dtype=np.float32)
+    counts = np.empty((1, PLANES, 13), dtype=np.int8)
+    scalars = np.empty((1, PLANE_SCALARS), dtype=np.float32)
+    _load_planes(engine, counts[0], scalars[0])
+    _fill_planes(counts, scalars, out[None])
+    return out
+
+
+class BatchPlaneEncoder:
+    """
+    批量按点数平面编码观测，输入数组在构造时按容量预先分配
+
+    Args:
+        capacity: 一次最多编码的状态数M
+    """
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.counts = np.zeros((capacity, PLANES, 13), dtype=np.int8)
+        self.scalars = np.zeros((capacity, PLANE_SCALARS), dtype=np.float32)
+
+    def load(self, row: int, engine: GameEngine):
+        """把一局的当前玩家状态读入第row行输入"""
+        _load_planes(engine, self.counts[row], self.scalars[row])
+
+    def encode(self, count: int, out: np.ndarray) -> np.ndarray:
+        """把已读入的前count行输入编码到形状(至少count, PLANE_STATE_SIZE)的float32缓冲区out[:count]"""
+        _fill_planes(self.counts[:count], self.scalars[:count], out[:count])
+        return out[:count]
+
+    def encode_engines(self, engines: Sequence[GameEngine], out: np.ndarray) -> np.ndarray:
+        """编码一批对局当前玩家的观测，写入out[:len(engines)]"""
+        for row, engine in enumerate(engines):
+            self.load(row, engine)
+        return self.encode(len(engines), out)
+
+
+# RLEnvironment可选的观测编码：名称 -> (观测大小, 单个状态的编码函数)
+ENCODINGS: Dict[str, tuple] = {
+    'vector': (STATE_SIZE, encode_state),
+    'planes': (PLANE_STATE_SIZE, encode_planes),
+}
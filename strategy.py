@@ -2,6 +2,7 @@
 AI玩家策略模块
 """
 
+from itertools import chain
 from typing import List, Tuple
 from cards import Card, CardPattern, CardType
 from game import GameEngine
@@ -28,10 +29,11 @@ class SimpleAIStrategy(AIStrategy):
     
     def choose_action(self, engine: GameEngine) -> Tuple[str, List[Card]]:
         """基于规则的简单AI策略"""
-        # 获取有效牌型
-        valid_patterns = engine.get_valid_patterns(self.player_id)
+        # 按优先级顺序逐个生成有效牌型，只取需要的部分
+        valid_patterns = engine.iter_valid_patterns(self.player_id)
+        first_pattern = next(valid_patterns, None)
         
-        if not valid_patterns:
+        if first_pattern is None:
             # 没有可出的牌，只能跳过
             return ("pass", [])
         
@@ -42,18 +44,16 @@ class SimpleAIStrategy(AIStrategy):
         
         # 2. 如果只剩两张牌且是对子，出对子
         if len(engine.state.players[self.player_id]) == 2:
-            if valid_patterns and valid_patterns[0].type == CardType.PAIR:
-                return ("play", valid_patterns[0].cards)
+            if first_pattern.type == CardType.PAIR:
+                return ("play", first_pattern.cards)
         
-        # 3. 寻找最小的单张
-        single_patterns = [p for p in valid_patterns if p.type == CardType.SINGLE]
-        if single_patterns:
-            # 选择点数最小的单张
-            min_pattern = min(single_patterns, key=lambda p: p.main_point)
+        # 3. 寻找最小的单张（单张按点数从小到大生成，第一个就是最小的）
+        min_pattern = next(engine.iter_valid_patterns(self.player_id, (CardType.SINGLE,)), None)
+        if min_pattern is not None:
             return ("play", min_pattern.cards)
         
         # 4. 如果没有单张，出最小的牌型
-        min_pattern = min(valid_patterns, key=lambda p: p.main_point)
+        min_pattern = min(chain([first_pattern], valid_patterns), key=lambda p: p.main_point)
         return ("play", min_pattern.cards)
 
 
@@ -0,0 +1,133 @@
+"""
+测试固定的全局动作空间和合法动作掩码
+"""
+
+import sys
+import os
+# 添加项目根目录到Python路径
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..'))
+
+import random
+import unittest
+import numpy as np
+from action_space import PASS_ACTION, get_action_space, legal_action_mask, legal_action_masks
+from batch_engine import BatchGameEngine
+from cards import classify_rank_counts, rank_counts
+from game import GameEngine
+from move_generator import MoveGenerator, move_layout
+from rl_environment import RLEnvironment
+
+
+def expected_mask(engine):
+    """由MoveGenerator生成的动作得到的合法动作掩码"""
+    space = get_action_space()
+    state = engine.state
+    generator = MoveGenerator(state.players[state.current_player])
+    moves = generator.cover_moves(state.last_pattern) if engine.is_cover_play() else generator.moves()
+    mask = np.zeros(space.size, dtype=bool)
+    indices = space.index(moves) if moves else np.zeros(0, dtype=np.int64)
+    mask[indices[indices >= 0]] = True
+    # 管牌时总是可以跳过，首出时只有无牌可出才能跳过
+    mask[PASS_ACTION] = engine.is_cover_play() or not mask.any()
+    return mask
+
+
+def random_states(count, seed):
+    """随机对局中的一批状态"""
+    random.seed(seed)
+    engines = []
+    while len(engines) < count:
+        engine = GameEngine()
+        engine.deal_cards()
+        while not engine.state.game_over and len(engines) < count:
+            engines.append(engine.clone())
+            engine.apply(engine.random_valid_pattern(engine.state.current_player), validate=False)
+    return engines
+
+
+def state_inputs(engine):
+    state = engine.state
+    last_key = state.last_pattern.key if state.last_pattern is not None else -1
+    return rank_counts(state.players[state.current_player]), last_key, state.pass_count
+
+
+class TestActionSpace(unittest.TestCase):
+
+    def test_actions_are_consistent(self):
+        """跳过在下标0，编码升序且各动作能按编码识别为对应牌型"""
+        space = get_action_space()
+        self.assertEqual(space.codes[PASS_ACTION], 0)
+        self.assertTrue((np.diff(space.codes) > 0).all())
+        self.assertTrue((space.card_counts[1:] <= 16).all())
+        for action in random.Random(1).sample(range(1, space.size), 300):
+            card_type, main_point, key, _ = move_layout(int(space.codes[action]))
+            self.assertEqual(classify_rank_counts(space.counts[action].tolist()), (card_type, main_point))
+            self.assertEqual(key, space.keys[action])
+
+    def test_mask_matches_generator(self):
+        """单个状态的掩码与MoveGenerator生成的动作一致"""
+        for engine in random_states(150, seed=3):
+            mask = legal_action_mask(*state_inputs(engine))
+            self.assertTrue((mask == expected_mask(engine)).all())
+
+    def test_pass_only_when_covering(self):
+        """首出时有牌可出就不能跳过，管牌时可以跳过"""
+        engine = GameEngine()
+        engine.deal_cards()
+        counts, _, _ = state_inputs(engine)
+        self.assertFalse(legal_action_mask(counts)[PASS_ACTION])
+        env = RLEnvironment()
+        env.reset()
+        self.assertFalse(env.legal_action_mask()[PASS_ACTION])
+        # 管牌时可以跳过；连续跳过之后重新首出，不能跳过
+        last_key = int(get_action_space().keys[1])
+        self.assertTrue(legal_action_mask(counts, last_key, 0)[PASS_ACTION])
+        self.assertFalse(legal_action_mask(counts, last_key, 1)[PASS_ACTION])
+        # 没有其他合法动作时只能跳过
+        empty = legal_action_mask([0] * 13)
+        self.assertTrue(empty[PASS_ACTION])
+        self.assertEqual(empty.sum(), 1)
+
+    def test_batch_masks(self):
+        """批量计算与逐个计算结果一致"""
+        engines = random_states(64, seed=8)
+        counts, last_keys, pass_counts = zip(*(state_inputs(engine) for engine in engines))
+        masks = legal_action_masks(np.array(counts), np.array(last_keys), np.array(pass_counts))
+        self.assertEqual(masks.shape, (64, get_action_space().size))
+        for engine, mask in zip(engines, masks):
+            self.assertTrue((mask == expected_mask(engine)).all())
+
+    def test_batch_engine_masks(self):
+        """批量引擎的掩码与逐局判断一致，已结束的对局没有合法动作"""
+        batch = BatchGameEngine(8, seed=4)
+        batch.deal()
+        batch.done[0] = True
+        masks = batch.legal_action_masks()
+        self.assertFalse(masks[0].any())
+        for game in range(1, 8):
+            self.assertTrue((masks[game] == expected_mask(batch.to_engine(game))).all())
+
+    def test_step_action(self):
+        """RLEnvironment按全局动作下标出牌，不合法的动作按跳过处理"""
+        random.seed(12)
+        env = RLEnvironment()
+        env.reset()
+        player = env.engine.state.current_player
+        mask = env.legal_action_mask()
+        action = int(np.flatnonzero(mask)[1])
+        pattern = env.action_pattern(action)
+        left = env.engine.state.player_cards_left[player]
+        env.step_action(action)
+        self.assertEqual(env.engine.state.player_cards_left[player], left - len(pattern.cards))
+        self.assertEqual(env.engine.game_history[-1]['cards'], pattern.cards)
+
+        player = env.engine.state.current_player
+        illegal = int(np.flatnonzero(~env.legal_action_mask())[0])
+        left = env.engine.state.player_cards_left[player]
+        _, reward, _, _ = env.step_action(illegal)
+        self.assertEqual(env.engine.state.player_cards_left[player], left)
+        self.assertEqual(reward, -0.1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,105 @@
+"""
+测试批量游戏引擎
+"""
+
+import sys
+import os
+# 添加项目根目录到Python路径
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..'))
+
+import random
+import unittest
+import numpy as np
+from action_space import PASS_ACTION, get_action_space
+from batch_engine import BatchGameEngine
+from cards import Hand
+from move_generator import MoveGenerator
+
+
+def generator_actions(engine):
+    """单局引擎中当前玩家可以出的动作下标（不含跳过）"""
+    generator = MoveGenerator(engine.state.players[engine.state.current_player])
+    if engine.is_cover_play():
+        moves = generator.cover_moves(engine.state.last_pattern)
+    else:
+        moves = generator.moves()
+    indices = get_action_space().index(moves) if moves else np.zeros(0, dtype=np.int64)
+    return generator, dict(zip(indices.tolist(), moves))
+
+
+class TestBatchGameEngine(unittest.TestCase):
+
+    def setUp(self):
+        self.batch = BatchGameEngine(24, seed=5)
+        self.batch.deal()
+
+    def assert_same_state(self, engine, game):
+        batch = self.batch
+        state = engine.state
+        for player in range(2):
+            self.assertEqual(Hand.from_cards(state.players[player]).mask, batch.hands[game, player])
+            self.assertEqual(Hand.from_cards(state.players[player]).rank_counts(), batch.counts[game, player].tolist())
+        self.assertEqual(state.current_player, batch.current_player[game])
+        self.assertEqual(state.pass_count, batch.pass_count[game])
+        self.assertEqual(state.last_pattern.key if state.last_pattern else -1, batch.last_key[game])
+        self.assertEqual(state.game_over, batch.done[game])
+        self.assertEqual(state.winner, batch.winner[game])
+
+    def test_deal(self):
+        """每人16张互不重复的牌，有黑桃3的玩家先出"""
+        hands = self.batch.hands
+        self.assertTrue(((hands[:, 0] & hands[:, 1]) == 0).all())
+        for game in range(self.batch.num_games):
+            engine = self.batch.to_engine(game)
+            self.assertEqual([len(hand) for hand in engine.state.players], [16, 16])
+            self.assertEqual(engine._determine_first_player(), self.batch.first_player[game])
+            self.assert_same_state(engine, game)
+
+    def test_step_matches_engine(self):
+        """与单局引擎逐步对照：合法动作与生成器一致，出牌后状态一致"""
+        rng = random.Random(2)
+        space = get_action_space()
+        engines = [self.batch.to_engine(game) for game in range(self.batch.num_games)]
+        for _ in range(80):
+            actions = np.zeros(self.batch.num_games, dtype=np.int64)
+            patterns = []
+            for game, engine in enumerate(engines):
+                if engine.state.game_over:
+                    patterns.append(None)
+                    continue
+                generator, legal = generator_actions(engine)
+                legal.pop(-1, None)
+                # 随机抽一些动作检查是否合法
+                for action in rng.sample(range(space.size), 20):
+                    actions[game] = action
+                    self.assertEqual(bool(self.batch.legal(actions)[game]),
+                                     action in legal or action == PASS_ACTION and engine.is_cover_play())
+                actions[game] = PASS_ACTION
+                self.assertEqual(bool(self.batch.legal(actions)[game]), engine.is_cover_play())
+                choices = list(legal) + ([PASS_ACTION] if engine.is_cover_play() else [])
+                actions[game] = rng.choice(choices)
+                patterns.append(generator.to_pattern(legal[actions[game]]) if actions[game] != PASS_ACTION
+                                else None)
+            played = self.batch.step(actions)
+            for game, engine in enumerate(engines):
+                if engine.state.game_over:
+                    self.assertFalse(played[game])
+                    continue
+                self.assertTrue(played[game])
+                engine.apply(patterns[game], validate=False)
+                self.assert_same_state(engine, game)
+
+    def test_illegal_action_is_ignored(self):
+        """不合法的动作不改变对局状态"""
+        hands = self.batch.hands.copy()
+        current = self.batch.current_player.copy()
+        # 超出动作空间的下标
+        actions = np.full(self.batch.num_games, get_action_space().size, dtype=np.int64)
+        played = self.batch.step(actions)
+        self.assertFalse(played.any())
+        self.assertTrue((self.batch.hands == hands).all())
+        self.assertTrue((self.batch.current_player == current).all())
+
+
+if __name__ == '__main__':
+    unittest.main()
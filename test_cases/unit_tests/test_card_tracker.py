@@ -0,0 +1,72 @@
+"""
+测试按玩家视角增量维护的未出现的牌
+"""
+
+import sys
+import os
+# 添加项目根目录到Python路径
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..'))
+
+import random
+import unittest
+from game import GameEngine
+from cards import Hand, create_deck
+
+
+def expected_unseen(engine, observer):
+    """完整牌堆减去观察者的手牌和双方已出的牌"""
+    known = set(engine.state.players[observer])
+    for move in engine.game_history:
+        known.update(move['cards'])
+    return [card for card in create_deck() if card not in known]
+
+
+class TestCardTracker(unittest.TestCase):
+
+    def setUp(self):
+        random.seed(31)
+        self.engine = GameEngine()
+        self.engine.deal_cards()
+
+    def assert_consistent(self):
+        for observer in range(2):
+            cards = expected_unseen(self.engine, observer)
+            self.assertEqual(self.engine.unseen.mask(observer), Hand.from_cards(cards).mask)
+            self.assertEqual(self.engine.unseen.counts(observer), Hand.from_cards(cards).rank_counts())
+
+    def test_tracks_play(self):
+        """每次出牌后两个视角下未出现的牌都正确"""
+        self.assert_consistent()
+        self.assertEqual(self.engine.remaining_cards, expected_unseen(self.engine, self.engine.state.current_player))
+        while not self.engine.state.game_over:
+            player = self.engine.state.current_player
+            pattern = self.engine.random_valid_pattern(player)
+            if pattern is None:
+                self.engine.pass_turn(player)
+            else:
+                self.engine.play_cards(player, pattern.cards)
+            self.assert_consistent()
+
+    def test_apply_undo(self):
+        """apply和undo同样维护未出现的牌"""
+        before = [self.engine.unseen.mask(0), self.engine.unseen.mask(1)]
+        tokens = []
+        for _ in range(15):
+            pattern = self.engine.random_valid_pattern(self.engine.state.current_player)
+            tokens.append(self.engine.apply(pattern, validate=False))
+            self.assert_consistent()
+        for token in reversed(tokens):
+            self.engine.undo(token)
+        self.assertEqual([self.engine.unseen.mask(0), self.engine.unseen.mask(1)], before)
+        self.assert_consistent()
+
+    def test_clone_is_independent(self):
+        """复制的引擎有独立的记牌器"""
+        copy = self.engine.clone()
+        pattern = copy.random_valid_pattern(copy.state.current_player)
+        copy.play_cards(copy.state.current_player, pattern.cards)
+        self.assert_consistent()
+
+
+if __name__ == '__main__':
+    unittest.main()
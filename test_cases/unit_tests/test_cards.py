@@ -7,8 +7,10 @@ import os
 # 添加项目根目录到Python路径
 sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..'))
 
+import copy
+import pickle
 import unittest
-from cards import Card, Suit, create_deck, detect_card_type, CardType, CardPattern
+from cards import Card, Suit, create_deck, detect_card_type, CardType, CardPattern, classify_rank_counts, rank_counts
 
 
 class TestCards(unittest.TestCase):
@@ -48,6 +50,27 @@ class TestCards(unittest.TestCase):
         spade_A_count = sum(1 for card in deck if card.suit == Suit.SPADE and card.rank == 'A')
         self.assertEqual(spade_A_count, 0)
     
+    def test_card_interning(self):
+        """测试同一种牌只有一个实例"""
+        deck = create_deck()
+        self.assertIs(Card(Suit.HEART, 'K'), Card(Suit.HEART, 'K'))
+        self.assertIs(Card(Suit.SPADE, '3'), deck[0])
+        self.assertEqual(sorted(card.ordinal for card in deck), list(range(48)))
+        self.assertIs(Card.from_ordinal(47), Card(Suit.SPADE, '2'))
+        self.assertNotEqual(Card(Suit.SPADE, '3'), Card(Suit.HEART, '3'))
+        self.assertEqual(len({Card(Suit.SPADE, '3'), Card(Suit.SPADE, '3')}), 1)
+        # 相等判断使用默认的同一对象比较，拷贝和序列化后仍是同一实例
+        self.assertNotIn('__eq__', vars(Card))
+        self.assertIs(copy.deepcopy(deck[5]), deck[5])
+        self.assertIs(pickle.loads(pickle.dumps(deck[5])), deck[5])
+        self.assertIn(Card(Suit.HEART, 'K'), deck)
+
+    def test_create_deck_returns_new_list(self):
+        """测试每次创建的牌堆列表互不影响"""
+        deck = create_deck()
+        deck.pop()
+        self.assertEqual(len(create_deck()), 48)
+
     def test_detect_single(self):
         """测试单张识别"""
         cards = [Card(Suit.SPADE, '3')]
@@ -87,5 +110,35 @@ class TestCards(unittest.TestCase):
         self.assertEqual(pattern.type, CardType.BOMB)
         self.assertEqual(pattern.main_point, 14)
 
+    def test_classify_rank_counts(self):
+        """测试根据点数计数向量识别牌型"""
+        def counts(**by_point):
+            vector = [0] * 13
+            for point, count in by_point.items():
+                vector[int(point[1:]) - 3] = count
+            return vector
+
+        self.assertEqual(classify_rank_counts(counts(p5=1)), (CardType.SINGLE, 5))
+        self.assertEqual(classify_rank_counts(counts(p14=3)), (CardType.BOMB, 14))
+        self.assertEqual(classify_rank_counts(counts(p13=3)), (CardType.THREE_WITH_TWO, 13))
+        self.assertEqual(classify_rank_counts(counts(p3=1, p7=3, p9=1)), (CardType.THREE_WITH_TWO, 7))
+        self.assertEqual(classify_rank_counts(counts(p10=1, p11=1, p12=1, p13=1, p14=1)), (CardType.STRAIGHT, 10))
+        self.assertIsNone(classify_rank_counts(counts(p11=1, p12=1, p13=1, p14=1, p15=1)))  # 顺子不能带2
+        self.assertEqual(classify_rank_counts(counts(p5=2, p6=2, p7=2)), (CardType.DOUBLE_STRAIGHT, 5))
+        self.assertEqual(classify_rank_counts(counts(p6=4, p9=1)), (CardType.FOUR_WITH_THREE, 6))
+        self.assertEqual(classify_rank_counts(counts(p8=3, p9=3)), (CardType.AIRPLANE, 8))
+        self.assertEqual(classify_rank_counts(counts(p8=3, p9=3, p3=2, p4=1, p5=1)), (CardType.AIRPLANE_WITH_WINGS, 8))
+        self.assertIsNone(classify_rank_counts(counts(p8=3, p10=3, p3=2, p4=2)))  # 三同张不连续
+        self.assertIsNone(classify_rank_counts([0] * 13))
+
+    def test_detect_uses_rank_counts(self):
+        """测试detect_card_type与计数向量识别结果一致"""
+        cards = [Card(Suit.SPADE, '9'), Card(Suit.HEART, '9'), Card(Suit.CLUB, '9'),
+                 Card(Suit.SPADE, '4'), Card(Suit.HEART, '4')]
+        pattern = detect_card_type(cards)
+        self.assertEqual((pattern.type, pattern.main_point), classify_rank_counts(rank_counts(cards)))
+        self.assertEqual([card.point for card in pattern.cards], [4, 4, 9, 9, 9])
+
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
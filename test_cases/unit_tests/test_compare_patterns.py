@@ -0,0 +1,80 @@
+"""
+测试牌型规范键和批量比较
+"""
+
+import sys
+import os
+# 添加项目根目录到Python路径
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..'))
+
+import unittest
+from cards import Card, Suit, CardType, CardPattern, compare_patterns, beats_mask, pattern_keys, detect_card_type
+
+
+def make_cards(*specs):
+    """根据(花色, 点数)列表创建牌"""
+    return [Card(suit, rank) for suit, rank in specs]
+
+
+class TestComparePatterns(unittest.TestCase):
+
+    def setUp(self):
+        self.single_5 = detect_card_type(make_cards((Suit.SPADE, '5')))
+        self.single_k = detect_card_type(make_cards((Suit.HEART, 'K')))
+        self.pair_9 = detect_card_type(make_cards((Suit.SPADE, '9'), (Suit.HEART, '9')))
+        self.bomb_4 = detect_card_type(make_cards((Suit.SPADE, '4'), (Suit.HEART, '4'),
+                                                  (Suit.DIAMOND, '4'), (Suit.CLUB, '4')))
+        self.bomb_a = detect_card_type(make_cards((Suit.HEART, 'A'), (Suit.DIAMOND, 'A'), (Suit.CLUB, 'A')))
+        self.straight_5 = detect_card_type(make_cards((Suit.SPADE, '3'), (Suit.SPADE, '4'), (Suit.SPADE, '5'),
+                                                      (Suit.SPADE, '6'), (Suit.SPADE, '7')))
+        self.straight_6 = detect_card_type(make_cards((Suit.HEART, '4'), (Suit.HEART, '5'), (Suit.HEART, '6'),
+                                                      (Suit.HEART, '7'), (Suit.HEART, '8'), (Suit.HEART, '9')))
+        self.three_8 = CardPattern(CardType.THREE_WITH_TWO,
+                                   make_cards((Suit.SPADE, '8'), (Suit.HEART, '8'), (Suit.CLUB, '8')), 8)
+        self.three_10 = detect_card_type(make_cards((Suit.SPADE, '10'), (Suit.HEART, '10'), (Suit.CLUB, '10'),
+                                                    (Suit.SPADE, '3'), (Suit.HEART, '6')))
+
+    def test_key_ordering(self):
+        """测试规范键的比较结果"""
+        self.assertTrue(compare_patterns(self.single_k, self.single_5))
+        self.assertFalse(compare_patterns(self.single_5, self.single_k))
+        self.assertFalse(compare_patterns(self.pair_9, self.single_5))
+        self.assertTrue(compare_patterns(self.bomb_4, self.straight_6))
+        self.assertTrue(compare_patterns(self.bomb_a, self.bomb_4))
+        self.assertFalse(compare_patterns(self.bomb_4, self.bomb_a))
+        # 顺子长度不同不能比较
+        self.assertFalse(compare_patterns(self.straight_6, self.straight_5))
+        # 三带二只比较三同张，不管带了几张牌
+        self.assertTrue(compare_patterns(self.three_10, self.three_8))
+
+    def test_airplane_with_wings_triple_count(self):
+        """测试飞机带翅膀需要三同张数量相同"""
+        small = detect_card_type(make_cards(
+            (Suit.SPADE, '5'), (Suit.HEART, '5'), (Suit.CLUB, '5'),
+            (Suit.SPADE, '6'), (Suit.HEART, '6'), (Suit.CLUB, '6'),
+            (Suit.SPADE, '3'), (Suit.HEART, '3'), (Suit.SPADE, '4'), (Suit.HEART, '4')))
+        big = detect_card_type(make_cards(
+            (Suit.SPADE, '9'), (Suit.HEART, '9'), (Suit.CLUB, '9'),
+            (Suit.SPADE, '10'), (Suit.HEART, '10'), (Suit.CLUB, '10'),
+            (Suit.DIAMOND, '3'), (Suit.CLUB, '3'), (Suit.DIAMOND, '4'), (Suit.CLUB, '4')))
+        self.assertEqual(big.type, CardType.AIRPLANE_WITH_WINGS)
+        self.assertTrue(compare_patterns(big, small))
+        self.assertFalse(compare_patterns(small, big))
+
+    def test_beats_mask_matches_compare(self):
+        """测试批量比较与逐个比较结果一致"""
+        patterns = [self.single_5, self.single_k, self.pair_9, self.bomb_4, self.bomb_a,
+                    self.straight_5, self.straight_6, self.three_8, self.three_10]
+        keys = pattern_keys(patterns)
+        for target in patterns:
+            expected = [compare_patterns(pattern, target) for pattern in patterns]
+            self.assertEqual(beats_mask(patterns, target).tolist(), expected)
+            self.assertEqual(beats_mask(keys, target).tolist(), expected)
+
+    def test_beats_mask_empty(self):
+        """测试空列表"""
+        self.assertEqual(len(beats_mask([], self.single_5)), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,37 @@
+"""
+测试DQN策略的观测大小与观测编码一致
+"""
+
+import sys
+import os
+# 添加项目根目录到Python路径
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..'))
+
+import unittest
+from rl_environment import RLEnvironment
+from rl_strategy import DQNAIStrategy
+
+
+class TestDQNStateSize(unittest.TestCase):
+
+    def test_default_matches_encoding(self):
+        """不给出state_size时使用观测编码的大小，网络输入与环境的观测一致"""
+        for encoding in ('vector', 'planes'):
+            agent = DQNAIStrategy(0, encoding=encoding)
+            env = RLEnvironment(encoding)
+            self.assertEqual(agent.state_size, env.state_size)
+            self.assertEqual(agent.q_network.fc1.in_features, env.state_size)
+            self.assertEqual(agent.memory.states.shape[1], env.state_size)
+
+    def test_mismatched_state_size(self):
+        """给出的state_size与观测编码不一致时报错"""
+        with self.assertRaises(ValueError):
+            DQNAIStrategy(0, state_size=21)
+        with self.assertRaises(ValueError):
+            DQNAIStrategy(0, state_size=RLEnvironment('vector').state_size, encoding='planes')
+        with self.assertRaises(ValueError):
+            DQNAIStrategy(0, encoding='unknown')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,159 @@
+"""
+测试引擎复制、状态快照和出牌撤销
+"""
+
+import sys
+import os
+# 添加项目根目录到Python路径
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..'))
+
+import random
+import unittest
+from game import GameEngine, GameState
+from rl_strategy import MonteCarloAIStrategy
+
+
+def state_fields(state):
+    """状态中所有字段的可比较表示"""
+    return (list(state.deck), [list(hand) for hand in state.players], state.current_player, state.last_pattern,
+            state.last_player, state.pass_count, state.game_over, state.winner, state.first_player,
+            list(state.scores), state.is_first_round, list(state.player_cards_left), state.zobrist)
+
+
+class TestEngineSnapshot(unittest.TestCase):
+
+    def setUp(self):
+        random.seed(12)
+        self.engine = GameEngine()
+        self.engine.deal_cards()
+
+    def play_random_moves(self, engine, count):
+        for _ in range(count):
+            if engine.state.game_over:
+                break
+            player = engine.state.current_player
+            pattern = engine.random_valid_pattern(player)
+            if pattern is None:
+                engine.pass_turn(player)
+            else:
+                engine.play_cards(player, pattern.cards)
+
+    def test_snapshot_restore(self):
+        """恢复快照后状态与创建快照时一致，且快照不受之后修改的影响"""
+        before = state_fields(self.engine.state)
+        snapshot = self.engine.state.snapshot()
+        self.play_random_moves(self.engine, 6)
+        self.assertNotEqual(state_fields(self.engine.state), before)
+        self.engine.state.restore(snapshot)
+        self.assertEqual(state_fields(self.engine.state), before)
+        self.assertEqual(state_fields(GameState.from_snapshot(snapshot)), before)
+
+    def test_clone_is_independent(self):
+        """对副本出牌不影响原来的对局"""
+        before = state_fields(self.engine.state)
+        copy = self.engine.clone()
+        self.assertEqual(state_fields(copy.state), before)
+        self.play_random_moves(copy, 10)
+        self.assertEqual(state_fields(self.engine.state), before)
+        self.assertIsNot(copy.game_history, self.engine.game_history)
+
+    def test_monte_carlo_does_not_modify_game(self):
+        """蒙特卡洛模拟不会修改真实的对局"""
+        before = state_fields(self.engine.state)
+        strategy = MonteCarloAIStrategy(self.engine.state.current_player, simulations=3)
+        strategy.choose_action(self.engine)
+        self.assertEqual(state_fields(self.engine.state), before)
+
+    def test_engine_snapshot_restores_history_and_unseen(self):
+        """引擎快照同时恢复出牌记录和未出现的牌，可以多次恢复"""
+        self.play_random_moves(self.engine, 3)
+        before = (state_fields(self.engine.state), len(self.engine.game_history),
+                  list(self.engine.unseen.counts(0)), list(self.engine.unseen.counts(1)),
+                  self.engine.game_history.played_rank_counts(0))
+        snapshot = self.engine.snapshot()
+        for _ in range(2):
+            self.play_random_moves(self.engine, 8)
+            self.engine.restore(snapshot)
+            after = (state_fields(self.engine.state), len(self.engine.game_history),
+                     list(self.engine.unseen.counts(0)), list(self.engine.unseen.counts(1)),
+                     self.engine.game_history.played_rank_counts(0))
+            self.assertEqual(after, before)
+
+    def test_simulate_action_keeps_history_and_unseen(self):
+        """模拟某个动作前后，出牌记录长度和未出现的牌不变"""
+        engine = self.engine
+        self.play_random_moves(engine, 3)
+        player = engine.state.current_player
+        pattern = engine.random_valid_pattern(player)
+        while pattern is None:
+            engine.pass_turn(player)
+            player = engine.state.current_player
+            pattern = engine.random_valid_pattern(player)
+        before = (len(engine.game_history), list(engine.unseen.counts(0)), list(engine.unseen.counts(1)))
+        MonteCarloAIStrategy(player, simulations=3)._simulate_action(engine, pattern)
+        self.assertEqual((len(engine.game_history), engine.unseen.counts(0), engine.unseen.counts(1)), before)
+
+    def test_apply_undo_restores_state(self):
+        """apply后按相反顺序undo，状态与开始时完全一致"""
+        before = state_fields(self.engine.state)
+        tokens = []
+        while not self.engine.state.game_over:
+            pattern = self.engine.random_valid_pattern(self.engine.state.current_player)
+            tokens.append(self.engine.apply(pattern, validate=False))
+        self.assertNotEqual(state_fields(self.engine.state), before)
+        for token in reversed(tokens):
+            self.engine.undo(token)
+        self.assertEqual(state_fields(self.engine.state), before)
+
+    def test_apply_matches_play_cards(self):
+        """apply与play_cards/pass_turn得到相同的状态"""
+        copy = self.engine.clone()
+        rng = random.Random(5)
+        while not self.engine.state.game_over:
+            player = self.engine.state.current_player
+            pattern = self.engine.random_valid_pattern(player, rng)
+            self.assertIsNotNone(self.engine.apply(pattern))
+            if pattern is None:
+                copy.pass_turn(player)
+            else:
+                self.assertTrue(copy.play_cards(player, pattern.cards))
+            self.assertEqual(state_fields(self.engine.state), state_fields(copy.state))
+
+    def test_apply_rejects_invalid_move(self):
+        """不符合规则的出牌返回None且不修改状态"""
+        player = self.engine.state.current_player
+        opponent_pattern = self.engine.get_valid_patterns(1 - player)[0]
+        before = state_fields(self.engine.state)
+        self.assertIsNone(self.engine.apply(opponent_pattern))
+        self.assertEqual(state_fields(self.engine.state), before)
+
+    def test_zobrist_incremental(self):
+        """增量更新的哈希与完整计算的结果一致，撤销后恢复原来的哈希"""
+        start = self.engine.state.zobrist
+        self.assertEqual(start, self.engine.state.compute_zobrist())
+        copy = self.engine.clone()
+        self.play_random_moves(copy, 40)
+        self.assertEqual(copy.state.zobrist, copy.state.compute_zobrist())
+        tokens = []
+        while not self.engine.state.game_over:
+            pattern = self.engine.random_valid_pattern(self.engine.state.current_player)
+            tokens.append(self.engine.apply(pattern, validate=False))
+            self.assertEqual(self.engine.state.zobrist, self.engine.state.compute_zobrist())
+        for token in reversed(tokens):
+            self.engine.undo(token)
+        self.assertEqual(self.engine.state.zobrist, start)
+
+    def test_zobrist_distinguishes_turn_and_pass(self):
+        """当前玩家和连续跳过次数不同的状态哈希不同"""
+        state = self.engine.state
+        seen = {state.zobrist}
+        self.engine.pass_turn(state.current_player)
+        seen.add(state.zobrist)
+        state.current_player = 1 - state.current_player
+        state.rehash()
+        seen.add(state.zobrist)
+        self.assertEqual(len(seen), 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -46,7 +46,7 @@ class TestGPUOptimization(unittest.TestCase):
     def test_rl_components_device(self):
         """测试强化学习组件设备使用"""
         # 创建DQN AI策略
-        agent = DQNAIStrategy(player_id=0, state_size=21)
+        agent = DQNAIStrategy(player_id=0)
         self.assertIsInstance(agent.device, torch.device)
         
         # 创建环境
@@ -64,7 +64,7 @@ class TestGPUOptimization(unittest.TestCase):
         state = env.reset()
         
         # 创建DQN AI策略
-        agent = DQNAIStrategy(player_id=0, state_size=21)
+        agent = DQNAIStrategy(player_id=0)
         
         # 测试状态转换到设备
         state_tensor = torch.FloatTensor(state).unsqueeze(0).to(agent.device)
@@ -0,0 +1,68 @@
+"""
+测试位掩码手牌表示
+"""
+
+import sys
+import os
+# 添加项目根目录到Python路径
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..'))
+
+import random
+import unittest
+from cards import Card, Suit, Hand, create_deck, card_ordinal
+
+
+class TestHandBitmask(unittest.TestCase):
+
+    def test_ordinals_follow_deck_order(self):
+        """测试48张牌的序号为0..47且按点数递增"""
+        deck = create_deck()
+        self.assertEqual([card_ordinal(card) for card in deck], list(range(48)))
+
+    def test_round_trip(self):
+        """测试与牌列表的无损转换"""
+        deck = create_deck()
+        for _ in range(100):
+            cards = sorted(random.sample(deck, 16), key=card_ordinal)
+            hand = Hand.from_cards(cards)
+            self.assertEqual(len(hand), 16)
+            self.assertEqual(hand.to_cards(), cards)
+
+    def test_removed_cards_round_trip(self):
+        """测试被去掉的牌（如黑桃A）也能转换"""
+        cards = [Card(Suit.SPADE, 'A'), Card(Suit.HEART, 'A'), Card(Suit.SPADE, '3')]
+        hand = Hand.from_cards(cards)
+        self.assertEqual(hand.to_cards(), sorted(cards, key=card_ordinal))
+
+    def test_add_remove_contains(self):
+        """测试增删查"""
+        hand = Hand()
+        card = Card(Suit.HEART, '10')
+        self.assertNotIn(card, hand)
+        hand.add(card)
+        self.assertIn(card, hand)
+        self.assertEqual(len(hand), 1)
+        hand.remove(card)
+        self.assertNotIn(card, hand)
+        with self.assertRaises(KeyError):
+            hand.remove(card)
+
+    def test_set_operations(self):
+        """测试集合运算和点数统计"""
+        hand = Hand.from_cards([Card(Suit.SPADE, '3'), Card(Suit.HEART, '3'), Card(Suit.SPADE, '2')])
+        played = Hand.from_cards([Card(Suit.SPADE, '3')])
+        self.assertTrue(played.issubset(hand))
+        self.assertEqual((hand - played).to_cards(), [Card(Suit.HEART, '3'), Card(Suit.SPADE, '2')])
+        self.assertEqual(hand.rank_counts(), [2] + [0] * 11 + [1])
+
+    def test_hashable(self):
+        """测试相等的手牌哈希相同，可以作为字典键和集合元素"""
+        cards = [Card(Suit.SPADE, '3'), Card(Suit.HEART, '3')]
+        self.assertEqual(hash(Hand.from_cards(cards)), hash(Hand.from_cards(reversed(cards))))
+        table = {Hand.from_cards(cards): 1}
+        self.assertEqual(table[Hand.from_cards(cards)], 1)
+        self.assertEqual(len({Hand(5), Hand(5), Hand(6)}), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,160 @@
+"""
+测试点数层面的手牌拆分
+"""
+
+import sys
+import os
+# 添加项目根目录到Python路径
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..'))
+
+import random
+import unittest
+from itertools import combinations
+from game import GameEngine
+from cards import Card, Suit, CardType, create_deck, rank_counts
+from hand_decomposer import HandDecomposer, MinPlaysSolver, decompose, lower_bound, min_plays
+from move_generator import generate_moves, move_counts, move_card_count, move_type, counts_code, COUNTS_MASK
+
+
+def brute_force_decompositions(counts):
+    """枚举所有动作子集，找出点数之和正好等于手牌的组合"""
+    moves = generate_moves(counts)
+    found = set()
+    for size in range(1, sum(counts) + 1):
+        for subset in combinations(moves, size):
+            total = [sum(column) for column in zip(*(move_counts(m) for m in subset))]
+            if total == counts:
+                found.add(frozenset(subset))
+    return found
+
+
+class TestHandDecomposer(unittest.TestCase):
+
+    def setUp(self):
+        self.deck = create_deck()
+
+    def test_pair_hand(self):
+        """对子只有一种拆分（同一个单张不能使用两次）"""
+        counts = rank_counts([Card(Suit.SPADE, '3'), Card(Suit.HEART, '3')])
+        decompositions = decompose(counts)
+        self.assertEqual(len(decompositions), 1)
+        self.assertEqual(move_type(decompositions[0][0]), CardType.PAIR)
+
+    def test_complete_and_distinct(self):
+        """在小手牌上与暴力枚举的结果一致，且没有重复的拆分"""
+        rng = random.Random(3)
+        for _ in range(60):
+            counts = rank_counts(rng.sample(self.deck, rng.randint(1, 7)))
+            decompositions = decompose(counts)
+            as_sets = [frozenset(d) for d in decompositions]
+            self.assertEqual(len(as_sets), len(set(as_sets)))
+            self.assertEqual(set(as_sets), brute_force_decompositions(counts))
+            lengths = [len(d) for d in decompositions]
+            self.assertEqual(lengths, sorted(lengths))
+
+    def test_top_k(self):
+        """得分最高的k个拆分与完整枚举后排序的结果一致"""
+        def score(move):
+            return move_card_count(move) ** 2 - 0.1 * move_counts(move).index(max(move_counts(move)))
+
+        rng = random.Random(4)
+        for _ in range(30):
+            decomposer = HandDecomposer(rank_counts(rng.sample(self.deck, 16)))
+            expected = sorted((sum(score(m) for m in d) for d in decomposer.decompositions()), reverse=True)[:5]
+            top = decomposer.top_k(5, score)
+            self.assertEqual(len(top), len(expected))
+            for (got, _), want in zip(top, expected):
+                self.assertAlmostEqual(got, want)
+
+    def test_group_patterns_use_disjoint_cards(self):
+        """分组中的牌型使用手中互不重复的牌，且完整覆盖手牌"""
+        engine = GameEngine()
+        hand = [Card(Suit.SPADE, '7'), Card(Suit.HEART, '7'), Card(Suit.CLUB, '7'),
+                Card(Suit.SPADE, '3'), Card(Suit.HEART, '3'), Card(Suit.SPADE, '4')]
+        patterns = []
+        engine.generate_all_patterns(hand, patterns)
+        groups = engine.group_patterns_into_hands(hand, patterns)
+        self.assertGreater(len(groups), 0)
+        for group in groups:
+            cards = [card for pattern in group for card in pattern.cards]
+            self.assertEqual(sorted(cards, key=lambda c: c.ordinal), sorted(hand, key=lambda c: c.ordinal))
+        ranks = {frozenset((p.type, tuple(c.point for c in p.cards)) for p in group) for group in groups}
+        self.assertEqual(len(ranks), len(groups))
+
+    def test_min_plays_matches_shortest_decomposition(self):
+        """最少手数与完整拆分中最短的拆分一致，且下界不超过最优解"""
+        rng = random.Random(6)
+        for _ in range(100):
+            counts = rank_counts(rng.sample(self.deck, rng.randint(1, 16)))
+            solver = MinPlaysSolver(counts)
+            best = solver.solve()
+            self.assertEqual(sum(move & COUNTS_MASK for move in best), counts_code(counts))
+            self.assertEqual(len(best), len(decompose(counts)[0]))
+            for state, solution in solver._exact.items():
+                self.assertLessEqual(lower_bound(state), len(solution))
+
+    def test_min_plays_examples(self):
+        """测试几手典型的牌"""
+        def counts(**by_point):
+            vector = [0] * 13
+            for point, count in by_point.items():
+                vector[int(point[1:]) - 3] = count
+            return vector
+
+        # 顺子3-7加上一对9
+        self.assertEqual(len(min_plays(counts(p3=1, p4=1, p5=1, p6=1, p7=1, p9=2))), 2)
+        # 三个7带一对3，再加单张K
+        self.assertEqual(len(min_plays(counts(p7=3, p3=2, p13=1))), 2)
+        # 飞机带翅膀
+        self.assertEqual(len(min_plays(counts(p8=3, p9=3, p3=1, p4=1, p5=1, p6=1))), 1)
+
+    def test_engine_min_plays_group(self):
+        """引擎返回的最少手数分组完整覆盖手牌"""
+        engine = GameEngine()
+        engine.deal_cards()
+        group = engine.get_min_plays_group(0)
+        cards = [card for pattern in group for card in pattern.cards]
+        self.assertEqual(sorted(cards, key=lambda c: c.ordinal),
+                         sorted(engine.state.players[0], key=lambda c: c.ordinal))
+        self.assertEqual(len(group), len(engine.get_valid_pattern_groups(0)[0]))
+
+    def test_best_first_matches_full_enumeration(self):
+        """最佳优先搜索的前k个拆分与完整枚举后按真实得分排序的结果一致"""
+        def score(move):
+            return move_card_count(move) / (1 + move_counts(move).index(max(move_counts(move))))
+
+        def bound(move):
+            return score(move) * (5 if move_type(move) == CardType.BOMB else 1)
+
+        def exact(decomposition):
+            mixed = len({move_type(m) for m in decomposition}) > 1
+            return sum(bound(m) if mixed else score(m) for m in decomposition)
+
+        rng = random.Random(8)
+        for _ in range(40):
+            decomposer = HandDecomposer(rank_counts(rng.sample(self.deck, rng.randint(4, 16))))
+            expected = sorted((exact(d) for d in decomposer.decompositions() if len(d) % 2 == 0), reverse=True)[:5]
+            found = decomposer.best_first(5, bound, exact, lambda d: len(d) % 2 == 0)
+            self.assertEqual(len(found), len(expected))
+            for (got, _), want in zip(found, expected):
+                self.assertAlmostEqual(got, want)
+
+    def test_scored_pattern_groups(self):
+        """按评分函数取得分最高的分组"""
+        engine = GameEngine()
+        engine.deal_cards()
+
+        def score(group):
+            return -len(group) + sum(p.main_point for p in group) / 100
+
+        groups = engine.get_valid_pattern_groups(0, score_fn=score, top_k=3)
+        self.assertEqual(len(groups), 3)
+        scores = [score(group) for group in groups]
+        self.assertEqual(scores, sorted(scores, reverse=True))
+        best = max(score(group) for group in engine.group_patterns_into_hands(
+            engine.state.players[0], engine.get_valid_patterns(0)))
+        self.assertAlmostEqual(scores[0], best)
+
+
+if __name__ == '__main__':
+    unittest.main()
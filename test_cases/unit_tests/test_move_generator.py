@@ -0,0 +1,212 @@
+"""
+测试基于点数计数的出牌生成器
+"""
+
+import sys
+import os
+# 添加项目根目录到Python路径
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..'))
+
+import random
+import unittest
+from game import GameEngine
+from cards import Card, Suit, CardType, create_deck, rank_counts, compare_patterns
+from move_generator import (MoveGenerator, LazyCardPattern, generate_moves, encode_move, move_type,
+                            move_main_point, move_counts, move_card_count, move_key, rank_multisets,
+                            generate_cover_moves, iter_moves)
+
+
+def legacy_generate_all_patterns(engine, hand):
+    """按原有顺序依次调用各个_generate_*方法生成牌型"""
+    patterns = []
+    hand_size = len(hand)
+    engine._generate_bomb_patterns(hand, patterns)
+    if hand_size >= 7:
+        engine._generate_airplane_with_wings_patterns(hand, patterns)
+    if hand_size >= 6:
+        engine._generate_airplane_patterns(hand, patterns)
+    if hand_size >= 5:
+        engine._generate_straight_patterns(hand, patterns)
+    if hand_size >= 4:
+        engine._generate_double_straight_patterns(hand, patterns)
+    if hand_size >= 3:
+        engine._generate_three_with_two_patterns(hand, patterns)
+    engine._generate_pair_patterns(hand, patterns)
+    engine._generate_single_patterns(hand, patterns)
+    return patterns
+
+
+def rank_level(pattern):
+    """牌型在点数层面的表示（忽略花色）"""
+    return pattern.type, pattern.main_point, sorted(card.point for card in pattern.cards)
+
+
+def random_hand(rng, deck):
+    """随机手牌，一半的手牌集中在少数几个点数上以产生飞机、炸弹等牌型"""
+    size = rng.randint(1, 16)
+    if rng.random() < 0.5:
+        points = rng.sample(range(3, 16), rng.randint(2, 7))
+        pool = [card for card in deck if card.point in points]
+        return rng.sample(pool, min(size, len(pool)))
+    return rng.sample(deck, size)
+
+
+class TestMoveGenerator(unittest.TestCase):
+
+    def setUp(self):
+        self.engine = GameEngine()
+        self.deck = create_deck()
+
+    def test_equivalent_to_legacy_generator(self):
+        """在大量随机手牌上与原有生成器的结果（点数层面）和顺序一致"""
+        rng = random.Random(20240501)
+        for _ in range(1000):
+            hand = sorted(random_hand(rng, self.deck))
+            expected = [rank_level(p) for p in legacy_generate_all_patterns(self.engine, hand)]
+            patterns = []
+            self.engine.generate_all_patterns(hand, patterns)
+            self.assertEqual([rank_level(p) for p in patterns], expected, f"手牌: {hand}")
+
+    def test_patterns_use_cards_from_hand(self):
+        """生成的牌型只使用手中的牌，且规范键与直接创建的牌型一致"""
+        rng = random.Random(7)
+        for _ in range(200):
+            hand = random_hand(rng, self.deck)
+            generator = MoveGenerator(hand)
+            for move in generator.moves():
+                pattern = generator.to_pattern(move)
+                self.assertTrue(all(card in hand for card in pattern.cards))
+                self.assertEqual(len(set(pattern.cards)), pattern.card_count)
+                self.assertEqual(pattern.card_count, move_card_count(move))
+                self.assertEqual(pattern.key, move_key(move))
+
+    def test_kickers_are_rank_combinations(self):
+        """带牌只按点数组合生成，不会出现点数层面重复的牌型"""
+        rng = random.Random(11)
+        for _ in range(300):
+            hand = random_hand(rng, self.deck)
+            moves = MoveGenerator(hand).moves()
+            self.assertEqual(len(moves), len(set(moves)), f"手牌: {hand}")
+            patterns = []
+            self.engine.generate_all_patterns(hand, patterns)
+            self.assertEqual(len(patterns), len(moves))
+
+    def test_three_with_two_kicker_count(self):
+        """三张7加上两对其他点数，带牌只有3种点数组合"""
+        hand = [Card(Suit.SPADE, '7'), Card(Suit.HEART, '7'), Card(Suit.CLUB, '7'),
+                Card(Suit.SPADE, '3'), Card(Suit.HEART, '3'), Card(Suit.SPADE, '9'), Card(Suit.HEART, '9')]
+        patterns = []
+        self.engine._generate_three_with_two_patterns(hand, patterns)
+        self.assertEqual([[card.point for card in p.cards] for p in patterns],
+                         [[3, 3, 7, 7, 7], [3, 7, 7, 7, 9], [7, 7, 7, 9, 9]])
+
+    def test_rank_multisets(self):
+        """测试按字典序枚举点数组合"""
+        self.assertEqual(list(rank_multisets([(0, 2), (1, 1), (2, 1)], 2)),
+                         [(0, 0), (0, 1), (0, 2), (1, 2)])
+        self.assertEqual(list(rank_multisets([(0, 1)], 2)), [])
+
+    def test_lazy_suits(self):
+        """延迟展开花色的牌型在访问cards之前就可以比较，展开结果与直接生成一致"""
+        hand = [Card(Suit.SPADE, '5'), Card(Suit.HEART, '5'), Card(Suit.CLUB, '5'), Card(Suit.DIAMOND, '8')]
+        generator = MoveGenerator(hand)
+        for move in generator.moves():
+            lazy = generator.to_pattern(move, lazy=True)
+            eager = generator.to_pattern(move)
+            self.assertIsInstance(lazy, LazyCardPattern)
+            self.assertIsNone(lazy._cards)
+            self.assertEqual((lazy.type, lazy.main_point, lazy.card_count, lazy.key),
+                             (eager.type, eager.main_point, eager.card_count, eager.key))
+            self.assertEqual(lazy.cards, eager.cards)
+
+        self.engine.lazy_suits = True
+        patterns = []
+        self.engine.generate_all_patterns(hand, patterns)
+        self.assertTrue(all(isinstance(p, LazyCardPattern) for p in patterns))
+
+    def test_cover_moves_equal_filtered_moves(self):
+        """只生成管牌动作的结果和顺序与先全部生成再过滤一致"""
+        rng = random.Random(23)
+        targets = []
+        for _ in range(100):
+            targets.extend(MoveGenerator(random_hand(rng, self.deck)).patterns())
+        for _ in range(300):
+            generator = MoveGenerator(random_hand(rng, self.deck))
+            moves = generator.moves()
+            for target in rng.sample(targets, 10):
+                expected = [move for move in moves if compare_patterns(generator.to_pattern(move), target)]
+                self.assertEqual(generator.cover_moves(target), expected, f"目标牌型: {target}")
+
+    def test_get_valid_patterns_cover_play(self):
+        """管牌时get_valid_patterns只返回能管住上一手牌的牌型"""
+        hand = [Card(Suit.SPADE, '5'), Card(Suit.HEART, '5'), Card(Suit.SPADE, '9'), Card(Suit.HEART, '9'),
+                Card(Suit.SPADE, 'K'), Card(Suit.HEART, 'K'), Card(Suit.DIAMOND, 'K'), Card(Suit.CLUB, 'K')]
+        self.engine.state.players[0] = hand
+        self.engine.state.last_pattern = MoveGenerator([Card(Suit.CLUB, '7'), Card(Suit.DIAMOND, '7')]).patterns()[0]
+        self.engine.state.pass_count = 0
+        valid = self.engine.get_valid_patterns(0)
+        self.assertEqual([(p.type, p.main_point) for p in valid],
+                         [(CardType.BOMB, 13), (CardType.PAIR, 9), (CardType.PAIR, 13)])
+        self.assertEqual(generate_cover_moves(rank_counts(hand), valid[0].key), [])
+
+    def test_iter_valid_patterns(self):
+        """逐个生成的有效牌型与get_valid_patterns的结果和顺序一致"""
+        rng = random.Random(31)
+        targets = []
+        for _ in range(50):
+            targets.extend(MoveGenerator(random_hand(rng, self.deck)).patterns())
+        for _ in range(200):
+            engine = GameEngine()
+            engine.state.players[0] = random_hand(rng, self.deck)
+            if rng.random() < 0.5:
+                engine.state.last_pattern = rng.choice(targets)
+                engine.state.pass_count = 0
+            expected = [rank_level(p) for p in engine.get_valid_patterns(0)]
+            self.assertEqual([rank_level(p) for p in engine.iter_valid_patterns(0)], expected)
+            singles = [rank_level(p) for p in engine.iter_valid_patterns(0, (CardType.SINGLE,))]
+            self.assertEqual(singles, [r for r in expected if r[0] == CardType.SINGLE])
+
+    def test_iter_moves_stops_early(self):
+        """只取第一个动作时不会生成后面的牌型"""
+        counts = rank_counts(self.deck[:16])
+        moves = iter_moves(counts)
+        self.assertEqual(next(moves), generate_moves(counts)[0])
+        self.assertEqual(list(iter_moves(counts, card_types=(CardType.PAIR,))),
+                         [m for m in generate_moves(counts) if move_type(m) == CardType.PAIR])
+
+    def test_random_valid_pattern(self):
+        """随机选择的牌型是有效牌型，没有可出的牌时返回None"""
+        rng = random.Random(5)
+        self.engine.state.players[0] = random_hand(rng, self.deck)
+        valid = [rank_level(p) for p in self.engine.get_valid_patterns(0)]
+        for _ in range(20):
+            self.assertIn(rank_level(self.engine.random_valid_pattern(0, rng)), valid)
+
+        self.engine.state.players[0] = [Card(Suit.SPADE, '3')]
+        self.engine.state.last_pattern = MoveGenerator([Card(Suit.SPADE, '2')]).patterns()[0]
+        self.engine.state.pass_count = 0
+        self.assertIsNone(self.engine.random_valid_pattern(0))
+
+    def test_move_encoding(self):
+        """测试动作编码和解码"""
+        counts = [0] * 13
+        counts[4] = 3  # 三张7
+        counts[0] = 1
+        counts[12] = 1
+        code = sum(count << (4 * i) for i, count in enumerate(counts))
+        move = encode_move(CardType.THREE_WITH_TWO, 7, code)
+        self.assertEqual(move_type(move), CardType.THREE_WITH_TWO)
+        self.assertEqual(move_main_point(move), 7)
+        self.assertEqual(move_counts(move), counts)
+        self.assertEqual(move_card_count(move), 5)
+
+    def test_generate_moves_from_counts(self):
+        """测试直接从计数向量生成动作"""
+        hand = [Card(Suit.SPADE, '3'), Card(Suit.HEART, '3'), Card(Suit.SPADE, '4')]
+        moves = generate_moves(rank_counts(hand))
+        self.assertEqual([(move_type(m), move_main_point(m)) for m in moves],
+                         [(CardType.PAIR, 3), (CardType.SINGLE, 3), (CardType.SINGLE, 4)])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,124 @@
+"""
+测试紧凑的出牌记录
+"""
+
+import sys
+import os
+# 添加项目根目录到Python路径
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..'))
+
+import random
+import unittest
+from game import GameEngine
+from cards import Card, Suit, CardType, CardPattern
+from move_log import MoveLog
+
+
+def rescan_point_counts(history, player_id):
+    """按原来的方式扫描历史统计已出的各点数牌数"""
+    counts = {}
+    for move in history:
+        if move['player'] == player_id:
+            for card in move['cards']:
+                counts[card.point] = counts.get(card.point, 0) + 1
+    return counts
+
+
+class TestMoveLog(unittest.TestCase):
+
+    def setUp(self):
+        random.seed(21)
+        self.engine = GameEngine()
+        self.engine.deal_cards()
+
+    def play_game(self, engine):
+        moves = []
+        while not engine.state.game_over:
+            player = engine.state.current_player
+            pattern = engine.random_valid_pattern(player)
+            if pattern is None:
+                engine.pass_turn(player)
+            else:
+                engine.play_cards(player, pattern.cards)
+            moves.append((player, pattern))
+        return moves
+
+    def test_engine_records_moves(self):
+        """出牌和跳过都被记录，按下标访问得到原来格式的记录"""
+        moves = self.play_game(self.engine)
+        history = self.engine.game_history
+        self.assertEqual(len(history), len(moves))
+        for move, (player, pattern) in zip(history, moves):
+            self.assertEqual(move['player'], player)
+            if pattern is None:
+                self.assertEqual(move['cards'], [])
+                self.assertIsNone(move['pattern'])
+            else:
+                self.assertEqual(set(move['cards']), set(pattern.cards))
+                self.assertEqual((move['pattern'].type, move['pattern'].key), (pattern.type, pattern.key))
+        for player in range(2):
+            counts = history.played_rank_counts(player)
+            self.assertEqual({i + 3: c for i, c in enumerate(counts) if c}, rescan_point_counts(history, player))
+
+    def test_undo_pops_history(self):
+        """undo同时撤销出牌记录和已出牌的统计"""
+        tokens = []
+        for _ in range(12):
+            pattern = self.engine.random_valid_pattern(self.engine.state.current_player)
+            tokens.append(self.engine.apply(pattern, validate=False))
+        history = self.engine.game_history
+        self.assertEqual(len(history), 12)
+        counts = history.played_rank_counts(0)
+        mask = history.played_mask(0)
+        tokens.append(self.engine.apply(self.engine.random_valid_pattern(self.engine.state.current_player)))
+        self.engine.undo(tokens.pop())
+        self.assertEqual(history.played_rank_counts(0), counts)
+        self.assertEqual(history.played_mask(0), mask)
+        for token in reversed(tokens):
+            self.engine.undo(token)
+        self.assertEqual(len(history), 0)
+        self.assertEqual(history.played_rank_counts(0), [0] * 13)
+        self.assertEqual(history.played_mask(1), 0)
+
+    def test_discard_does_not_build_moves(self):
+        """undo用discard回退记录，不构造出牌字典，统计与pop的结果一致"""
+        tokens = []
+        for _ in range(10):
+            pattern = self.engine.random_valid_pattern(self.engine.state.current_player)
+            tokens.append(self.engine.apply(pattern, validate=False))
+        expected = self.engine.game_history.copy()
+        for _ in range(4):
+            expected.pop()
+        history = self.engine.game_history
+
+        def fail(index):
+            raise AssertionError("discard不应构造出牌字典")
+        history._move = fail
+        for _ in range(4):
+            self.engine.undo(tokens.pop())
+        del history._move
+        for player in range(2):
+            self.assertEqual(history.played_rank_counts(player), expected.played_rank_counts(player))
+            self.assertEqual(history.played_mask(player), expected.played_mask(player))
+        self.assertEqual(list(history), list(expected))
+
+    def test_dict_entries(self):
+        """兼容直接追加和赋值字典格式的记录"""
+        ace = Card(Suit.SPADE, 'A')
+        pattern = CardPattern(CardType.SINGLE, [ace], 14)
+        self.engine.game_history = [{'player': 1, 'cards': [ace], 'pattern': pattern}]
+        self.assertIsInstance(self.engine.game_history, MoveLog)
+        self.engine.game_history.append({'player': 1, 'cards': [ace], 'pattern': None, 'hand_before': []})
+        self.engine.game_history.append({'player': 0, 'cards': [], 'pattern': None})
+        history = self.engine.game_history
+        self.assertEqual(history[1]['hand_before'], [])
+        self.assertEqual(history.played_count(1, 14), 2)
+        self.assertTrue(history.is_pass(2))
+        self.assertEqual(history.pop()['player'], 0)
+        history.pop()
+        self.assertEqual(history.played_count(1, 14), 1)
+        self.assertEqual(history.played_mask(1), 1 << ace.ordinal)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,75 @@
+"""
+测试有效牌型的全局缓存
+"""
+
+import sys
+import os
+# 添加项目根目录到Python路径
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..'))
+
+import unittest
+from game import GameEngine
+from cards import Card, Suit, CardType
+from pattern_cache import PatternCache, valid_patterns_cache
+
+
+class TestPatternCache(unittest.TestCase):
+
+    def setUp(self):
+        self.hand = [Card(Suit.SPADE, '3'), Card(Suit.HEART, '3'), Card(Suit.SPADE, '5'), Card(Suit.HEART, 'K')]
+        self.cache = PatternCache(maxsize=2)
+        GameEngine.pattern_cache = self.cache
+
+    def tearDown(self):
+        GameEngine.pattern_cache = valid_patterns_cache
+
+    def make_engine(self, hand):
+        engine = GameEngine()
+        engine.state.players[0] = list(hand)
+        return engine
+
+    def test_lru_eviction(self):
+        """测试超过大小上限时淘汰最久未使用的项"""
+        self.cache.put('a', [])
+        self.cache.put('b', [])
+        self.assertIsNotNone(self.cache.get('a'))
+        self.cache.put('c', [])
+        self.assertIsNone(self.cache.get('b'))
+        self.assertIsNotNone(self.cache.get('a'))
+        self.assertEqual(self.cache.stats(), {'hits': 2, 'misses': 1, 'size': 2, 'maxsize': 2})
+
+    def test_shared_across_engines(self):
+        """测试不同引擎实例共享缓存，手牌顺序不影响命中"""
+        first = self.make_engine(self.hand).get_valid_patterns(0)
+        second = self.make_engine(reversed(self.hand)).get_valid_patterns(0)
+        self.assertEqual(self.cache.hits, 1)
+        self.assertEqual(self.cache.misses, 1)
+        self.assertEqual([(p.type, p.main_point) for p in first], [(p.type, p.main_point) for p in second])
+
+    def test_cover_target_in_key(self):
+        """测试管牌时以上一手牌的规范键区分缓存"""
+        engine = self.make_engine(self.hand)
+        all_patterns = engine.get_valid_patterns(0)
+        engine.state.last_pattern = next(p for p in all_patterns if p.type == CardType.SINGLE and p.main_point == 5)
+        engine.state.pass_count = 0
+        cover_patterns = engine.get_valid_patterns(0)
+        self.assertEqual(self.cache.misses, 2)
+        self.assertEqual([(p.type, p.main_point) for p in cover_patterns], [(CardType.SINGLE, 13)])
+
+    def test_returns_copy(self):
+        """测试修改返回的列表不影响缓存"""
+        engine = self.make_engine(self.hand)
+        patterns = engine.get_valid_patterns(0)
+        count = len(patterns)
+        patterns.clear()
+        self.assertEqual(len(engine.get_valid_patterns(0)), count)
+
+    def test_duplicate_cards_not_cached(self):
+        """测试手牌中有重复的牌时不使用缓存"""
+        engine = self.make_engine(self.hand + [Card(Suit.SPADE, '3')])
+        engine.get_valid_patterns(0)
+        self.assertEqual(len(self.cache), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,220 @@
+"""
+测试经验回放缓冲区
+"""
+
+import sys
+import os
+# 添加项目根目录到Python路径
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..'))
+
+import random
+import shutil
+import subprocess
+import tempfile
+import unittest
+import numpy as np
+from action_space import legal_action_mask
+from replay_buffer import MemmapReplayBuffer, PrioritizedReplayBuffer, ReplayBuffer, SumTree
+from rl_environment import RLEnvironment
+
+
+class TestReplayBuffer(unittest.TestCase):
+
+    def test_ring_overwrites_oldest(self):
+        """写满后覆盖最早的经验"""
+        buffer = ReplayBuffer(5, 3, seed=0)
+        for i in range(7):
+            buffer.add(np.full(3, i), i, float(i), np.full(3, i + 1), i % 2 == 0)
+        self.assertEqual(len(buffer), 5)
+        self.assertEqual(sorted(buffer.actions.tolist()), [2, 3, 4, 5, 6])
+        self.assertEqual(buffer.position, 2)
+        states, actions, rewards, next_states, dones, _ = buffer.gather(np.array([0, 1]))
+        self.assertEqual(actions.tolist(), [5, 6])
+        self.assertEqual(states.dtype, np.float32)
+        self.assertTrue((next_states[:, 0] == actions + 1).all())
+        self.assertEqual(dones.tolist(), [False, True])
+
+    def test_add_batch(self):
+        """批量添加与逐条添加的结果一致，跨过缓冲区末尾时回绕"""
+        one = ReplayBuffer(8, 2)
+        batch = ReplayBuffer(8, 2)
+        rows = np.arange(12)
+        for i in rows:
+            one.add([i, -i], i, i * 0.5, [i + 1, 0], i % 3 == 0)
+        for chunk in np.array_split(rows, 4):
+            batch.add_batch(np.stack([chunk, -chunk], axis=1), chunk, chunk * 0.5,
+                            np.stack([chunk + 1, 0 * chunk], axis=1), chunk % 3 == 0)
+        self.assertEqual((len(one), one.position), (len(batch), batch.position))
+        for name in ('states', 'actions', 'rewards', 'next_states', 'dones'):
+            self.assertTrue((getattr(one, name) == getattr(batch, name)).all())
+
+    def test_sample(self):
+        buffer = ReplayBuffer(100, 4, seed=1)
+        for i in range(30):
+            buffer.add(np.full(4, i), i, 0.0, np.zeros(4), False)
+        states, actions, _, _, _, masks = buffer.sample(64)
+        self.assertEqual(states.shape, (64, 4))
+        self.assertTrue((actions < 30).all())
+        self.assertTrue((states[:, 0] == actions).all())
+        # 没有记录掩码输入时所有动作都可以取最大
+        self.assertTrue(masks.all())
+
+    def test_next_masks(self):
+        """由保存的掩码输入还原下一状态的合法动作掩码"""
+        random.seed(3)
+        env = RLEnvironment()
+        state = env.reset()
+        buffer = ReplayBuffer(16, env.state_size)
+        expected = []
+        for _ in range(10):
+            action = int(np.random.choice(np.flatnonzero(env.legal_action_mask())))
+            next_state, reward, done, _ = env.step_action(action)
+            buffer.add(state, action, reward, next_state, done, env.legal_action_inputs())
+            expected.append(legal_action_mask(*env.legal_action_inputs()))
+            state = next_state
+            if done:
+                break
+        masks = buffer.next_masks(np.arange(len(expected)))
+        self.assertTrue((masks == np.array(expected)).all())
+
+
+class TestSumTree(unittest.TestCase):
+
+    def test_sums_and_find(self):
+        """根节点是所有优先级之和，按前缀和找到的位置与累积和一致"""
+        rng = np.random.default_rng(0)
+        tree = SumTree(13)
+        priorities = rng.random(13)
+        tree.update(np.arange(13), priorities)
+        self.assertAlmostEqual(tree.total, priorities.sum())
+        # 部分更新（包含重复下标，以最后一次为准）
+        tree.update(np.array([3, 7, 3]), np.array([0.5, 2.0, 0.25]))
+        priorities[[3, 7]] = [0.25, 2.0]
+        self.assertAlmostEqual(tree.total, priorities.sum())
+        self.assertTrue(np.allclose(tree.get(np.arange(13)), priorities))
+        values = rng.random(500) * tree.total
+        expected = np.searchsorted(np.cumsum(priorities), values, side='right')
+        self.assertTrue((tree.find(values) == expected).all())
+        # 超出总和的取值不会落到没有经验的位置
+        self.assertEqual(tree.find(np.array([tree.total * 1.5]))[0], 12)
+
+
+class TestPrioritizedReplayBuffer(unittest.TestCase):
+
+    def fill(self, buffer, count):
+        for i in range(count):
+            buffer.add(np.full(buffer.state_size, i), i, 0.0, np.zeros(buffer.state_size), False)
+
+    def test_sampling_follows_priorities(self):
+        """抽中的频率与优先级的alpha次方成正比"""
+        buffer = PrioritizedReplayBuffer(8, 2, alpha=1.0, epsilon=0.0, seed=1)
+        self.fill(buffer, 4)
+        buffer.update_priorities(np.arange(4), np.array([1.0, 2.0, 3.0, 4.0]))
+        counts = np.bincount(np.concatenate([buffer.sample_indices(100) for _ in range(100)]), minlength=8)
+        self.assertEqual(counts[4:].sum(), 0)
+        self.assertTrue(np.allclose(counts[:4] / counts.sum(), [0.1, 0.2, 0.3, 0.4], atol=0.02))
+
+    def test_new_transitions_get_max_priority(self):
+        buffer = PrioritizedReplayBuffer(8, 2, alpha=1.0, epsilon=0.0)
+        self.fill(buffer, 2)
+        buffer.update_priorities(np.array([0, 1]), np.array([5.0, 0.5]))
+        self.fill(buffer, 1)
+        self.assertEqual(buffer.tree.get([2])[0], 5.0)
+
+    def test_importance_weights(self):
+        """权重为(N * P(i))^-beta归一化到最大值1，优先级越高权重越小"""
+        buffer = PrioritizedReplayBuffer(8, 2, alpha=1.0, beta=1.0, beta_increment=0.0, epsilon=0.0)
+        self.fill(buffer, 4)
+        buffer.update_priorities(np.arange(4), np.array([1.0, 2.0, 3.0, 4.0]))
+        weights = buffer.importance_weights(np.arange(4))
+        self.assertTrue(np.allclose(weights, [1.0, 0.5, 1 / 3, 0.25]))
+
+
+class TestMemmapReplayBuffer(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def add_rows(self, buffer, rows):
+        rows = np.asarray(rows)
+        buffer.add_batch(np.stack([rows, -rows], axis=1), rows, rows * 0.5, np.stack([rows + 1, rows], axis=1),
+                         rows % 2 == 0, (np.tile(rows[:, None] % 4, 13), np.full(len(rows), -1), 0 * rows))
+
+    def test_matches_memory_buffer(self):
+        """跨分片读写的结果与内存中的缓冲区一致"""
+        disk = MemmapReplayBuffer(self.directory, 10, 2, shard_size=4, flush_every=3)
+        memory = ReplayBuffer(10, 2)
+        for chunk in np.array_split(np.arange(23), 6):
+            self.add_rows(disk, chunk)
+            self.add_rows(memory, chunk)
+        disk.add([1, 2], 3, 4.0, [5, 6], True)
+        memory.add([1, 2], 3, 4.0, [5, 6], True)
+        self.assertEqual((len(disk), disk.position), (len(memory), memory.position))
+        indices = np.random.default_rng(0).integers(0, 10, size=40)
+        for ours, theirs in zip(disk.gather(indices), memory.gather(indices)):
+            self.assertEqual(ours.dtype, theirs.dtype)
+            self.assertTrue((ours == theirs).all())
+        self.assertTrue(os.path.exists(os.path.join(self.directory, 'states.00002.npy')))
+        self.assertEqual(np.load(os.path.join(self.directory, 'states.00002.npy')).shape, (2, 2))
+
+    def test_resume(self):
+        """重新打开同一目录时继续使用保存的经验"""
+        buffer = MemmapReplayBuffer(self.directory, 100, 2, shard_size=16)
+        self.add_rows(buffer, np.arange(40))
+        buffer.flush()
+        expected = buffer.gather(np.arange(40))
+        del buffer
+        resumed = MemmapReplayBuffer(self.directory, 100, 2, shard_size=16)
+        self.assertEqual((len(resumed), resumed.position), (40, 40))
+        for ours, theirs in zip(resumed.gather(np.arange(40)), expected):
+            self.assertTrue((ours == theirs).all())
+        with self.assertRaises(ValueError):
+            MemmapReplayBuffer(self.directory, 100, 3, shard_size=16)
+
+    def test_resume_after_kill(self):
+        """进程被终止后，重新打开得到最后一次保存时的经验"""
+        script = (
+            "import os, sys, numpy as np\n"
+            "sys.path.insert(0, sys.argv[2])\n"
+            "from replay_buffer import MemmapReplayBuffer\n"
+            "buffer = MemmapReplayBuffer(sys.argv[1], 1000, 2, shard_size=64, flush_every=25)\n"
+            "for i in range(60):\n"
+            "    buffer.add([i, i], i, 1.0, [i, i], False)\n"
+            "os._exit(0)\n"
+        )
+        root = os.path.join(os.path.dirname(__file__), '..', '..')
+        subprocess.run([sys.executable, '-c', script, self.directory, root], check=True)
+        resumed = MemmapReplayBuffer(self.directory, 1000, 2, shard_size=64, flush_every=25)
+        self.assertEqual(len(resumed), 50)
+        self.assertEqual(resumed.actions[np.arange(50)].tolist(), list(range(50)))
+
+    def test_resume_after_kill_when_full(self):
+        """写满后进程被终止，重新打开时丢弃可能被覆盖或只写了一半的最早的经验"""
+        script = (
+            "import os, sys, numpy as np\n"
+            "sys.path.insert(0, sys.argv[2])\n"
+            "from replay_buffer import MemmapReplayBuffer\n"
+            "buffer = MemmapReplayBuffer(sys.argv[1], 20, 2, shard_size=8, flush_every=5)\n"
+            "for i in range(23):\n"
+            "    buffer.add([i, i], i, 1.0, [i, i], False)\n"
+            "buffer.states[3] = [99, 99]\n"
+            "os._exit(0)\n"
+        )
+        root = os.path.join(os.path.dirname(__file__), '..', '..')
+        subprocess.run([sys.executable, '-c', script, self.directory, root], check=True)
+        resumed = MemmapReplayBuffer(self.directory, 20, 2, shard_size=8, flush_every=5, seed=0)
+        self.assertEqual((len(resumed), resumed.position), (15, 0))
+        states, actions = resumed.gather(resumed.sample_indices(200))[:2]
+        self.assertEqual(set(actions.tolist()), set(range(5, 20)))
+        self.assertTrue((states[:, 0] == actions).all())
+        # 继续写入后有效的经验从丢弃的位置之后开始
+        resumed.add([20, 20], 20, 1.0, [20, 20], False)
+        self.assertEqual(len(resumed), 16)
+        self.assertEqual(set(resumed.actions[resumed.sample_indices(200)].tolist()), set(range(5, 21)))
+
+
+if __name__ == '__main__':
+    unittest.main()
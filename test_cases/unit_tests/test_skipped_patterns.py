@@ -0,0 +1,51 @@
+"""
+测试HumanStrategy从出牌记录中找出对手管不住的牌（出牌记录中包含跳过）
+"""
+
+import sys
+import os
+# 添加项目根目录到Python路径
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..'))
+
+import random
+import unittest
+from game import GameEngine
+from cards import CardType
+from human_strategy import HumanStrategy
+
+
+class TestSkippedPatterns(unittest.TestCase):
+
+    def setUp(self):
+        random.seed(16)
+        self.engine = GameEngine()
+        self.engine.deal_cards()
+        self.engine.state.current_player = 0
+
+    def test_pass_after_pass_is_ignored(self):
+        """跳过之后对手再跳过，不应把跳过当作对手管不住的牌"""
+        engine = self.engine
+        engine.pass_turn(0)
+        engine.pass_turn(1)
+        strategy = HumanStrategy(0)
+        self.assertEqual(strategy.get_opponent_skipped_move_pattern(engine), [])
+        action_type, cards = strategy.choose_action(engine)
+        self.assertEqual(action_type, "play")
+        self.assertTrue(engine.play_cards(0, cards))
+
+    def test_skipped_play_is_recorded(self):
+        """出牌后对手跳过，记录这手牌"""
+        engine = self.engine
+        engine.pass_turn(0)
+        engine.pass_turn(1)
+        card = engine.state.players[0][0]
+        self.assertTrue(engine.play_cards(0, [card]))
+        engine.pass_turn(1)
+        skipped = HumanStrategy(0).get_opponent_skipped_move_pattern(engine)
+        self.assertEqual(len(skipped), 1)
+        self.assertEqual(skipped[0].type, CardType.SINGLE)
+        self.assertEqual(skipped[0].main_point, card.point)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,134 @@
+"""
+测试强化学习观测编码
+"""
+
+import sys
+import os
+# 添加项目根目录到Python路径
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..'))
+
+import random
+import unittest
+import numpy as np
+from game import GameEngine
+from rl_environment import RLEnvironment
+from cards import rank_counts
+from state_encoder import (PLANE_SCALARS, PLANE_SHAPE, PLANE_STATE_SIZE, STATE_SIZE, BatchPlaneEncoder,
+                           BatchStateEncoder, encode_planes, encode_state)
+
+
+def reference_state(engine):
+    """逐张牌、逐个点数填写的观测（编码前的实现）"""
+    state = np.zeros(STATE_SIZE)
+    current_player = engine.state.current_player
+    for i, card in enumerate(sorted(engine.state.players[current_player])[:16]):
+        state[i] = card.point
+    state[16] = len(engine.state.players[1 - current_player])
+    last_pattern = engine.state.last_pattern
+    if last_pattern:
+        state[17] = last_pattern.type.value
+        state[18] = last_pattern.main_point
+        state[19] = last_pattern.card_count
+    state[20] = 1 if last_pattern is None else 0
+    for card in engine.remaining_cards:
+        state[21 + card.point - 3] += 1
+    return state
+
+
+def random_engines(count, seed):
+    """随机对局中的一批状态"""
+    random.seed(seed)
+    engines = []
+    while len(engines) < count:
+        engine = GameEngine()
+        engine.deal_cards()
+        while not engine.state.game_over and len(engines) < count:
+            engines.append(engine.clone())
+            engine.apply(engine.random_valid_pattern(engine.state.current_player), validate=False)
+    return engines
+
+
+class TestStateEncoder(unittest.TestCase):
+
+    def test_encode_state(self):
+        """单个状态的编码与逐张填写的结果一致"""
+        for engine in random_engines(100, seed=4):
+            state = encode_state(engine)
+            self.assertTrue((state == reference_state(engine)).all())
+
+    def test_encode_into_buffer(self):
+        """写入给定数组时覆盖原有内容"""
+        engine = random_engines(1, seed=5)[0]
+        out = np.full(STATE_SIZE, 7, dtype=np.float32)
+        self.assertIs(encode_state(engine, out), out)
+        self.assertTrue((out == reference_state(engine)).all())
+
+    def test_batch_encoder(self):
+        """批量编码写入预先分配的缓冲区，结果与单个编码一致"""
+        engines = random_engines(50, seed=6)
+        encoder = BatchStateEncoder(64)
+        out = np.full((64, STATE_SIZE), -1, dtype=np.float32)
+        states = encoder.encode_engines(engines, out)
+        self.assertEqual(states.shape, (50, STATE_SIZE))
+        self.assertTrue(np.shares_memory(states, out))
+        for engine, state in zip(engines, states):
+            self.assertTrue((state == encode_state(engine)).all())
+        # 未写入的行保持不变
+        self.assertTrue((out[50:] == -1).all())
+
+    def test_environment_uses_encoder(self):
+        env = RLEnvironment()
+        state = env.reset()
+        self.assertEqual(state.shape, (env.state_size,))
+        self.assertTrue((state == reference_state(env.engine)).all())
+
+
+class TestPlaneEncoder(unittest.TestCase):
+
+    def test_encode_planes(self):
+        """各平面第k行表示该点数的牌数超过k，标量特征对应剩余牌数和要管的牌"""
+        for engine in random_engines(100, seed=7):
+            observation = encode_planes(engine)
+            self.assertEqual(observation.dtype, np.float32)
+            self.assertEqual(observation.shape, (PLANE_STATE_SIZE,))
+            planes = observation[:-PLANE_SCALARS].reshape(PLANE_SHAPE)
+            scalars = observation[-PLANE_SCALARS:]
+            state = engine.state
+            player = state.current_player
+            cover = engine.is_cover_play()
+            expected = [rank_counts(state.players[player]),
+                        rank_counts(engine.remaining_cards),
+                        rank_counts([card for move in engine.game_history if move['player'] == 1 - player
+                                     for card in move['cards']]),
+                        rank_counts(state.last_pattern.cards) if cover else [0] * 13]
+            # 每个平面按列求和即为各点数牌数
+            self.assertEqual(planes.sum(axis=1).astype(int).tolist(), expected)
+            self.assertAlmostEqual(scalars[0], len(state.players[player]) / 16)
+            self.assertAlmostEqual(scalars[1], len(state.players[1 - player]) / 16)
+            self.assertEqual(scalars[2], 0 if cover else 1)
+            self.assertEqual(scalars[4:].sum(), 1 if cover else 0)
+            if cover:
+                self.assertEqual(scalars[3 + state.last_pattern.type.value], 1)
+
+    def test_batch_plane_encoder(self):
+        engines = random_engines(40, seed=9)
+        out = np.zeros((48, PLANE_STATE_SIZE), dtype=np.float32)
+        observations = BatchPlaneEncoder(48).encode_engines(engines, out)
+        for engine, observation in zip(engines, observations):
+            self.assertTrue((observation == encode_planes(engine)).all())
+
+    def test_environment_encoding(self):
+        """RLEnvironment可以选择平面编码"""
+        env = RLEnvironment('planes')
+        self.assertEqual(env.state_size, PLANE_STATE_SIZE)
+        state = env.reset()
+        self.assertEqual(state.shape, (PLANE_STATE_SIZE,))
+        action = int(np.flatnonzero(env.legal_action_mask())[1])
+        state, _, _, _ = env.step_action(action)
+        self.assertTrue((state == encode_planes(env.engine)).all())
+        with self.assertRaises(ValueError):
+            RLEnvironment('unknown')
+
+
+if __name__ == '__main__':
+    unittest.main()
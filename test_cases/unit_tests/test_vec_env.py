@@ -0,0 +1,108 @@
+"""
+测试多进程向量化强化学习环境
+"""
+
+import sys
+import os
+# 添加项目根目录到Python路径
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..'))
+
+import unittest
+import numpy as np
+from action_space import PASS_ACTION
+from human_strategy import HumanStrategy
+from strategy import AIStrategy
+from vec_env import VecRLEnvironment
+
+
+def random_plays(masks, rng):
+    """每局在可以出的牌中随机选一个动作，没有时跳过"""
+    actions = np.zeros(len(masks), dtype=np.int64)
+    for i, mask in enumerate(masks):
+        plays = np.flatnonzero(mask[1:]) + 1
+        actions[i] = rng.choice(plays) if len(plays) else PASS_ACTION
+    return actions
+
+
+class FailingStrategy(AIStrategy):
+    """轮到行动时抛出异常的对手"""
+
+    def choose_action(self, engine):
+        raise ValueError("对手出错")
+
+
+class TestVecRLEnvironment(unittest.TestCase):
+
+    def test_self_play(self):
+        """自我对弈：返回堆叠的数组，结束的对局自动重新发牌"""
+        rng = np.random.default_rng(0)
+        with VecRLEnvironment(5, num_workers=2, seed=1) as envs:
+            states = envs.reset()
+            self.assertEqual(states.shape, (5, envs.state_size))
+            # 开局时双方各16张牌
+            self.assertTrue((states[:, 16] == 16).all())
+            finished = 0
+            for _ in range(60):
+                masks = envs.legal_action_masks()
+                self.assertEqual(masks.shape, (5, envs.action_size))
+                self.assertTrue(masks.any(axis=1).all())
+                states, rewards, dones, info = envs.step(random_plays(masks, rng))
+                self.assertEqual(rewards.shape, (5,))
+                for i in np.flatnonzero(dones):
+                    finished += 1
+                    self.assertTrue(info['winner'][i] in (-1, 0, 1))
+                    self.assertEqual(states[i, 16], 16)
+                self.assertTrue(((info['winner'] == -1) | dones).all())
+            self.assertGreater(finished, 0)
+
+    def test_opponent_acts_in_worker(self):
+        """有对手时返回的观测总是轮到智能体行动"""
+        rng = np.random.default_rng(3)
+        with VecRLEnvironment(3, num_workers=3, opponent=HumanStrategy, seed=2) as envs:
+            envs.reset()
+            finished = np.zeros(3, dtype=int)
+            # 运行到每个环境都至少结束两局，覆盖对手在新一局中先行动的情况
+            for _ in range(1000):
+                states, _, dones, info = envs.step(random_plays(envs.legal_action_masks(), rng))
+                self.assertTrue((info['players'] == 0).all())
+                self.assertTrue(envs.legal_action_masks().any(axis=1).all())
+                finished += dones
+                if (finished >= 2).all():
+                    break
+            self.assertTrue((finished >= 2).all())
+
+    def test_worker_error_is_raised(self):
+        """工作进程中的异常在主进程中抛出，之后仍可以正常关闭"""
+        rng = np.random.default_rng(4)
+        envs = VecRLEnvironment(2, num_workers=2, opponent=FailingStrategy, seed=5)
+        try:
+            # 对手先行动时在重新发牌中就会出错
+            with self.assertRaises(RuntimeError) as context:
+                envs.reset()
+                envs.step(random_plays(envs.legal_action_masks(), rng))
+            self.assertIn('ValueError', str(context.exception))
+        finally:
+            envs.close()
+        self.assertTrue(envs.closed)
+        envs.close()
+
+    def test_close_after_worker_exit(self):
+        """工作进程意外退出时抛出RuntimeError，关闭时不会因管道断开而出错"""
+        envs = VecRLEnvironment(2, num_workers=2, seed=6)
+        envs.reset()
+        envs._processes[0].terminate()
+        envs._processes[0].join()
+        with self.assertRaises(RuntimeError):
+            envs.step(np.zeros(2, dtype=np.int64))
+        envs.close()
+        self.assertTrue(envs.closed)
+
+    def test_workers_deal_different_games(self):
+        """各工作进程发出不同的牌"""
+        with VecRLEnvironment(4, num_workers=4) as envs:
+            states = envs.reset()
+            self.assertGreater(len({tuple(state[:16]) for state in states}), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
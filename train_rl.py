@@ -5,17 +5,22 @@
 import argparse
 import torch
 import numpy as np
-from rl_strategy import train_dqn_agent
+from rl_strategy import train_dqn_agent, train_dqn_agent_vec
 from rl_environment import RLEnvironment
 
 
-def train_dqn(episodes=1000, save_path="models/dqn_model.pth"):
-    """训练DQN模型"""
+def train_dqn(episodes=1000, save_path="models/dqn_model.pth", num_envs=1, num_workers=None, encoding='vector',
+              prioritized=False, replay_capacity=10000, replay_dir=None):
+    """训练DQN模型（num_envs大于1时用多进程向量化环境同时进行多局）"""
     print(f"开始训练DQN模型，共{episodes}轮")
     print(f"使用设备: {'CUDA' if torch.cuda.is_available() else 'CPU'}")
     
     # 训练模型
-    agent = train_dqn_agent(episodes)
+    if num_envs > 1:
+        agent = train_dqn_agent_vec(episodes, num_envs, num_workers, encoding, prioritized, replay_capacity,
+                                    replay_dir)
+    else:
+        agent = train_dqn_agent(episodes, encoding, prioritized, replay_capacity, replay_dir)
     
     # 保存模型
     torch.save(agent.q_network.state_dict(), save_path)
@@ -28,7 +33,7 @@ def evaluate_agent(agent, episodes=100):
     """评估AI性能"""
     print(f"评估AI性能，共{episodes}轮游戏")
     
-    env = RLEnvironment()
+    env = RLEnvironment(getattr(agent, 'encoding', 'vector'))
     wins = 0
     total_scores = []
     
@@ -36,26 +41,17 @@ def evaluate_agent(agent, episodes=100):
         state = env.reset()
         total_reward = 0
         while not env.done:
-            # 选择动作
-            valid_actions = env.get_valid_actions()
-            if not valid_actions:
-                env.step(0)  # 跳过
-                continue
+            # 选择动作（固定的全局动作空间下标）
+            mask = env.legal_action_mask()
             
-            # 使用训练好的模型选择动作
+            # 使用训练好的模型在合法动作中选择动作
             if hasattr(agent, 'q_network'):
-                state_tensor = torch.FloatTensor(state).unsqueeze(0).to(agent.device)
-                agent.q_network.eval()
-                with torch.no_grad():
-                    q_values = agent.q_network(state_tensor)
-                    valid_q_values = q_values[0][:len(valid_actions)]
-                    action = valid_q_values.argmax().item()
-                agent.q_network.train()
+                action = agent.greedy_action(state, mask)
             else:
-                action = np.random.choice(valid_actions)
+                action = np.random.choice(np.flatnonzero(mask))
             
             # 执行动作
-            state, reward, done, info = env.step(action)
+            state, reward, done, info = env.step_action(action)
             total_reward += reward
         
         total_scores.append(total_reward)
@@ -82,11 +78,24 @@ def main():
                         help='模型保存路径')
     parser.add_argument('--evaluate', action='store_true',
                         help='是否评估模型')
+    parser.add_argument('--num_envs', type=int, default=1,
+                        help='同时进行的对局数，大于1时使用多进程向量化环境')
+    parser.add_argument('--num_workers', type=int, default=None,
+                        help='向量化环境的工作进程数，默认为CPU核数')
+    parser.add_argument('--encoding', type=str, default='vector', choices=['vector', 'planes'],
+                        help='观测编码：vector为37维点数向量，planes为按点数平面的编码')
+    parser.add_argument('--prioritized', action='store_true',
+                        help='使用优先经验回放')
+    parser.add_argument('--replay_capacity', type=int, default=10000,
+                        help='经验回放的容量')
+    parser.add_argument('--replay_dir', type=str, default=None,
+                        help='把经验回放保存在该目录的memmap分片中，中断后重新运行可继续使用')
     
     args = parser.parse_args()
     
     if args.algorithm == 'dqn':
-        agent = train_dqn(args.episodes, args.save_path)
+        agent = train_dqn(args.episodes, args.save_path, args.num_envs, args.num_workers, args.encoding,
+                          args.prioritized, args.replay_capacity, args.replay_dir)
         
         # if args.evaluate:
         evaluate_agent(agent)
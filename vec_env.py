@@ -0,0 +1,265 @@
+"""
+多进程向量化强化学习环境
+
+把K个RLEnvironment分到多个工作进程中同时运行。观测、奖励、结束标志和合法动作掩码放在共享内存中，
+工作进程直接写入，管道只用来发送动作和完成通知，主进程一次得到K局堆叠好的数组，
+可以用批量推理的神经网络为所有对局选择动作。对局结束后工作进程自动重新发牌
+"""
+
+import multiprocessing as mp
+import os
+import random
+import traceback
+from typing import Dict, List, Optional, Tuple, Type
+
+import numpy as np
+
+from action_space import get_action_space, legal_action_mask
+from rl_environment import RLEnvironment
+from strategy import AIStrategy
+
+# 对手获胜结束对局时智能体得到的奖励（与RLEnvironment的最终奖励大小一致）
+LOSS_REWARD = -10.0
+
+
+def _play_opponent(env: RLEnvironment, opponent: AIStrategy) -> float:
+    """对手连续行动直到轮到智能体或对局结束，返回这段时间内智能体得到的奖励"""
+    engine = env.engine
+    while not env.done and engine.state.current_player == opponent.player_id:
+        action_type, cards = opponent.choose_action(engine)
+        if action_type == "pass" or not engine.play_cards(opponent.player_id, cards):
+            engine.pass_turn(opponent.player_id)
+        env._finalize_step(0.0)
+    return LOSS_REWARD if env.done and engine.state.winner == opponent.player_id else 0.0
+
+
+def _worker(remote, parent_remote, start: int, stop: int, buffers: Dict[str, mp.RawArray], state_size: int,
+            opponent_class: Optional[Type[AIStrategy]], agent_id: int, max_steps: int, seed: Optional[int],
+            encoding: str):
+    """工作进程：运行下标在[start, stop)的环境，结果写入共享内存"""
+    parent_remote.close()
+    # fork出的进程继承了相同的随机数状态，需要重新设置种子，否则各进程发出同样的牌
+    random.seed(None if seed is None else seed + start)
+    np.random.seed(None if seed is None else (seed + start) % 2 ** 32)
+
+    space_size = len(get_action_space())
+    obs = np.frombuffer(buffers['obs'], dtype=np.float32).reshape(-1, state_size)
+    masks = np.frombuffer(buffers['masks'], dtype=np.bool_).reshape(-1, space_size)
+    rewards = np.frombuffer(buffers['rewards'], dtype=np.float32)
+    dones = np.frombuffer(buffers['dones'], dtype=np.bool_)
+    winners = np.frombuffer(buffers['winners'], dtype=np.int8)
+    players = np.frombuffer(buffers['players'], dtype=np.int8)
+    hand_counts = np.frombuffer(buffers['hand_counts'], dtype=np.int8).reshape(-1, 13)
+    last_keys = np.frombuffer(buffers['last_keys'], dtype=np.int32)
+    pass_counts = np.frombuffer(buffers['pass_counts'], dtype=np.int8)
+
+    envs = [RLEnvironment(encoding) for _ in range(start, stop)]
+    opponents = [opponent_class(1 - agent_id) if opponent_class is not None else None for _ in envs]
+    steps = [0] * len(envs)
+
+    def reset(i: int):
+        """重新发牌，有对手时让对手先行动到轮到智能体"""
+        env = envs[i]
+        env.reset()
+        steps[i] = 0
+        if opponents[i] is not None:
+            _play_opponent(env, opponents[i])
+            if env.done:
+                reset(i)
+
+    def publish(i: int):
+        env = envs[i]
+        obs[start + i] = env.current_state
+        legal_inputs = env.legal_action_inputs()
+        hand_counts[start + i], last_keys[start + i], pass_counts[start + i] = legal_inputs
+        masks[start + i] = legal_action_mask(*legal_inputs)
+        players[start + i] = env.engine.state.current_player
+
+    def handle(command: str, data):
+        """执行一条命令，结果写入共享内存"""
+        if command == 'reset':
+            for i in range(len(envs)):
+                reset(i)
+                publish(i)
+        elif command == 'step':
+            for i, action in enumerate(data):
+                env = envs[i]
+                _, reward, done, _ = env.step_action(int(action))
+                if not done and opponents[i] is not None:
+                    reward += _play_opponent(env, opponents[i])
+                    done = env.done
+                steps[i] += 1
+                winners[start + i] = env.engine.state.winner if done else -1
+                # 超过步数上限的对局按结束处理（没有赢家）
+                done = done or steps[i] >= max_steps
+                rewards[start + i] = reward
+                dones[start + i] = done
+                if done:
+                    reset(i)
+                publish(i)
+
+    try:
+        while True:
+            command, data = remote.recv()
+            if command == 'close':
+                break
+            try:
+                handle(command, data)
+            except Exception:
+                # 异常连同调用栈发回主进程，由主进程重新抛出
+                remote.send(('error', traceback.format_exc()))
+            else:
+                remote.send(('ok', None))
+    except (KeyboardInterrupt, EOFError):
+        pass
+    finally:
+        remote.close()
+
+
+class VecRLEnvironment:
+    """
+    在工作进程中同时运行K个RLEnvironment
+
+    有对手策略时，对手在工作进程中行动，返回的观测总是轮到智能体行动的状态，奖励中包含对手获胜时的
+    LOSS_REWARD；没有对手时每一步由各局的当前玩家行动（自我对弈），当前玩家在info['players']中给出。
+    结束的对局会自动重新发牌，此时返回的观测是新一局的初始观测
+
+    Args:
+        num_envs: 环境数量K
+        num_workers: 工作进程数，默认为min(K, CPU核数)
+        opponent: 对手策略类，以玩家编号构造，为None时自我对弈
+        agent_id: 智能体的玩家编号
+        max_steps: 每局最多的步数，超过后按结束处理
+        seed: 随机种子，为None时每次运行的牌局不同
+        encoding: 观测编码，同RLEnvironment
+    """
+
+    def __init__(self, num_envs: int, num_workers: Optional[int] = None,
+                 opponent: Optional[Type[AIStrategy]] = None, agent_id: int = 0, max_steps: int = 50,
+                 seed: Optional[int] = None, encoding: str = 'vector'):
+        self.num_envs = num_envs
+        self.num_workers = max(1, min(num_envs, num_workers or os.cpu_count() or 1))
+        self.state_size = RLEnvironment(encoding).state_size
+        self.action_size = len(get_action_space())
+        self.closed = False
+
+        self._buffers = {
+            'obs': mp.RawArray('f', num_envs * self.state_size),
+            'masks': mp.RawArray('b', num_envs * self.action_size),
+            'rewards': mp.RawArray('f', num_envs),
+            'dones': mp.RawArray('b', num_envs),
+            'winners': mp.RawArray('b', num_envs),
+            'players': mp.RawArray('b', num_envs),
+            'hand_counts': mp.RawArray('b', num_envs * 13),
+            'last_keys': mp.RawArray('i', num_envs),
+            'pass_counts': mp.RawArray('b', num_envs),
+        }
+        self._obs = np.frombuffer(self._buffers['obs'], dtype=np.float32).reshape(num_envs, self.state_size)
+        self._masks = np.frombuffer(self._buffers['masks'], dtype=np.bool_).reshape(num_envs, self.action_size)
+        self._rewards = np.frombuffer(self._buffers['rewards'], dtype=np.float32)
+        self._dones = np.frombuffer(self._buffers['dones'], dtype=np.bool_)
+        self._winners = np.frombuffer(self._buffers['winners'], dtype=np.int8)
+        self._players = np.frombuffer(self._buffers['players'], dtype=np.int8)
+        self._hand_counts = np.frombuffer(self._buffers['hand_counts'], dtype=np.int8).reshape(num_envs, 13)
+        self._last_keys = np.frombuffer(self._buffers['last_keys'], dtype=np.int32)
+        self._pass_counts = np.frombuffer(self._buffers['pass_counts'], dtype=np.int8)
+
+        # 环境尽量平均地分给各工作进程
+        bounds = np.linspace(0, num_envs, self.num_workers + 1).astype(int)
+        self._slices = list(zip(bounds[:-1], bounds[1:]))
+        self._remotes = []
+        self._processes = []
+        for start, stop in self._slices:
+            remote, worker_remote = mp.Pipe()
+            process = mp.Process(target=_worker, args=(worker_remote, remote, int(start), int(stop), self._buffers,
+                                                       self.state_size, opponent, agent_id, max_steps, seed,
+                                                       encoding),
+                                 daemon=True)
+            process.start()
+            worker_remote.close()
+            self._remotes.append(remote)
+            self._processes.append(process)
+
+    def _call(self, commands: List[Tuple[str, object]]):
+        """
+        向各工作进程发送一条命令并等待全部完成
+
+        工作进程出错或已经退出时抛出RuntimeError（包含工作进程中的调用栈）
+        """
+        errors = []
+        sent = []
+        for remote, process, command in zip(self._remotes, self._processes, commands):
+            try:
+                remote.send(command)
+                sent.append((remote, process))
+            except (BrokenPipeError, EOFError, OSError):
+                errors.append(f'工作进程{process.pid}已退出，退出码{process.exitcode}')
+        for remote, process in sent:
+            try:
+                status, message = remote.recv()
+            except (EOFError, OSError):
+                status, message = 'error', f'工作进程{process.pid}已退出，退出码{process.exitcode}'
+            if status == 'error':
+                errors.append(message)
+        if errors:
+            raise RuntimeError('向量化环境的工作进程出错：\n' + '\n'.join(errors))
+
+    def reset(self) -> np.ndarray:
+        """所有环境重新发牌，返回观测，形状(K, 状态大小)"""
+        self._call([('reset', None)] * self.num_workers)
+        return self._obs.copy()
+
+    def step(self, actions: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray, Dict[str, np.ndarray]]:
+        """
+        每个环境执行一个全局动作下标（不合法的动作按跳过处理）
+
+        Args:
+            actions: 形状(K,)
+
+        Returns:
+            (观测(K, 状态大小), 奖励(K,), 是否结束(K,), info)，info中winner为结束对局的赢家（未结束或
+            超过步数上限为-1），players为返回的观测中的当前玩家
+        """
+        actions = np.asarray(actions, dtype=np.int64)
+        self._call([('step', actions[start:stop]) for start, stop in self._slices])
+        info = {'winner': self._winners.copy(), 'players': self._players.copy()}
+        return self._obs.copy(), self._rewards.copy(), self._dones.copy(), info
+
+    def legal_action_masks(self) -> np.ndarray:
+        """各环境当前玩家的合法动作掩码，形状(K, 动作数)"""
+        return self._masks.copy()
+
+    def legal_action_inputs(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """各环境合法动作掩码的输入：(当前玩家各点数牌数(K, 13), 上一手牌的规范键(K,), 连续跳过次数(K,))"""
+        return self._hand_counts.copy(), self._last_keys.copy(), self._pass_counts.copy()
+
+    def close(self):
+        """关闭工作进程"""
+        if self.closed:
+            return
+        try:
+            for remote in self._remotes:
+                try:
+                    remote.send(('close', None))
+                except (BrokenPipeError, EOFError, OSError):
+                    # 工作进程已经退出
+                    pass
+            for process in self._processes:
+                process.join(timeout=5)
+                if process.is_alive():
+                    process.terminate()
+                    process.join()
+        finally:
+            for remote in self._remotes:
+                remote.close()
+            self.closed = True
+
+    def __enter__(self) -> 'VecRLEnvironment':
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __del__(self):
+        if not getattr(self, 'closed', True):
+            self.close()
@@ -0,0 +1,57 @@
+"""
+对局状态的Zobrist哈希
+
+为每个(玩家, 牌)、轮到玩家1、上一手牌的规范键和连续跳过次数各分配一个固定的64位随机数，
+状态的哈希是其中所有成立项的异或。出牌、跳过只需异或上变化的项即可增量更新，
+可以直接作为置换表和缓存的键
+"""
+
+from functools import lru_cache
+from typing import Iterable, Optional
+
+from cards import Card, CardPattern
+
+_MASK64 = (1 << 64) - 1
+
+
+def _splitmix64(seed: int) -> int:
+    """由整数生成确定的64位伪随机数（SplitMix64），保证不同进程中的哈希一致"""
+    z = (seed + 0x9E3779B97F4A7C15) & _MASK64
+    z = ((z ^ (z >> 30)) * 0xBF58476D1CE4E5B9) & _MASK64
+    z = ((z ^ (z >> 27)) * 0x94D049BB133111EB) & _MASK64
+    return z ^ (z >> 31)
+
+
+# CARD_KEYS[player][ordinal]：玩家手中有这张牌
+CARD_KEYS = [[_splitmix64(player * 64 + ordinal) for ordinal in range(52)] for player in range(2)]
+# 轮到玩家1出牌
+TURN_KEY = _splitmix64(128)
+
+
+@lru_cache(maxsize=None)
+def _pass_key(pass_count: int) -> int:
+    return _splitmix64(256 + pass_count) if pass_count else 0
+
+
+@lru_cache(maxsize=None)
+def _pattern_key(key: int) -> int:
+    return _splitmix64((1 << 16) + key)
+
+
+def pattern_hash(pattern: Optional[CardPattern]) -> int:
+    """上一手牌对哈希的贡献（按规范键，不区分花色），没有上一手牌时为0"""
+    return 0 if pattern is None else _pattern_key(pattern.key)
+
+
+def cards_hash(player_id: int, cards: Iterable[Card]) -> int:
+    """玩家手中这些牌对哈希的贡献"""
+    keys = CARD_KEYS[player_id]
+    value = 0
+    for card in cards:
+        value ^= keys[card.ordinal]
+    return value
+
+
+def context_hash(current_player: int, last_pattern: Optional[CardPattern], pass_count: int) -> int:
+    """当前玩家、上一手牌和连续跳过次数对哈希的贡献"""
+    return (TURN_KEY if current_player else 0) ^ pattern_hash(last_pattern) ^ _pass_key(pass_count)